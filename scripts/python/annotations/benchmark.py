@@ -0,0 +1,116 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from comp370.annotator.consensus import KEYS
+from comp370.annotator.consensus import WEIGHTS
+from comp370.annotator.consensus import HUMANS
+from comp370.annotator.consensus import consensus
+
+CATEGORIES = [
+    "Food",
+    "Relationships",
+    "Work",
+    "Money",
+    "Lifestyle",
+    "Culture",
+    "Health",
+    "Miscellaneous",
+]
+
+
+def synthesize(n: int, seed: int = 42) -> pd.DataFrame:
+    """Generate n random votes over roughly n/4 lines."""
+    rng = np.random.default_rng(seed)
+    emails = list(WEIGHTS.keys()) + ["someone@else.com"]
+    lines = max(n // 4, 1)
+    line = rng.integers(0, lines, n)
+
+    return pd.DataFrame(
+        {
+            "season_number": line // 10_000 + 1,
+            "episode_number": line // 100 % 100 + 1,
+            "line_number": line % 100 + 1,
+            "date": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 10**6, n), unit="s"),
+            "email": rng.choice(emails, n),
+            # A small set of categories per line makes ties common
+            "category": rng.choice(CATEGORIES[:3], n),
+        }
+    )
+
+
+def reference(rows: pd.DataFrame) -> str:
+    """Per-line consensus as originally computed in process.py."""
+    rows = rows.sort_values("date").groupby("email").tail(1)
+    human_counts = rows[rows["email"].isin(HUMANS)]["category"].value_counts()
+
+    if len(human_counts) == 0:
+        return reference_weighted(rows)
+    if len(human_counts) == 1:
+        return human_counts.index[0]
+
+    tied = human_counts[human_counts == human_counts.max()]
+    if len(tied) == 1:
+        return tied.index[0]
+
+    return reference_weighted(rows)
+
+
+def reference_weighted(rows: pd.DataFrame) -> str:
+    weighted = rows.groupby("category")["email"].apply(lambda s: s.map(WEIGHTS).sum())
+    if len(weighted) == 0:
+        return "UNKNOWN"
+
+    winners = weighted[weighted == weighted.max()].index.tolist()
+    return winners[0] if len(winners) == 1 else "UNKNOWN"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark annotation consensus")
+    parser.add_argument(
+        "-n",
+        "--num",
+        type=int,
+        default=1_000_000,
+        help="Number of synthetic votes",
+    )
+    parser.add_argument(
+        "-r",
+        "--reference",
+        type=int,
+        default=20_000,
+        help="Number of votes to check against the reference implementation",
+    )
+    args = parser.parse_args()
+
+    df = synthesize(args.num)
+    print(f"== {len(df)} votes over {len(df[KEYS].drop_duplicates())} lines")
+
+    start = time.perf_counter()
+    out = consensus(df)
+    elapsed = time.perf_counter() - start
+    print(f"Vectorised: {elapsed:.2f}s ({len(df) / elapsed:,.0f} votes/s)")
+
+    # Parity on a subset of lines (the reference is too slow for all of them)
+    sample = synthesize(args.reference, seed=7)
+    start = time.perf_counter()
+    expected = {
+        key: reference(rows)
+        for key, rows in sample.groupby(KEYS)  # type: ignore
+    }
+    elapsed = time.perf_counter() - start
+    print(f"Reference:  {elapsed:.2f}s ({len(sample) / elapsed:,.0f} votes/s)")
+
+    actual = {
+        tuple(row[:3]): row[3] for row in consensus(sample).itertuples(index=False)
+    }
+    mismatches = [key for key in expected if expected[key] != actual.get(key)]
+    print(f"Parity: {len(expected) - len(mismatches)}/{len(expected)} lines match")
+    assert len(out) > 0
+    assert not mismatches, mismatches[:10]
+
+
+if __name__ == "__main__":
+    main()
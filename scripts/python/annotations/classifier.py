@@ -0,0 +1,93 @@
+import argparse
+
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from comp370.annotator.classifier import PATH_CLASSIFIER
+from comp370.annotator.classifier import THRESHOLD
+from comp370.annotator.classifier import PreClassifier
+from comp370.annotator.classifier import training_data
+from comp370.annotator.consensus import HUMANS
+from comp370.annotator.consensus import KEYS
+from comp370.annotator.consensus import UNKNOWN
+from comp370.annotator.consensus import consensus
+from comp370.constants import DIR_DATA
+from comp370.db import Client as Db
+
+# Thresholds reported on the held-out lines
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
+
+
+def human_labels(path) -> pd.DataFrame:
+    """Consensus of the human annotators alone, for lines they agree on."""
+    votes = pd.read_csv(path)
+    labels = consensus(votes[votes["email"].isin(HUMANS)])
+    return labels[labels["category"] != UNKNOWN]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the local pre-classifier on the derived annotations"
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help="Confidence threshold of the saved classifier",
+    )
+    parser.add_argument(
+        "--test-size",
+        type=float,
+        default=0.2,
+        help="Fraction of the lines held out for evaluation",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=42,
+        help="Seed of the train/held-out split",
+    )
+    args = parser.parse_args()
+
+    derived = pd.read_csv(DIR_DATA / "annotations" / "annotations.derived.csv")
+    with Db().session() as db:
+        df = training_data(db, derived)
+
+    counts = df["category"].value_counts()
+    stratify = df["category"] if counts.min() >= 2 else None
+    train, held_out = train_test_split(
+        df, test_size=args.test_size, random_state=args.seed, stratify=stratify
+    )
+
+    # Evaluate against human labels where the humans agree on a held-out line
+    reference = held_out
+    source = "consensus"
+    votes = DIR_DATA / "annotations" / "annotations.all.csv"
+    if votes.exists():
+        humans = held_out.drop(columns="category").merge(human_labels(votes), on=KEYS)
+        if len(humans) > 0:
+            reference, source = humans, "human"
+
+    print(f"== TRAINING on {len(train)} lines")
+    classifier = PreClassifier(threshold=args.threshold).fit(
+        train["dialogue"], train["category"]
+    )
+
+    print(f"== EVALUATING on {len(reference)} held-out lines ({source} labels)")
+    report = pd.DataFrame(
+        [
+            classifier.evaluate(reference["dialogue"], reference["category"], t)
+            for t in THRESHOLDS
+        ]
+    )
+    print(report.to_string(index=False, float_format="{:.3f}".format))
+
+    print(f"== SAVING classifier trained on all {len(df)} lines")
+    PreClassifier(threshold=args.threshold).fit(df["dialogue"], df["category"]).save()
+    print(f"Wrote {PATH_CLASSIFIER}")
+
+
+if __name__ == "__main__":
+    main()
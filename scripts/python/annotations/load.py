@@ -0,0 +1,46 @@
+import sys
+import argparse
+import pandas as pd
+
+from comp370.annotator.store import AnnotationStore
+from comp370.constants import DIR_DATA
+from comp370.db import Client as Db
+from comp370.db.tools.annotation import AnnotationTool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load annotations into the database")
+    parser.add_argument(
+        "-s",
+        "--store",
+        action="store_true",
+        help="Read the votes from the synced Label Studio store instead of annotations.all.csv",
+    )
+    args = parser.parse_args()
+
+    dir = DIR_DATA / "annotations"
+    derived = dir / "annotations.derived.csv"
+    if not derived.exists():
+        print(f"{derived} not found, process the annotations first")
+        sys.exit(1)
+
+    votes = (
+        AnnotationStore().read()
+        if args.store
+        else pd.read_csv(dir / "annotations.all.csv")
+    )
+
+    # Votes cast by the LLM ensemble (see data/annotate.py --annotator ensemble)
+    ensemble = dir / "annotations.ensemble.csv"
+    if ensemble.exists():
+        votes = pd.concat([votes, pd.read_csv(ensemble)], ignore_index=True)
+
+    with Db().session() as db:
+        tool = AnnotationTool(db)
+        print("== LOADING")
+        print(f"Loaded {tool.load(votes)} votes")
+        print(f"Loaded {tool.load_derived(pd.read_csv(derived))} derived annotations")
+
+
+if __name__ == "__main__":
+    main()
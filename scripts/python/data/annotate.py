@@ -8,21 +8,32 @@ from rich.progress import TextColumn
 from rich.progress import BarColumn
 from rich.progress import TaskProgressColumn
 from dotenv import load_dotenv
-from sqlalchemy.orm import joinedload
-from sqlalchemy import select
 from typing import Optional
 from typing import Callable
 
 from comp370.constants import DIR_DATA
 from comp370.annotator.codebooks import CODEBOOKS
 from comp370.annotator import Annotator
+from comp370.annotator import AnnotationRunner
+from comp370.annotator import ContextProvider
+from comp370.annotator.cache import AnnotationCache
+from comp370.annotator.consensus import KEYS
+from comp370.annotator.ensemble import MEMBERS
+from comp370.annotator.ensemble import EnsembleAnnotator
+from comp370.annotator.ensemble import to_votes
+from comp370.annotator.classifier import PATH_CLASSIFIER
+from comp370.annotator.classifier import PreClassifier
+from comp370.annotator.cache import context_hash
 from comp370.annotator.annotators import HumanAnnotator
 from comp370.annotator.annotators import OllamaAnnotator
 from comp370.db import Client as Db
-from comp370.db.models import Line
 
 load_dotenv()
 
+# Source of the lines labelled by the local pre-classifier (lines answered by
+# the LLM, now or in a cached run, have the model as their source)
+SOURCE_CLASSIFIER = "classifier"
+
 
 def annotate(
     annotator: Annotator,
@@ -32,14 +43,10 @@ def annotate(
     df = df.copy(deep=True)
 
     with Db().session() as session:
-        for row in df.itertuples():
-            line = session.execute(
-                select(Line)
-                .options(joinedload(Line.character))
-                .filter(Line.id == row.id)  # type: ignore
-            ).scalar_one()
+        annotator.contexts = ContextProvider(session)
+        for i, line in enumerate(annotator.contexts.lines(df)):
             category = annotator.annotate(line)
-            df.at[row.Index, "category"] = category  # type: ignore
+            df.at[df.index[i], "category"] = category  # type: ignore
 
             if tick is not None:
                 tick()
@@ -47,6 +54,107 @@ def annotate(
     return df
 
 
+def annotate_concurrently(
+    annotator: OllamaAnnotator,
+    runner: AnnotationRunner,
+    df: pd.DataFrame,
+    tick: Optional[Callable] = None,
+    classifier: Optional[PreClassifier] = None,
+) -> pd.DataFrame:
+    df = df.copy(deep=True)
+    cache = annotator.cache
+
+    # Prompts are built up front, so the database is not queried concurrently
+    with Db().session() as session:
+        annotator.contexts = ContextProvider(session)
+        lines = annotator.contexts.prefetch(df["id"])
+        contexts = {
+            id: annotator.context(line, n=annotator.context_size)
+            for id, line in lines.items()
+        }
+        keys = [(id, context_hash(lines[id], contexts[id])) for id in df["id"]]
+
+        # Lines annotated by a previous run are not sent again
+        cached = {}
+        if cache is not None:
+            cached = cache.get_many(annotator.model, annotator.template, keys)
+        categories = [cached.get(key) for key in keys]
+        sources = [annotator.model if key in cached else None for key in keys]
+        todo = [i for i, key in enumerate(keys) if key not in cached]
+
+        # Lines the local classifier is confident about are not sent either
+        if classifier is not None and todo:
+            local = classifier.classify([lines[keys[i][0]].dialogue for i in todo])
+            for i, category in zip(todo, local):
+                categories[i] = category
+                if category is not None:
+                    sources[i] = SOURCE_CLASSIFIER
+            skipped = sum(category is not None for category in local)
+            print(f" - {skipped}/{len(todo)} lines labelled by the local classifier")
+            todo = [i for i, category in zip(todo, local) if category is None]
+
+        describe = annotator.entry if runner.batch_size > 1 else annotator.prompt
+        items = [describe(lines[keys[i][0]], contexts[keys[i][0]]) for i in todo]
+
+    if tick is not None:
+        for _ in range(len(keys) - len(todo)):
+            tick(None)
+
+    def store(result):
+        i = todo[result.index]
+        categories[i] = result.category
+        if result.category is not None:
+            sources[i] = annotator.model
+        if cache is not None and result.category is not None:
+            cache.put(annotator.model, annotator.template, *keys[i], result.category)
+        if tick is not None:
+            tick(result)
+
+    results = runner.annotate(annotator, items, tick=store)
+
+    failed = [r for r in results if r.error is not None]
+    for result in failed:
+        print(
+            f" - Failed to annotate line {keys[todo[result.index]][0]}: {result.error}"
+        )
+
+    df["category"] = categories
+    df["source"] = sources
+    return df
+
+
+def annotate_ensemble(
+    ensemble: EnsembleAnnotator,
+    df: pd.DataFrame,
+    votes: pd.DataFrame,
+    tick: Optional[Callable] = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    df = df.copy(deep=True)
+
+    # Members share the codebook, so any of them can build the prompts
+    annotator = next(iter(ensemble.members.values()))
+    with Db().session() as session:
+        annotator.contexts = ContextProvider(session)
+        prompts = [annotator.prompt(line) for line in annotator.contexts.lines(df)]
+
+    keys = df.rename(
+        columns={
+            "season": "season_number",
+            "episode": "episode_number",
+            "number": "line_number",
+        }
+    )
+
+    # Freshly sampled lines have no outside votes, so a clear lead settles them
+    outside = ensemble.outside_votes(keys, votes)
+    results = ensemble.annotate(prompts, tick=tick, outside=outside)
+    decided = sum(result.decided for result in results)
+    print(f" - {decided}/{len(results)} lines decided before every model voted")
+
+    df["category"] = [result.category for result in results]
+    return df, to_votes(results, keys)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Annotate lines of dialogue")
     parser.add_argument(
@@ -70,6 +178,55 @@ def main():
         default=None,
         help="Codebook to use for annotation",
     )
+    parser.add_argument(
+        "-j",
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of requests in flight (LLM only)",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of lines annotated per request (LLM only)",
+    )
+    parser.add_argument(
+        "--no-examples",
+        action="store_true",
+        help="Leave the codebook examples out of the prompt (LLM only)",
+    )
+    parser.add_argument(
+        "--classifier",
+        action="store_true",
+        help="Label confident lines with the local pre-classifier (LLM only)",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=None,
+        help="Confidence threshold of the local pre-classifier",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Annotate every line again instead of reusing cached results (LLM only)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=120.0,
+        help="Seconds each model has to vote on a line (ensemble only)",
+    )
+    parser.add_argument(
+        "-r",
+        "--rate",
+        type=float,
+        default=None,
+        help="Maximum requests per second to the model (LLM only)",
+    )
     args = parser.parse_args()
 
     # Check codebook
@@ -113,10 +270,62 @@ def main():
                 api_key,
                 model=args.model,
                 codebook=CODEBOOKS[args.codebook],
+                cache=None if args.no_cache else AnnotationCache(),
+                examples=not args.no_examples,
+            )
+        case "ensemble":
+            if "OLLAMA_API_KEY" not in os.environ:
+                print("OLLAMA_API_KEY not set")
+                sys.exit(1)
+
+            annotator = EnsembleAnnotator(
+                {
+                    email: OllamaAnnotator(
+                        os.environ["OLLAMA_API_KEY"],
+                        model=model,
+                        codebook=CODEBOOKS[args.codebook],
+                        examples=not args.no_examples,
+                    )
+                    for email, model in MEMBERS.items()
+                },
+                runner=AnnotationRunner(
+                    concurrency=args.concurrency,
+                    rate_limits={}
+                    if args.rate is None
+                    else {model: args.rate for model in MEMBERS.values()},
+                ),
+                timeout=args.timeout,
             )
         case _:
             raise ValueError(f"Annotator {args.annotator} not implemented")
 
+    classifier = None
+    if args.classifier:
+        if not PATH_CLASSIFIER.exists():
+            print(f"No classifier at {PATH_CLASSIFIER} (run annotations:classifier)")
+            sys.exit(1)
+        classifier = PreClassifier.load()
+        if args.threshold is not None:
+            classifier.threshold = args.threshold
+
+    runner = AnnotationRunner(
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        rate_limits={} if args.rate is None else {args.model: args.rate},
+    )
+
+    # Votes cast so far, which the ensemble's votes will be merged with
+    votes = pd.DataFrame(columns=["email"] + KEYS)
+    if args.annotator == "ensemble":
+        recorded = [
+            DIR_DATA / "annotations" / "annotations.all.csv",
+            DIR_DATA / "annotations" / "annotations.ensemble.csv",
+        ]
+        votes = pd.concat(
+            [votes] + [pd.read_csv(path) for path in recorded if path.exists()],
+            ignore_index=True,
+        )
+
     print("== ANNOTATING")
     slugs = pd.read_csv(DIR_DATA / "characters.side.tsv", sep="\t")["slug"].tolist()
     for slug in slugs:
@@ -128,6 +337,33 @@ def main():
         # Annotate data
         if args.annotator == "human":
             df_annotated = annotate(annotator, df)
+        elif args.annotator == "ensemble":
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(),
+                TaskProgressColumn(),
+            ) as bar:
+                task = bar.add_task(
+                    f"Annotating lines.{slug}.tsv...",
+                    total=len(df),
+                )
+                df_annotated, df_votes = annotate_ensemble(
+                    annotator,
+                    df,
+                    votes,
+                    tick=lambda _: bar.update(task, advance=1),
+                )
+
+            # Votes are kept in the Label Studio export schema for process.py
+            votes_file = DIR_DATA / "annotations" / "annotations.ensemble.csv"
+            votes_file.parent.mkdir(parents=True, exist_ok=True)
+            df_votes.to_csv(
+                votes_file,
+                mode="a",
+                header=not votes_file.exists(),
+                index=False,
+            )
         else:
             with Progress(
                 SpinnerColumn(),
@@ -139,10 +375,12 @@ def main():
                     f"Annotating lines.{slug}.tsv...",
                     total=len(df),
                 )
-                df_annotated = annotate(
+                df_annotated = annotate_concurrently(
                     annotator,
+                    runner,
                     df,
-                    tick=lambda: bar.update(task, advance=1),
+                    tick=lambda _: bar.update(task, advance=1),
+                    classifier=classifier,
                 )
 
         # Save annotated data
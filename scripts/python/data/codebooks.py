@@ -0,0 +1,32 @@
+import argparse
+
+import pandas as pd
+
+from comp370.annotator.codebooks import CODEBOOKS
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report the prompt size of every codebook serialization"
+    )
+    parser.add_argument(
+        "-c",
+        "--codebook",
+        type=str,
+        default=None,
+        help="Only report this codebook",
+    )
+    args = parser.parse_args()
+
+    names = [args.codebook] if args.codebook else list(CODEBOOKS)
+    for name in names:
+        report = pd.DataFrame(CODEBOOKS[name].token_report())
+        print(f"== {name}")
+        print(report.to_string(index=False))
+        print()
+
+    print("Token counts are estimates (BPE-style pre-tokenization).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import argparse
+from pathlib import Path
+
+from comp370.downloads import precompress
+from comp370.constants import DIR_DATA
+from comp370.db.snapshot import Snapshot
+
+# Files served by the /download routes
+DOWNLOADS = [
+    Snapshot().path,
+    DIR_DATA / "statistics" / "statistics.tfidf.csv",
+    DIR_DATA / "statistics" / "statistics.topics.csv",
+    DIR_DATA / "annotations" / "annotations.derived.csv",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress downloadable files")
+    parser.add_argument(
+        "files",
+        type=Path,
+        nargs="*",
+        help="Files to precompress (defaults to every downloadable file)",
+    )
+    parser.add_argument(
+        "-l",
+        "--level",
+        type=int,
+        default=9,
+        help="Compression level",
+    )
+    args = parser.parse_args()
+
+    for path in args.files or DOWNLOADS:
+        if not path.exists():
+            print(f"Skipping {path} (missing)")
+            continue
+        for written in precompress(path, args.level):
+            print(f"Wrote {written}")
+
+
+if __name__ == "__main__":
+    main()
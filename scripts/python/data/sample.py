@@ -2,6 +2,11 @@ import argparse
 import pandas as pd
 
 from comp370.constants import DIR_DATA
+from comp370.db import Client as Db
+from comp370.db.tools.character import CharacterTool
+from comp370.db.tools.sample import SEED
+from comp370.db.tools.sample import STRATA
+from comp370.db.tools.sample import SampleTool
 
 
 def main():
@@ -11,26 +16,60 @@ def main():
         "--num",
         type=int,
         default=5,
-        help="Number of lines to sample",
+        help="Number of lines to sample per character",
+    )
+    parser.add_argument(
+        "-l",
+        "--minimum-length",
+        type=int,
+        default=15,
+        help="Minimum dialogue length of a sampled line",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=SEED,
+        help="Seed of the random sample",
+    )
+    parser.add_argument(
+        "--strata",
+        nargs="*",
+        choices=STRATA,
+        default=list(STRATA),
+        help="Columns lines are stratified by within a character",
     )
     args = parser.parse_args()
 
     print("== SAMPLING")
-    slugs = pd.read_csv(DIR_DATA / "characters.side.tsv", sep="\t")["slug"].tolist()
-    for slug in slugs:
-        df = pd.read_csv(
-            DIR_DATA / "lines" / "extracted" / f"lines.{slug}.tsv", sep="\t"
+    characters = pd.read_csv(DIR_DATA / "characters.side.tsv", sep="\t")
+    with Db().session() as db:
+        # Files extracted before ids were recorded only have slugs
+        if "id" not in characters.columns:
+            ids = CharacterTool(db).ids_by_slug(characters["slug"].tolist())
+            for missing in sorted(set(characters["slug"]) - set(ids)):
+                print(f" - {missing}: Character not found, skipping...")
+            characters = characters[characters["slug"].isin(ids)].assign(
+                id=lambda df: df["slug"].map(ids)
+            )
+
+        samples = SampleTool(db).sample(
+            characters["id"],
+            args.num,
+            seed=args.seed,
+            minimum_length=args.minimum_length,
+            strata=args.strata,
         )
 
-        if len(df) <= 0:
+    for slug, id in zip(characters["slug"], characters["id"]):
+        sample = samples[int(id)]
+        if len(sample) <= 0:
             print(f" - {slug}: No lines found, skipping...")
             continue
-        elif len(df) < args.num:
-            print(f" - {slug}: Only {len(df)} lines found, shuffling...")
-            sample = df.sample(n=len(df), random_state=42, replace=False)
+        elif len(sample) < args.num:
+            print(f" - {slug}: Only {len(sample)} lines found, shuffling...")
         else:
             print(f" - {slug}: Sampling {args.num} lines...")
-            sample = df.sample(n=args.num, random_state=42, replace=False)
 
         output_file = DIR_DATA / "lines" / "sampled" / f"lines.{slug}.tsv"
         output_file.parent.mkdir(parents=True, exist_ok=True)
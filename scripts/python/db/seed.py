@@ -58,6 +58,7 @@ def main():
             __characters__,
             __episodes__,
         )
+        seeder.write_summaries()
 
         print("== Done!")
         print(f"Seasons: {len(__seasons__.keys())}")
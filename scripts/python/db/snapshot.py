@@ -0,0 +1,44 @@
+import sys
+import argparse
+
+from comp370.db.snapshot import Snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the database snapshot")
+    parser.add_argument(
+        "-c",
+        "--check",
+        action="store_true",
+        help="Only check whether the snapshot is stale (exit 1 if so)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild the snapshot even if it is up to date",
+    )
+    args = parser.parse_args()
+
+    snapshot = Snapshot()
+    stale = snapshot.is_stale()
+
+    if args.check:
+        print("Snapshot is " + ("stale" if stale else "up to date"))
+        sys.exit(1 if stale else 0)
+
+    if not stale and not args.force:
+        print(f"Snapshot is up to date ({snapshot.info()['sha256']})")
+        return
+
+    print("== SNAPSHOTTING")
+    path = snapshot.build(force=args.force)
+    if path is None:
+        print(f"No database at {snapshot.source}")
+        sys.exit(1)
+    info = snapshot.info()
+    print(f"Wrote {path} ({info['size']} bytes, {info['sha256']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import sys
+import argparse
+
+from comp370.db import Client as Db
+from comp370.db.tools.summary import SummaryTool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh summary tables")
+    parser.add_argument(
+        "-c",
+        "--check",
+        action="store_true",
+        help="Only check whether the summary tables are stale (exit 1 if so)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild the summary tables even if they are up to date",
+    )
+    args = parser.parse_args()
+
+    with Db().session() as db:
+        tool = SummaryTool(db)
+        stale = tool.is_stale()
+
+        if args.check:
+            print("Summary tables are " + ("stale" if stale else "up to date"))
+            sys.exit(1 if stale else 0)
+
+        if not stale and not args.force:
+            print(f"Summary tables are up to date (built {tool.built_at()})")
+            return
+
+        print("== SUMMARIZING")
+        tool.refresh()
+        print(f"Summary tables built {tool.built_at()}")
+
+
+if __name__ == "__main__":
+    main()
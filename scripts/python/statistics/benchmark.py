@@ -0,0 +1,90 @@
+import os
+import time
+import argparse
+from sqlalchemy import select
+
+from comp370.nlp import SpaCy
+from comp370.nlp.preprocess import Preprocessor
+from comp370.nlp.preprocess import expand
+from comp370.nlp.preprocess import keep_token
+from comp370.nlp.preprocess import is_meaningful
+from comp370.db import Client as Db
+from comp370.db.models import Line
+
+
+def reference_tokens(nlp, texts: list[str]) -> list[str]:
+    """Preprocessing as originally done in idf.py, one full parse per line."""
+    out = []
+    for text in texts:
+        doc = nlp(expand(text).lower())
+        out.append(" ".join(token.lemma_ for token in doc if keep_token(token)))
+    return out
+
+
+def reference_ngrams(nlp, terms: list[str]) -> dict[str, bool]:
+    """N-gram checks as originally done in idf.py, one full parse per term."""
+    return {term: is_meaningful(nlp(term)) for term in terms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dialogue preprocessing")
+    parser.add_argument(
+        "-n",
+        "--num",
+        type=int,
+        default=5_000,
+        help="Number of lines to preprocess",
+    )
+    parser.add_argument(
+        "-p",
+        "--processes",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes for the batched pipeline",
+    )
+    args = parser.parse_args()
+
+    with Db().session() as db:
+        texts = (
+            db.execute(select(Line.dialogue).order_by(Line.id).limit(args.num))
+            .scalars()
+            .all()
+        )
+
+    nlp = SpaCy.load("en_core_web_sm")
+    print(f"== {len(texts)} lines")
+
+    start = time.perf_counter()
+    expected = reference_tokens(nlp, texts)
+    before = time.perf_counter() - start
+    print(f"Per line: {before:.2f}s ({len(texts) / before:,.0f} lines/s)")
+
+    preprocessor = Preprocessor(nlp, n_process=args.processes)
+    actual = preprocessor.tokens(texts)
+    after = preprocessor.timings["tokens"]
+    print(f"Batched:  {after:.2f}s ({len(texts) / after:,.0f} lines/s)")
+
+    # Every bigram of the output, with repeats as tf_idf_by_category sees them
+    terms = [
+        " ".join(pair)
+        for tokens in actual
+        for pair in zip(tokens.split(), tokens.split()[1:])
+    ]
+
+    start = time.perf_counter()
+    expected_ngrams = reference_ngrams(nlp, terms)
+    before = time.perf_counter() - start
+    print(f"N-grams per term: {before:.2f}s ({len(terms)} terms)")
+
+    actual_ngrams = preprocessor.meaningful_ngrams(terms)
+    after = preprocessor.timings["ngrams"]
+    print(f"N-grams memoized: {after:.2f}s ({len(set(terms))} distinct)")
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    print(f"Parity: {len(texts) - len(mismatches)}/{len(texts)} lines match")
+    assert not mismatches, [(expected[i], actual[i]) for i in mismatches[:10]]
+    assert expected_ngrams == actual_ngrams
+
+
+if __name__ == "__main__":
+    main()
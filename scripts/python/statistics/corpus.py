@@ -0,0 +1,73 @@
+import os
+import sys
+import argparse
+
+from comp370.nlp import SpaCy
+from comp370.nlp.preprocess import Preprocessor
+from comp370.db import Client as Db
+from comp370.statistics import Corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the corpus document-term matrix"
+    )
+    parser.add_argument(
+        "-c",
+        "--check",
+        action="store_true",
+        help="Only check whether the corpus is stale (exit 1 if so)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild the corpus even if it is up to date",
+    )
+    parser.add_argument(
+        "--raw",
+        action="store_true",
+        help="Use lowercased dialogue instead of preprocessed tokens",
+    )
+    parser.add_argument(
+        "-n",
+        "--max-ngram",
+        type=int,
+        default=4,
+        help="Maximum n-gram size",
+    )
+    args = parser.parse_args()
+
+    preprocessor = None
+    if not args.raw:
+        preprocessor = Preprocessor(
+            SpaCy.load("en_core_web_sm"),
+            n_process=int(os.environ.get("SPACY_N_PROCESS", 1)),
+        )
+
+    with Db().session() as db:
+        stale = not Corpus.exists()
+        if not stale:
+            corpus = Corpus.load()
+            tokenizer = preprocessor.fingerprint() if preprocessor else None
+            stale = corpus.is_stale(db) or corpus.meta.get("tokenizer") != tokenizer
+
+        if args.check:
+            print("Corpus is " + ("stale" if stale else "up to date"))
+            sys.exit(1 if stale else 0)
+
+        if not stale and not args.force:
+            print("Corpus is up to date")
+            return
+
+        print("== BUILDING CORPUS")
+        corpus = Corpus.build(db, preprocessor, max_ngram=args.max_ngram)
+        corpus.save()
+        lines, terms = corpus.matrix.shape
+        print(
+            f"Corpus built: {lines} lines x {terms} terms, {corpus.matrix.nnz} entries"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,33 @@
 """
 Interactive Seinfeld Character Dialogue Explorer
 Visualize character dialogue patterns across seasons and topics using Bokeh
+
+Chart data is fetched from the statistics API when the page is opened, and
+the characters, heatmap topics and color range follow the fetched data. The
+stacked bars (one renderer per topic) and the per-character season tabs are
+laid out when the page is generated, so it only needs regenerating when the
+set of topics or characters changes.
 """
 
+from urllib.parse import urlencode
+
 import pandas as pd
 from bokeh.plotting import figure, output_file, save
 from bokeh.layouts import column
 from bokeh.models import (
-    ColumnDataSource,
+    AjaxDataSource,
     HoverTool,
     Tabs,
     TabPanel,
     Div,
     Button,
     CustomJS,
+    FactorRange,
+    LinearColorMapper,
 )
 from bokeh.palettes import Category10_8
 
+from comp370.statistics.api import overall_topics
 from comp370.constants import DIR_DATA
 
 
@@ -27,6 +38,45 @@ def load_data(filepath):
     return df
 
 
+def api_source(name, **filters):
+    """Data source loaded from the statistics API when the page is opened"""
+    url = f"/api/statistics/{name}"
+    if filters:
+        url += "?" + urlencode(filters)
+    return AjaxDataSource(data_url=url, method="GET", polling_interval=None)
+
+
+def follow_factors(source, factor_range, field):
+    """Set the factors of a range to the sorted values of a column once loaded"""
+    source.js_on_change(
+        "data",
+        CustomJS(
+            args=dict(factor_range=factor_range, field=field),
+            code="""
+        const values = cb_obj.data[field] || [];
+        factor_range.factors = [...new Set(values.map(String))].sort();
+    """,
+        ),
+    )
+
+
+def follow_extent(source, mapper, field):
+    """Set the low and high of a color mapper to the extent of a column once loaded"""
+    source.js_on_change(
+        "data",
+        CustomJS(
+            args=dict(mapper=mapper, field=field),
+            code="""
+        const values = Array.from(cb_obj.data[field] || []).filter(Number.isFinite);
+        if (values.length) {
+            mapper.low = Math.min(...values);
+            mapper.high = Math.max(...values);
+        }
+    """,
+        ),
+    )
+
+
 def create_download_buttons():
     button_a = Button(label="Download comp370.db", button_type="default", width=200)
     button_a.js_on_click(
@@ -83,28 +133,14 @@ def create_download_buttons():
 
 def create_stacked_bar_chart(df, title="Character Dialogue by Topic"):
     """Create stacked bar chart for overall topic distribution"""
-    overall_data = df[df["scope"] == "overall"].copy()
-
-    characters = list(overall_data["character"].unique())
-    topics = list(overall_data["topic"].unique())
-
-    # Prepare data for stacking
-    data = {"characters": characters}
+    # One renderer per topic, so topics are fixed when the page is generated
+    topics = [c for c in overall_topics(df).columns if c != "character"]
     colors = Category10_8[: len(topics)]
 
-    for topic in topics:
-        data[topic] = []
-        for char in characters:
-            mask = (overall_data["character"] == char) & (
-                overall_data["topic"] == topic
-            )
-            ratio = overall_data[mask]["ratio"].values
-            data[topic].append(ratio[0] if len(ratio) > 0 else 0)
-
     width = 900
     height = int(width * 3 / 4)
     p = figure(
-        x_range=characters,  # type: ignore
+        x_range=FactorRange(),
         width=width,
         height=height,
         title=title,
@@ -114,12 +150,13 @@ def create_stacked_bar_chart(df, title="Character Dialogue by Topic"):
         border_fill_color="white",
     )
 
-    # Create stacked bars using vbar_stack
-    source = ColumnDataSource(data=data)
+    # Create stacked bars using vbar_stack, one column per topic
+    source = api_source("topics/overall")
+    follow_factors(source, p.x_range, "character")
 
     p.vbar_stack(
         topics,
-        x="characters",
+        x="character",
         width=0.8,
         color=colors,
         legend_label=topics,
@@ -136,7 +173,7 @@ def create_stacked_bar_chart(df, title="Character Dialogue by Topic"):
 
     hover = HoverTool(
         tooltips=[
-            ("Character", "@characters"),
+            ("Character", "@character"),
             ("Topic", "$name"),
             ("Value", "@$name{0.0%}"),
         ]
@@ -170,71 +207,49 @@ def create_season_line_chart(df, character_name):
     topics = char_data["topic"].unique()
     colors = Category10_8[: len(topics)]
 
-    for i, topic in enumerate(topics):
-        topic_data = char_data[char_data["topic"] == topic].sort_values("season")
-
-        source = ColumnDataSource(
-            data=dict(
-                season=topic_data["season"].astype(str),
-                ratio=topic_data["ratio"],
-                lines=topic_data["topic_lines"],
-                total=topic_data["total_lines"],
-            )
-        )
+    # One row per season, with a ratio and a lines column per topic
+    source = api_source("topics/seasons", character=character_name)
 
-        p.line(
+    for i, topic in enumerate(topics):
+        line = p.line(
             "season",
-            "ratio",
+            topic,
             source=source,
             legend_label=topic,
             color=colors[i],
             line_width=2,
         )
-        p.scatter("season", "ratio", source=source, color=colors[i], size=8)
+        p.scatter("season", topic, source=source, color=colors[i], size=8)
+
+        hover = HoverTool(
+            renderers=[line],
+            tooltips=[
+                ("Season", "@season"),
+                ("Ratio", f"@{{{topic}}}{{0.0%}}"),
+                ("Topic Lines", f"@{{{topic}_lines}}"),
+                ("Total Lines", "@total_lines"),
+            ],
+        )
+        p.add_tools(hover)
 
     p.legend.location = "top_right"
     p.legend.click_policy = "hide"
     p.xaxis.axis_label = "Season"
     p.yaxis.axis_label = "Proportion of Lines"
 
-    hover = HoverTool(
-        tooltips=[
-            ("Season", "@season"),
-            ("Ratio", "@ratio{0.0%}"),
-            ("Topic Lines", "@lines"),
-            ("Total Lines", "@total"),
-        ]
-    )
-    p.add_tools(hover)
-
     return p
 
 
 def create_topic_comparison(df):
     """Create grouped bar chart comparing characters on a specific topic"""
-    overall_data = df[df["scope"] == "overall"].copy()
-
-    # Get all unique topics and characters
-    topics = sorted(overall_data["topic"].unique())
-    characters = sorted(overall_data["character"].unique())
-
     # Start with first topic
-    topic = topics[0]
-    topic_data = overall_data[overall_data["topic"] == topic]
-
-    source = ColumnDataSource(
-        data=dict(
-            characters=topic_data["character"].tolist(),
-            ratios=topic_data["ratio"].tolist(),
-            lines=topic_data["topic_lines"].tolist(),
-            total=topic_data["total_lines"].tolist(),
-        )
-    )
+    topic = sorted(df[df["scope"] == "overall"]["topic"].unique())[0]
+    source = api_source("topics", scope="overall", topic=topic)
 
     width = 900
     height = int(width * 3 / 4)
     p = figure(
-        x_range=characters,  # type:  ignore
+        x_range=FactorRange(),
         width=width,
         height=height,
         title=f"Character Comparison: {topic}",
@@ -244,8 +259,10 @@ def create_topic_comparison(df):
         border_fill_color="white",
     )
 
+    follow_factors(source, p.x_range, "character")
+
     p.vbar(
-        x="characters", top="ratios", width=0.7, source=source, color="navy", alpha=0.8
+        x="character", top="ratio", width=0.7, source=source, color="navy", alpha=0.8
     )
 
     p.xaxis.major_label_orientation = 45
@@ -253,10 +270,10 @@ def create_topic_comparison(df):
 
     hover = HoverTool(
         tooltips=[
-            ("Character", "@characters"),
-            ("Ratio", "@ratios{0.0%}"),
-            ("Topic Lines", "@lines"),
-            ("Total Lines", "@total"),
+            ("Character", "@character"),
+            ("Ratio", "@ratio{0.0%}"),
+            ("Topic Lines", "@topic_lines"),
+            ("Total Lines", "@total_lines"),
         ]
     )
     p.add_tools(hover)
@@ -264,43 +281,20 @@ def create_topic_comparison(df):
     return p
 
 
-def create_character_heatmap(df):
+def create_character_heatmap():
     """Create a heatmap showing all characters and topics"""
-    overall_data = df[df["scope"] == "overall"].copy()
-
-    # Pivot the data
-    pivot_data = overall_data.pivot(index="character", columns="topic", values="ratio")
+    # One row per (character, topic)
+    source = api_source("topics", scope="overall")
 
-    characters = list(pivot_data.index)
-    topics = list(pivot_data.columns)
-
-    # Prepare data for heatmap
-    char_list = []
-    topic_list = []
-    ratio_list = []
-
-    for char in characters:
-        for topic in topics:
-            char_list.append(char)
-            topic_list.append(topic)
-            ratio_list.append(pivot_data.loc[char, topic])
-
-    source = ColumnDataSource(
-        data=dict(character=char_list, topic=topic_list, ratio=ratio_list)
-    )
-
-    from bokeh.models import LinearColorMapper
     from bokeh.palettes import RdYlBu11
 
-    mapper = LinearColorMapper(
-        palette=RdYlBu11[::-1], low=min(ratio_list), high=max(ratio_list)
-    )
+    mapper = LinearColorMapper(palette=RdYlBu11[::-1], low=0, high=1)
 
     width = 900
     height = int(width * 3 / 4)
     p = figure(
-        x_range=topics,  # type:  ignore
-        y_range=characters,  # type:  ignore
+        x_range=FactorRange(),
+        y_range=FactorRange(),
         width=width,
         height=height,
         title="Character-Topic Heatmap (Overall)",
@@ -320,6 +314,10 @@ def create_character_heatmap(df):
         line_color=None,
     )
 
+    follow_factors(source, p.x_range, "topic")
+    follow_factors(source, p.y_range, "character")
+    follow_extent(source, mapper, "ratio")
+
     p.xaxis.major_label_orientation = 45
 
     hover = HoverTool(
@@ -353,7 +351,7 @@ def create_dashboard(df):
 
     # Create visualizations
     stacked_bars = create_stacked_bar_chart(df)
-    heatmap = create_character_heatmap(df)
+    heatmap = create_character_heatmap()
 
     # Create season evolution charts for each character
     characters = df["character"].unique()
@@ -0,0 +1,55 @@
+import sys
+import argparse
+import pandas as pd
+
+from comp370.db import Client as Db
+from comp370.statistics.corpus import Corpus
+from comp370.statistics.engine import KEYS
+from comp370.statistics.engine import StatisticsEngine
+from comp370.constants import DIR_DATA
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the statistics partitions")
+    parser.add_argument(
+        "-c",
+        "--check",
+        action="store_true",
+        help="Only check whether any season is stale (exit 1 if so)",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Rebuild every season even if it is up to date",
+    )
+    args = parser.parse_args()
+
+    path = DIR_DATA / "annotations" / "annotations.derived.csv"
+    if path.exists():
+        annotations = pd.read_csv(path)
+    else:
+        annotations = pd.DataFrame(columns=KEYS + ["category"])
+
+    if not Corpus.exists():
+        print("No corpus found, build it first (task statistics:corpus)")
+        sys.exit(1)
+
+    with Db().session() as db:
+        engine = StatisticsEngine(db, Corpus.load())
+
+        if args.check:
+            stale = engine.stale(annotations)
+            print(f"Stale seasons: {stale}" if stale else "Statistics are up to date")
+            sys.exit(1 if stale else 0)
+
+        print("== REFRESHING STATISTICS")
+        seasons = engine.refresh(annotations, force=args.force)
+        if seasons:
+            print(f"Rebuilt seasons: {', '.join(str(s) for s in seasons)}")
+        else:
+            print("Statistics are up to date")
+
+
+if __name__ == "__main__":
+    main()
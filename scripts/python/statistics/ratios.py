@@ -0,0 +1,142 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from comp370.statistics.topics import topic_ratios
+
+CATEGORIES = [
+    "Food",
+    "Relationships",
+    "Work",
+    "Money",
+    "Lifestyle",
+    "Culture",
+    "Health",
+    "Miscellaneous",
+    "UNKNOWN",
+]
+
+
+def synthesize(n: int, characters: int, seed: int = 42):
+    """Generate n random annotations and line totals for some characters."""
+    rng = np.random.default_rng(seed)
+    names = np.array([f"Character {i}" for i in range(characters)])
+    annotations = pd.DataFrame(
+        {
+            "character": rng.choice(names[: characters * 3 // 4], n),
+            "season_number": rng.integers(1, 10, n),
+            "category": rng.choice(CATEGORIES, n),
+        }
+    )
+
+    # Every character has more lines than annotations; some have lines but
+    # no annotations, some have no lines at all
+    counts = annotations.groupby(["character", "season_number"]).size()
+    season_totals = counts + rng.integers(0, 50, len(counts))
+    season_totals.index = season_totals.index.set_names(["character", "season"])
+    totals = season_totals.groupby(level="character").sum()
+    totals = totals.reindex(names, fill_value=0) + rng.integers(0, 2, characters) * 10
+    return annotations, totals, season_totals
+
+
+def reference(df_annotations, characters, season_totals):
+    """Topic ratios as originally computed in topics.py."""
+    df = df_annotations[df_annotations["character"].isin(characters.keys())].copy()
+    topics = df["category"].dropna().unique()
+    results = []
+
+    for char_name in characters.keys():
+        char_df = df[df["character"] == char_name]
+        if len(char_df) == 0:
+            continue
+        seasons = sorted(char_df["season_number"].dropna().unique())
+        for season in seasons:
+            season_df = char_df[char_df["season_number"] == season]
+            total_lines = season_totals.get((char_name, int(season)), 0)
+            if total_lines == 0:
+                continue
+            for topic in topics:
+                if topic in ["Miscellaneous", "UNKNOWN"]:
+                    continue
+                topic_lines = len(season_df[season_df["category"] == topic])
+                results.append(
+                    {
+                        "character": char_name,
+                        "season": int(season),
+                        "topic": topic,
+                        "topic_lines": topic_lines,
+                        "total_lines": total_lines,
+                        "ratio": topic_lines / total_lines,
+                        "scope": "season",
+                    }
+                )
+
+    for char_name in characters.keys():
+        char_df = df[df["character"] == char_name]
+        total_lines = characters[char_name]
+        if total_lines == 0:
+            continue
+        for topic in topics:
+            if topic in ["Miscellaneous", "UNKNOWN"]:
+                continue
+            topic_lines = len(char_df[char_df["category"] == topic])
+            results.append(
+                {
+                    "character": char_name,
+                    "season": "overall",
+                    "topic": topic,
+                    "topic_lines": topic_lines,
+                    "total_lines": total_lines,
+                    "ratio": topic_lines / total_lines,
+                    "scope": "overall",
+                }
+            )
+
+    df_results = pd.DataFrame(results)
+    df_results["season_sort"] = df_results["season"].apply(
+        lambda x: 999 if x == "overall" else int(x)
+    )
+    df_results = df_results.sort_values(["character", "season_sort", "topic"]).drop(
+        "season_sort", axis=1
+    )
+    return df_results.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark topic ratios")
+    parser.add_argument(
+        "-n",
+        "--num",
+        type=int,
+        default=100_000,
+        help="Number of synthetic annotations",
+    )
+    parser.add_argument(
+        "-c",
+        "--characters",
+        type=int,
+        default=1_000,
+        help="Number of characters",
+    )
+    args = parser.parse_args()
+
+    annotations, totals, season_totals = synthesize(args.num, args.characters)
+    print(f"== {len(annotations)} annotations over {len(totals)} characters")
+
+    start = time.perf_counter()
+    actual = topic_ratios(annotations, totals, season_totals)
+    elapsed = time.perf_counter() - start
+    print(f"Vectorised: {elapsed:.2f}s ({len(actual)} rows)")
+
+    start = time.perf_counter()
+    expected = reference(annotations, totals.to_dict(), season_totals.to_dict())
+    elapsed = time.perf_counter() - start
+    print(f"Reference:  {elapsed:.2f}s ({len(expected)} rows)")
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    print("Parity: outputs match")
+
+
+if __name__ == "__main__":
+    main()
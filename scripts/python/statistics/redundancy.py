@@ -0,0 +1,93 @@
+import time
+import argparse
+from collections import defaultdict
+import numpy as np
+
+from comp370.statistics.terms import ngram_sizes
+from comp370.statistics.terms import term_words
+from comp370.statistics.terms import top_terms
+
+
+def synthesize(n: int, words: int = 5_000, seed: int = 42) -> np.ndarray:
+    """Generate n distinct random n-grams (up to 4 words) over a word list."""
+    rng = np.random.default_rng(seed)
+    terms = set()
+    while len(terms) < n:
+        size = rng.integers(1, 5)
+        terms.add(" ".join(f"w{w}" for w in rng.integers(0, words, size)))
+    return np.array(sorted(terms))
+
+
+def reference(vocab, score, candidates, top_k):
+    """Redundant n-gram removal as originally done in idf.py."""
+    ngram_groups = defaultdict(list)
+    for idx in sorted(candidates, key=lambda i: -score[i]):
+        ngram_groups[len(vocab[idx].split())].append(idx)
+
+    used_words = set()
+    non_redundant_terms = []
+    for n in sorted(ngram_groups.keys(), reverse=True):
+        for idx in ngram_groups[n]:
+            words = set(vocab[idx].split())
+            if words & used_words:
+                continue
+            non_redundant_terms.append(idx)
+            used_words.update(words)
+
+    non_redundant_terms.sort(key=lambda i: score[i], reverse=True)
+    return non_redundant_terms[:top_k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark n-gram redundancy removal")
+    parser.add_argument(
+        "-n",
+        "--num",
+        type=int,
+        default=100_000,
+        help="Number of terms in the vocabulary",
+    )
+    parser.add_argument(
+        "-c",
+        "--categories",
+        type=int,
+        default=20,
+        help="Number of categories to score",
+    )
+    parser.add_argument("-k", "--top-k", type=int, default=15)
+    args = parser.parse_args()
+
+    vocab = synthesize(args.num)
+    rng = np.random.default_rng(7)
+    scores = rng.random((args.categories, len(vocab)))
+    distinctiveness = rng.random((args.categories, len(vocab))) * 3
+    print(f"== {len(vocab)} terms, {args.categories} categories")
+
+    start = time.perf_counter()
+    words = term_words(vocab)
+    sizes = ngram_sizes(vocab)
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = []
+    for score, dist in zip(scores, distinctiveness):
+        (candidates,) = np.nonzero(dist > 1.5)
+        actual.append(top_terms(candidates, score, sizes, words, args.top_k).tolist())
+    elapsed = time.perf_counter() - start
+    print(f"Vectorised: {elapsed:.2f}s (+{setup:.2f}s to split terms once)")
+
+    start = time.perf_counter()
+    expected = []
+    for score, dist in zip(scores, distinctiveness):
+        candidates = [i for i in np.argsort(score)[::-1] if dist[i] > 1.5]
+        expected.append(reference(vocab, score, candidates, args.top_k))
+    elapsed = time.perf_counter() - start
+    print(f"Reference:  {elapsed:.2f}s")
+
+    matches = sum(a == e for a, e in zip(actual, expected))
+    print(f"Parity: {matches}/{len(expected)} categories match")
+    assert matches == len(expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,76 @@
+import json
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import spacy
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.routing import Route
+from starlette.routing import WebSocketRoute
 from starlette.testclient import TestClient
 
 from comp370.main import create_app
+from comp370.gql import Cardinalities
+from comp370.gql import GraphQLApp
+from comp370.gql import schema
+from comp370 import downloads
+from comp370.downloads import download
+from comp370.downloads import precompress
+from comp370.db import Client as Db
+from comp370.db.models import Character
+from comp370.db.models import Episode
+from comp370.db.models import Line
+from comp370.db.models import Season
+from comp370.db.snapshot import Snapshot
+from comp370.db.tools.statistics import StatisticsTool
+from comp370.db.tools.statistics import LineGroup
+from comp370.db.tools.statistics import LineFilter
+from comp370.db.tools.character import CharacterTool
+from comp370.db.tools.summary import SummaryTool
+from comp370.db.tools.annotation import AnnotationTool
+from comp370.db.tools.sample import SampleTool
+from comp370.db.tools.sample import allocate
+from comp370.db.tools.line import LineTool
+from comp370.db.tools.tokens import TokenTool
+from comp370.annotator import AnnotationRunner
+from comp370.annotator import Codebook
+from comp370.annotator import ContextProvider
+from comp370.annotator.annotators import OllamaAnnotator
+from comp370.annotator.codebooks import CODEBOOKS
+from comp370.annotator.cache import AnnotationCache
+from comp370.annotator.classifier import PreClassifier
+from comp370.annotator.classifier import training_data
+from comp370.annotator.cache import context_hash
+from comp370.annotator.consensus import consensus
+from comp370.annotator.ensemble import EnsembleAnnotator
+from comp370.annotator.ensemble import to_votes
+from comp370.annotator.store import AnnotationStore
+from comp370.annotator.store import sync
+from comp370.nlp.preprocess import Preprocessor
+from comp370.nlp.preprocess import expand
+from comp370.nlp.preprocess import is_meaningful
+from comp370.nlp.preprocess import keep_token
+from comp370.statistics import Corpus
+from comp370.statistics import StatisticsEngine
+from comp370.statistics.api import StatisticsApi
+from comp370.statistics.topics import topic_ratios
+from comp370.statistics.terms import ngram_sizes
+from comp370.statistics.terms import term_words
+from comp370.statistics.terms import top_terms
 
 
 def main():
@@ -61,6 +131,1408 @@ def main():
     assert data["data"]["lst"]["title"] == "The Finale Part 2"
     assert data["data"]["lst"]["writers"]["edges"][0]["node"]["name"] == "Larry David"
 
+    # Check the query cost is reported
+    assert data["extensions"]["cost"]["cost"] > 0
+    assert data["extensions"]["cost"]["depth"] == 2
+
+    test_cost(client)
+    test_aggregates(client)
+    test_summaries()
+    test_consensus()
+    test_lookup()
+    test_tokens()
+    test_corpus()
+    test_preprocess()
+    test_top_terms()
+    test_topic_ratios()
+    test_engine()
+    test_statistics_api()
+    test_downloads()
+    test_snapshot()
+    test_runner()
+    test_annotation_cache()
+    test_context_provider()
+    test_prompt_template()
+    test_pre_classifier()
+    test_ensemble()
+    test_annotation_store()
+    test_annotations(client)
+    test_sample()
+
+
+def test_cost(client):
+    # Unbounded nested connections are rejected before execution
+    query = """
+    query {
+        seasons {
+            edges {
+                node {
+                    episodes {
+                        edges {
+                            node {
+                                lines {
+                                    edges {
+                                        node {
+                                            character {
+                                                lines {
+                                                    edges {
+                                                        node {
+                                                            dialogue
+                                                        }
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+    """
+
+    response = client.post("/api/graphql", json={"query": query})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["data"] is None
+    assert "exceeds the maximum" in data["errors"][0]["message"]
+    assert data["extensions"]["cost"]["cost"] > data["extensions"]["cost"]["maxCost"]
+
+    # Bounding the connections with `first` brings the cost within budget
+    query = """
+    query ($n: Int!) {
+        lines(first: $n) {
+            edges {
+                node {
+                    character {
+                        name
+                    }
+                }
+            }
+        }
+    }
+    """
+
+    response = client.post(
+        "/api/graphql",
+        json={"query": query, "variables": {"n": 5}},
+    )
+    data = response.json()
+    assert len(data["data"]["lines"]["edges"]) == 5
+
+    # Fan-out is the largest group (the main characters), not the average
+    with Db().session() as db:
+        cardinalities = Cardinalities.from_session(db)
+        most = db.scalar(
+            select(func.count())
+            .select_from(Line)
+            .group_by(Line.character_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        )
+        assert cardinalities.fanout[("Character", "lines")] == most
+    assert data["extensions"]["cost"]["cost"] == 10
+
+    # Negative limits can not lower the cost of a query
+    query = """
+    query ($n: Int!) {
+        lines(first: $n) {
+            edges {
+                node {
+                    dialogue
+                }
+            }
+        }
+    }
+    """
+    response = client.post(
+        "/api/graphql",
+        json={"query": query, "variables": {"n": -100000000}},
+    )
+    data = response.json()
+    assert data["data"] is None
+    assert "must not be negative" in data["errors"][0]["message"]
+
+    # Variables of the wrong type are rejected before estimating the cost
+    response = client.post(
+        "/api/graphql",
+        json={"query": query, "variables": {"n": "abc"}},
+    )
+    data = response.json()
+    assert data["data"] is None
+    assert "Int cannot represent" in data["errors"][0]["message"]
+    assert "extensions" not in data
+
+    # Bodies are parsed by the base app, e.g. unsupported content types
+    response = client.post(
+        "/api/graphql", content="{}", headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 400
+
+    # Queries over WebSocket are held to the same budget
+    with Db().session() as db:
+        app = Starlette(
+            routes=[
+                WebSocketRoute(
+                    "/ws",
+                    GraphQLApp(
+                        schema,
+                        context_value={"session": db},
+                        cardinalities=Cardinalities.from_session(db),
+                        max_cost=10,
+                    ),
+                )
+            ]
+        )
+        with TestClient(app).websocket_connect(
+            "/ws", subprotocols=["graphql-ws"]
+        ) as ws:
+            ws.send_json({"type": "connection_init"})
+            assert ws.receive_json()["type"] == "connection_ack"
+            ws.send_json(
+                {
+                    "type": "start",
+                    "id": "1",
+                    "payload": {"query": "{ lines { edges { node { dialogue } } } }"},
+                }
+            )
+            message = ws.receive_json()
+            assert message["type"] == "error"
+            assert "exceeds the maximum" in message["payload"]["message"]
+
+            ws.send_json(
+                {
+                    "type": "start",
+                    "id": "2",
+                    "payload": {
+                        "query": "{ lines(first: 2) { edges { node { dialogue } } } }"
+                    },
+                }
+            )
+            message = ws.receive_json()
+            assert message["type"] == "data"
+            assert len(message["payload"]["data"]["lines"]["edges"]) == 2
+
+
+def test_aggregates(client):
+    query = """
+    query {
+        total: lineCounts(groupBy: []) {
+            count
+        }
+        byCharacter: lineCounts(groupBy: [CHARACTER]) {
+            characterName
+            count
+        }
+        jerry: lineCounts(
+            groupBy: [CHARACTER, SEASON]
+            filter: { characterNames: ["Jerry Seinfeld"] }
+        ) {
+            characterName
+            season
+            count
+        }
+        main: characterTypes(type: MAIN) {
+            characterName
+        }
+    }
+    """
+
+    response = client.post("/api/graphql", json={"query": query})
+    assert response.status_code == 200
+    data = response.json()["data"]
+
+    # Grouped counts add up to the total number of lines
+    total = data["total"][0]["count"]
+    assert sum(row["count"] for row in data["byCharacter"]) == total
+
+    # Filtering restricts the groups returned
+    assert {row["characterName"] for row in data["jerry"]} == {"Jerry Seinfeld"}
+    assert len(data["jerry"]) == 9
+
+    # Jerry appears in (almost) every episode
+    assert "Jerry Seinfeld" in {row["characterName"] for row in data["main"]}
+
+
+def test_summaries():
+    with Db().session() as db:
+        # Seeding builds the summary tables
+        assert not SummaryTool(db).is_stale()
+
+        # Materialized counts match the counts aggregated over all lines
+        materialized = StatisticsTool(db)
+        live = StatisticsTool(db, materialized=False)
+        for group_by in [
+            [LineGroup.CHARACTER],
+            [LineGroup.CHARACTER, LineGroup.SEASON],
+            [LineGroup.EPISODE],
+        ]:
+            assert materialized.line_counts(group_by) == live.line_counts(group_by)
+        assert materialized.character_counts() == live.character_counts()
+        assert materialized.writer_counts() == live.writer_counts()
+
+        # Characters without a matching line are still counted, with 0 lines
+        everyone = live.character_counts()
+        first = live.character_counts(LineFilter(seasons=[1], min_length=15))
+        assert [c.character_id for c in first] == [c.character_id for c in everyone]
+        expected = live.line_counts(
+            [LineGroup.CHARACTER], LineFilter(seasons=[1], min_length=15)
+        )
+        assert {c.character_id: c.lines for c in first if c.lines} == {
+            row.character_id: row.count for row in expected
+        }
+        absent = next(c for c in first if c.lines == 0)
+        assert absent.episodes == 0
+        named = live.character_counts(
+            LineFilter(character_names=[absent.character_name], seasons=[1])
+        )
+        assert [c.lines for c in named] == [0]
+
+        # Edits that keep every count change the fingerprint too
+        fingerprint = SummaryTool(db).fingerprint()
+        line = db.scalars(select(Line).order_by(Line.id)).first()
+        line.dialogue += "!"
+        # Checking does not flush pending changes
+        assert SummaryTool(db).fingerprint() == fingerprint
+        db.flush()
+        assert SummaryTool(db).fingerprint() != fingerprint
+        db.rollback()
+        line = db.scalars(select(Line).order_by(Line.id)).first()
+        other = db.scalar(select(Character.id).where(Character.id != line.character_id))
+        line.character_id = other
+        db.flush()
+        assert SummaryTool(db).is_stale()
+        db.rollback()
+        assert SummaryTool(db).fingerprint() == fingerprint
+
+        # Checking reads the version row, not the source tables
+        statements = []
+
+        def listen(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", listen)
+        try:
+            classification = CharacterTool(db).classification()
+            assert CharacterTool(db).classification() is classification
+        finally:
+            event.remove(Engine, "before_cursor_execute", listen)
+        assert not any("FROM line" in statement for statement in statements)
+
+        # The shared classification can not be modified by callers
+        try:
+            classification[0] = None
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("classification is writable")
+
+        # Characters extracted without their id are found by slug
+        susan = db.scalars(
+            select(Character).where(Character.name == "Susan Ross")
+        ).one()
+        ids = CharacterTool(db).ids_by_slug(["susan_ross", "nobody"])
+        assert ids == {"susan_ross": susan.id}
+
+
+def test_consensus():
+    human = "me@dangre.co"
+    other = "kejun.fang@mail.mcgill.ca"
+    rows = [
+        # Humans agree
+        (1, 1, 1, "2025-01-01", human, "Food"),
+        (1, 1, 1, "2025-01-01", other, "Food"),
+        (1, 1, 1, "2025-01-01", "gpt-oss@dangre.co", "Work"),
+        # Humans tie, weighted vote decides
+        (1, 1, 2, "2025-01-01", human, "Food"),
+        (1, 1, 2, "2025-01-01", other, "Work"),
+        (1, 1, 2, "2025-01-01", "gpt-oss@dangre.co", "Work"),
+        # Only the latest vote of an annotator counts
+        (1, 1, 3, "2025-01-01", human, "Food"),
+        (1, 1, 3, "2025-01-02", human, "Money"),
+        # Humans tie and so does the weighted vote
+        (1, 1, 4, "2025-01-01", human, "Food"),
+        (1, 1, 4, "2025-01-01", other, "Work"),
+    ]
+    df = pd.DataFrame(
+        rows,
+        columns=[
+            "season_number",
+            "episode_number",
+            "line_number",
+            "date",
+            "email",
+            "category",
+        ],
+    )
+
+    out = consensus(df)
+    assert out["category"].tolist() == ["Food", "Work", "Money", "UNKNOWN"]
+
+
+def test_lookup():
+    keys = pd.DataFrame(
+        {
+            "season_number": [1, 99, 1],
+            "episode_number": [1, 1, 1],
+            "line_number": [2, 1, 1],
+        },
+        index=[5, 6, 7],
+    )
+    with Db().session() as db:
+        lines = LineTool(db).lookup(keys)
+
+    # Results follow the input order; unknown keys are missing
+    assert lines.index.tolist() == [5, 6, 7]
+    assert pd.isna(lines.loc[6, "dialogue"])
+    assert lines.loc[7, "line_id"] < lines.loc[5, "line_id"]
+
+
+class Upper:
+    """Tokenizer counting how many texts it was asked to preprocess."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def fingerprint(self):
+        return "test-upper"
+
+    def tokens(self, texts):
+        self.calls += len(texts)
+        return [text.upper() for text in texts]
+
+
+def test_tokens():
+    keys = pd.DataFrame(
+        {
+            "season_number": [1, 1, 99],
+            "episode_number": [1, 1, 1],
+            "line_number": [1, 2, 1],
+        }
+    )
+    tokenizer = Upper()
+    with Db().session() as db:
+        tool = TokenTool(db)
+        tool.clear(tokenizer.fingerprint())
+        lines = LineTool(db).lookup(keys)
+
+        tokens = tool.tokens(lines, tokenizer)
+        assert tokens[0] == lines.loc[0, "dialogue"].upper()
+        assert tokens[2] == ""
+        assert tokenizer.calls == 2
+
+        # Cached lines are not preprocessed again
+        assert tool.tokens(lines, tokenizer).equals(tokens)
+        assert tokenizer.calls == 2
+
+        # Edited lines are
+        lines.loc[1, "dialogue"] = "edited"
+        assert tool.tokens(lines, tokenizer)[1] == "EDITED"
+        assert tokenizer.calls == 3
+
+        tool.clear(tokenizer.fingerprint())
+
+
+def test_corpus():
+    with Db().session() as db:
+        corpus = Corpus.build(db, min_df=1)
+        dialogue = db.execute(select(Line.dialogue).order_by(Line.id)).scalars().all()
+        assert not corpus.is_stale(db)
+
+    # Same weighting as fitting TfidfVectorizer on the dialogue
+    expected = TfidfVectorizer(vocabulary=corpus.vocabulary).fit_transform(dialogue)
+    assert abs(corpus.tfidf() - expected).max() < 1e-9
+
+    with tempfile.TemporaryDirectory() as dir:
+        corpus.save(Path(dir))
+        loaded = Corpus.load(Path(dir))
+        assert (loaded.matrix != corpus.matrix).nnz == 0
+        assert loaded.rows.equals(corpus.rows)
+
+    seasons = corpus.distinctive(corpus.rows["season"], min_distinctiveness=0)
+    assert sorted(seasons) == sorted(corpus.rows["season"].unique())
+    for terms in seasons.values():
+        scores = [term.score for term in terms]
+        assert scores == sorted(scores, reverse=True)
+
+    # Same top terms as scoring the dense means
+    X = corpus.tfidf().toarray()
+    overall = X.mean(axis=0)
+    for season, terms in seasons.items():
+        means = X[(corpus.rows["season"] == season).to_numpy()].mean(axis=0)
+        used = overall > 1e-10
+        dense = np.where(used, means * means / np.where(used, overall, 1), -np.inf)
+        dense[means == 0] = -np.inf
+        expected = np.sort(dense[np.isfinite(dense)])[::-1][: len(terms)]
+        assert np.allclose([term.score for term in terms], expected, rtol=1e-6)
+
+
+def test_preprocess():
+    # Small rule-based pipeline standing in for en_core_web_sm
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("attribute_ruler")
+    for word, pos in [
+        ("soup", "NOUN"),
+        ("kitchen", "NOUN"),
+        ("hot", "ADJ"),
+        ("steal", "VERB"),
+        ("wallet", "NOUN"),
+        ("eat", "VERB"),
+        ("new", "PROPN"),
+        ("york", "PROPN"),
+    ]:
+        ruler.add([[{"LOWER": word}]], {"POS": pos, "LEMMA": word})
+    nlp.add_pipe("entity_ruler", name="ner").add_patterns(
+        [{"label": "GPE", "pattern": [{"LOWER": "new"}, {"LOWER": "york"}]}]
+    )
+
+    texts = [
+        "I can't eat this hot soup!",
+        "",
+        "Steal the wallet in the kitchen",
+        "New York soup, Jerry",
+    ] * 3
+    terms = ["hot soup", "steal wallet", "new york", "soup", "eat soup"]
+
+    # Batching gives the same results as parsing every text on its own
+    preprocessor = Preprocessor(nlp, batch_size=2)
+    assert preprocessor.tokens(texts) == [
+        " ".join(t.lemma_ for t in nlp(expand(text).lower()) if keep_token(t))
+        for text in texts
+    ]
+    assert preprocessor.meaningful_ngrams(terms) == {
+        term: is_meaningful(nlp(term)) for term in terms
+    }
+    assert preprocessor.meaningful_ngrams(terms)["steal wallet"] is False
+
+    # Terms already checked are not parsed again
+    parsed = preprocessor.counts["ngrams"]
+    preprocessor.meaningful_ngrams(terms[:2])
+    assert preprocessor.counts["ngrams"] == parsed == 4
+    assert preprocessor.tokens([]) == []
+
+
+def test_top_terms():
+    vocab = np.array(["soup", "soup nazi", "nazi", "big salad", "salad", "marble rye"])
+    score = np.array([0.9, 0.5, 0.8, 0.1, 0.7, 0.3])
+    words = term_words(vocab)
+    sizes = ngram_sizes(vocab)
+
+    # Longer n-grams take their words first, however low they score
+    top = top_terms(np.arange(len(vocab)), score, sizes, words, top_k=3)
+    assert vocab[top].tolist() == ["soup nazi", "marble rye", "big salad"]
+
+    # Only candidates are considered
+    top = top_terms(np.array([0, 2, 4]), score, sizes, words, top_k=2)
+    assert vocab[top].tolist() == ["soup", "nazi"]
+
+
+def test_topic_ratios():
+    annotations = pd.DataFrame(
+        {
+            "character": ["Newman", "Newman", "Newman", "Puddy", "Nobody"],
+            "season_number": [3, 3, 4, 5, 5],
+            "category": ["Food", "Work", "Food", "UNKNOWN", "Food"],
+        }
+    )
+    totals = pd.Series({"Newman": 10, "Puddy": 4, "Babu": 2})
+    season_totals = pd.Series({("Newman", 3): 4, ("Newman", 4): 6, ("Puddy", 5): 4})
+
+    out = topic_ratios(annotations, totals, season_totals)
+    rows = {
+        (row.character, row.season, row.topic): (row.topic_lines, row.ratio)
+        for row in out.itertuples()
+    }
+
+    # Newman: 2 topics in 2 seasons, plus overall
+    assert rows[("Newman", 3, "Food")] == (1, 0.25)
+    assert rows[("Newman", 4, "Work")] == (0, 0.0)
+    assert rows[("Newman", "overall", "Food")] == (2, 0.2)
+
+    # Characters with lines but no (counted) annotations still get zeros
+    assert rows[("Babu", "overall", "Food")] == (0, 0.0)
+    assert rows[("Puddy", 5, "Work")] == (0, 0.0)
+
+    # Unknown characters and excluded categories are left out
+    assert not (out["character"] == "Nobody").any()
+    assert not (out["topic"] == "UNKNOWN").any()
+    assert len(out) == 2 * (2 + 1) + 2 * (1 + 1) + 2
+
+
+def test_engine():
+    annotations = pd.DataFrame(
+        {
+            "season_number": [1, 1, 2],
+            "episode_number": [1, 1, 1],
+            "line_number": [1, 2, 1],
+            "category": ["Food", "Work", "Food"],
+        }
+    )
+    with Db().session() as db, tempfile.TemporaryDirectory() as dir:
+        corpus = Corpus.build(db, min_df=1)
+        engine = StatisticsEngine(db, corpus, Path(dir))
+        seasons = engine.refresh(annotations)
+        assert seasons == sorted(seasons) and len(seasons) > 2
+        assert engine.refresh(annotations) == []
+
+        # New annotations only rebuild their season
+        more = pd.concat(
+            [annotations, annotations.iloc[:1].assign(season_number=3)],
+            ignore_index=True,
+        )
+        assert engine.refresh(more) == [3]
+
+        # Line counts match the database
+        counts = engine.line_counts(["character", "season"])
+        live = StatisticsTool(db, materialized=False).line_counts(
+            [LineGroup.CHARACTER, LineGroup.SEASON]
+        )
+        expected = sorted((row.character_id, row.season, row.count) for row in live)
+        actual = zip(counts["character_id"], counts["season"], counts["lines"])
+        assert sorted(actual) == expected
+
+        ratios = engine.topic_ratios(["season"]).set_index(["season", "topic"])
+        assert ratios.loc[(1, "Food"), "topic_lines"] == 1
+        assert ratios.loc[(3, "Food"), "topic_lines"] == 1
+        assert ratios.loc[(2, "Work"), "topic_lines"] == 0
+
+        terms = engine.distinctive_terms(["season"], top_k=3)
+        assert (terms.groupby("season").size() <= 3).all()
+
+        # Term counts are the corpus counts
+        assert engine.table("terms")["count"].sum() == corpus.matrix.sum()
+
+        # Edited dialogue only makes its own season stale
+        line = db.scalars(
+            select(Line).join(Episode).join(Season).where(Season.number == 2)
+        ).first()
+        line.dialogue += " again"
+        db.flush()
+        assert engine.stale(more) == [2]
+        try:
+            engine.refresh(more)
+            assert False, "refreshed from a stale corpus"
+        except ValueError:
+            pass
+        db.rollback()
+        assert engine.stale(more) == []
+
+
+def test_statistics_api():
+    characters = [f"Character {i}" for i in range(20)]
+    annotations = pd.DataFrame(
+        {
+            "character": characters * 3,
+            "season_number": [1] * 20 + [2] * 40,
+            "category": ["Food"] * 30 + ["Work"] * 30,
+        }
+    )
+    season_totals = annotations.groupby(["character", "season_number"]).size() * 4
+    season_totals.index.names = ["character", "season"]
+    totals = season_totals.groupby(level="character").sum()
+
+    with tempfile.TemporaryDirectory() as dir:
+        topic_ratios(annotations, totals, season_totals).to_csv(
+            Path(dir) / "statistics.topics.csv", index=False
+        )
+        api = StatisticsApi(Path(dir), max_cached=2)
+        app = Starlette(routes=[Mount("/api/statistics", routes=api.routes())])
+        client = TestClient(app)
+
+        response = client.get("/api/statistics/topics/overall")
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        data = response.json()
+        assert data["character"] == sorted(characters)
+        assert set(data) == {"character", "Food", "Work"}
+
+        # Unchanged data is not sent again
+        response = client.get(
+            "/api/statistics/topics/overall",
+            headers={"If-None-Match": response.headers["etag"]},
+        )
+        assert response.status_code == 304
+
+        # Every variant has its own entity tag
+        identity = client.get(
+            "/api/statistics/topics/overall", headers={"Accept-Encoding": "identity"}
+        )
+        assert "content-encoding" not in identity.headers
+        assert identity.headers["etag"] != response.headers["etag"]
+        refused = client.get(
+            "/api/statistics/topics/overall", headers={"Accept-Encoding": "gzip;q=0"}
+        )
+        assert "content-encoding" not in refused.headers
+        assert refused.headers["etag"] == identity.headers["etag"]
+        response = client.get(
+            "/api/statistics/topics/overall",
+            headers={"If-None-Match": identity.headers["etag"]},
+        )
+        assert response.status_code == 200
+
+        # Parameters that are not columns do not add cache entries
+        for i in range(5):
+            client.get("/api/statistics/topics/overall", params={"unknown": i})
+        assert len(api._cache) == 1
+
+        # Columns can be filtered on
+        data = client.get(
+            "/api/statistics/topics/seasons", params={"character": "Character 3"}
+        ).json()
+        assert data["season"] == [1, 2]
+        assert data["total_lines"] == [4, 8]
+
+        # The cache is bounded
+        for i in range(5):
+            client.get(
+                "/api/statistics/topics/seasons", params={"character": f"Character {i}"}
+            )
+        assert len(api._cache) == 2
+
+        assert client.get("/api/statistics/missing").status_code == 404
+
+
+def test_downloads():
+    content = b"season,episode,line\n" * 1000
+
+    with tempfile.TemporaryDirectory() as dir:
+        path = Path(dir) / "lines.csv"
+        path.write_bytes(content)
+
+        loop_threads = set()
+
+        async def endpoint(request):
+            loop_threads.add(threading.get_ident())
+            return await download(request, path, "lines.csv")
+
+        client = TestClient(Starlette(routes=[Route("/lines", endpoint)]))
+
+        # Without precompressed siblings the file is served as is, hashed
+        # off the event loop
+        hashed_in = []
+        hash = downloads._hash
+
+        def record(path):
+            hashed_in.append(threading.get_ident())
+            return hash(path)
+
+        downloads._hash = record
+        try:
+            response = client.get("/lines", headers={"Accept-Encoding": "gzip"})
+        finally:
+            downloads._hash = hash
+        assert hashed_in and not loop_threads & set(hashed_in)
+        assert response.status_code == 200
+        assert "content-encoding" not in response.headers
+        assert response.content == content
+        etag = response.headers["etag"]
+
+        written = precompress(path)
+        assert Path(dir) / "lines.csv.gz" in written
+        assert precompress(path) == []
+
+        # The compressed variant has its own ETag
+        response = client.get("/lines", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] != etag
+        assert response.content == content
+
+        response = client.get(
+            "/lines", headers={"Accept-Encoding": "identity", "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        # Byte ranges of the identity representation
+        response = client.get(
+            "/lines", headers={"Accept-Encoding": "identity", "Range": "bytes=0-6"}
+        )
+        assert response.status_code == 206
+        assert response.content == b"season,"
+
+        assert (
+            client.get("/lines", headers={"Accept-Encoding": "gzip;q=0"}).headers[
+                "etag"
+            ]
+            == etag
+        )
+
+
+def test_snapshot():
+    with tempfile.TemporaryDirectory() as dir:
+        source = Path(dir) / "source.db"
+        with sqlite3.connect(source) as db:
+            db.execute("CREATE TABLE line (id INTEGER PRIMARY KEY, dialogue TEXT)")
+            db.executemany(
+                "INSERT INTO line (dialogue) VALUES (?)", [("x" * 100,)] * 1000
+            )
+            db.execute("DELETE FROM line WHERE id > 10")
+        db.close()
+
+        snapshot = Snapshot(source, Path(dir) / "snapshot")
+        assert snapshot.is_stale()
+        path = snapshot.build()
+        assert not snapshot.is_stale()
+        assert path.stat().st_mode & 0o222 == 0
+
+        # Free pages are left out of the snapshot
+        assert path.stat().st_size < source.stat().st_size
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as db:
+            assert db.execute("SELECT COUNT(*) FROM line").fetchone() == (10,)
+        db.close()
+
+        # Unchanged databases are not copied again
+        sha256 = snapshot.info()["sha256"]
+        mtime = path.stat().st_mtime_ns
+        assert snapshot.build() == path
+        assert path.stat().st_mtime_ns == mtime
+
+        with sqlite3.connect(source) as db:
+            db.execute("DELETE FROM line WHERE id > 5")
+        db.close()
+        assert snapshot.is_stale()
+        snapshot.build()
+        assert snapshot.info()["sha256"] != sha256
+
+
+class OllamaStandIn(BaseHTTPRequestHandler):
+    """Mimic the Ollama chat API, failing the first attempt of some prompts."""
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    attempts: dict[str, int] = {}
+
+    # Category answered and seconds taken by each model (Food in 0.05s if unset)
+    categories: dict[str, str] = {}
+    delays: dict[str, float] = {}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        cls = OllamaStandIn
+        with cls.lock:
+            cls.in_flight += 1
+            cls.peak = max(cls.peak, cls.in_flight)
+            cls.attempts[prompt] = cls.attempts.get(prompt, 0) + 1
+            attempt = cls.attempts[prompt]
+        time.sleep(cls.delays.get(body["model"], 0.05))
+        with cls.lock:
+            cls.in_flight -= 1
+
+        if "annotations" in body["format"]["properties"]:
+            content = {"annotations": cls.annotate_batch(prompt)}
+        else:
+            category = cls.categories.get(body["model"], "Food")
+            content = {"category": "?" if prompt.startswith("broken") else category}
+        status, response = (
+            200,
+            {
+                "model": body["model"],
+                "created_at": "2025-01-01T00:00:00Z",
+                "message": {"role": "assistant", "content": json.dumps(content)},
+                "done": True,
+            },
+        )
+        if prompt.startswith("flaky") and attempt == 1:
+            status, response = 503, {"error": "overloaded"}
+
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on the request (e.g. a cancelled ensemble vote)
+            pass
+
+    @classmethod
+    def annotate_batch(cls, prompt: str) -> list[dict]:
+        """
+        Annotate every line of a batch prompt, leaving out the first attempt
+        of "flaky" lines and mislabelling "broken" ones.
+        """
+        annotations = []
+        for id, entry in re.findall(
+            r"== LINE (\d+)\n(.*?)(?=\n\n|\n$|$)", prompt, re.S
+        ):
+            with cls.lock:
+                cls.attempts[entry] = cls.attempts.get(entry, 0) + 1
+                attempt = cls.attempts[entry]
+            if "flaky" in entry and attempt == 1:
+                continue
+            category = "?" if "broken" in entry else "Food"
+            annotations.append({"id": int(id), "category": category})
+        return annotations
+
+    def log_message(self, *args):
+        pass
+
+
+def stand_in(**kwargs) -> tuple[ThreadingHTTPServer, OllamaAnnotator]:
+    """Start an OllamaStandIn server and an annotator using it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OllamaStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    codebook = Codebook(
+        name="Test",
+        description="Test",
+        categories=[
+            {"name": "Food", "description": "Food", "examples": []},
+            {"name": "Work", "description": "Work", "examples": []},
+        ],
+    )
+    kwargs.setdefault("model", "stand-in")
+    annotator = OllamaAnnotator(
+        "key",
+        host=f"http://127.0.0.1:{server.server_address[1]}",
+        codebook=codebook,
+        **kwargs,
+    )
+    return server, annotator
+
+
+def test_runner():
+    server, annotator = stand_in()
+    codebook = annotator.codebook
+    prompts = [f"line {i}" for i in range(30)] + ["flaky 1", "flaky 2", "broken"]
+
+    try:
+        runner = AnnotationRunner(
+            concurrency=5, max_attempts=3, backoff=0.01, max_backoff=0.05
+        )
+        seen = []
+        start = time.monotonic()
+        results = runner.annotate(annotator, prompts, tick=seen.append)
+        elapsed = time.monotonic() - start
+
+        assert len(seen) == len(prompts)
+        assert [r.index for r in results] == list(range(len(prompts)))
+        assert all(r.category == "Food" for r in results[:-1])
+        assert results[30].attempts == 2 and results[31].attempts == 2
+        assert results[-1].category is None and results[-1].attempts == 3
+        assert isinstance(results[-1].error, ValueError)
+
+        # Requests overlap, but never more than the concurrency allows
+        assert OllamaStandIn.peak == 5
+        assert elapsed < 0.05 * len(prompts)
+
+        # Rate limits space out requests to the same model
+        OllamaStandIn.peak = 0
+        runner = AnnotationRunner(concurrency=5, rate_limits={"stand-in": 50.0})
+        start = time.monotonic()
+        results = runner.annotate(annotator, prompts[:10])
+        assert all(r.category == "Food" for r in results)
+        assert time.monotonic() - start >= 9 / 50.0
+
+        # Batches only retry the lines that were not annotated
+        OllamaStandIn.attempts.clear()
+        entries = [f"Line to annotate:\n- A: `{p}`" for p in prompts]
+        runner = AnnotationRunner(concurrency=2, batch_size=10, max_attempts=3)
+        results = runner.annotate(annotator, entries)
+        assert all(r.category == "Food" for r in results[:-1])
+        assert [r.attempts for r in results[-3:]] == [2, 2, 3]
+        assert results[-1].category is None
+        assert all(r.attempts == 1 for r in results[:30])
+
+        # The codebook is only sent in the (static) system prompt
+        assert codebook.serialize() not in annotator.batch_prompt(entries[:10])
+    finally:
+        server.shutdown()
+
+
+def test_annotation_cache():
+    with tempfile.TemporaryDirectory() as dir:
+        cache = AnnotationCache(Path(dir) / "annotations.db")
+        server, annotator = stand_in(cache=cache)
+
+        try:
+            with Db().session() as db:
+                line = db.scalars(select(Line).order_by(Line.id.desc())).first()
+                OllamaStandIn.attempts.clear()
+                assert annotator.annotate(line) == "Food"
+                assert annotator.annotate(line) == "Food"
+                assert sum(OllamaStandIn.attempts.values()) == 1
+
+                # Keys cover the model, compiled codebook and context
+                context = annotator.context(line, n=annotator.context_size)
+                key = (line.id, context_hash(line, context))
+                assert cache.get_many("stand-in", annotator.template, [key]) == {
+                    key: "Food"
+                }
+                assert cache.get("other", annotator.template, *key) is None
+                other = Codebook.model_validate(
+                    {**annotator.codebook.model_dump(), "name": "Other"}
+                )
+                assert cache.get("stand-in", other.compile(), *key) is None
+
+                # Results of prompts without examples are not reused with them
+                examples = annotator.codebook.compile(examples=False)
+                assert cache.get("stand-in", examples, *key) is None
+                assert context_hash(line, context[1:]) != key[1]
+        finally:
+            server.shutdown()
+            cache.close()
+
+        # Results persist across runs
+        with AnnotationCache(Path(dir) / "annotations.db") as cache:
+            assert len(cache) == 1
+            assert cache.clear("stand-in") == 1
+
+
+def test_context_provider():
+    db = Db()
+    with db.session() as session:
+        ids = session.scalars(select(Line.id).order_by(Line.id)).all()[::7][:50]
+        df = pd.DataFrame({"id": ids[::-1]})
+
+        queries = []
+
+        def listen(*args):
+            queries.append(args)
+
+        event.listen(db.engine, "before_cursor_execute", listen)
+        try:
+            provider = ContextProvider(session)
+            lines = provider.lines(df)
+            contexts = provider.contexts(df, n=3)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listen)
+
+        # One query for the episodes of the lines, one for their lines
+        assert len(queries) == 2
+        assert [line.id for line in lines] == df["id"].tolist()
+
+        for line, context in zip(lines, contexts):
+            expected = session.scalars(
+                select(Line)
+                .where(Line.episode_id == line.episode_id)
+                .where(Line.number < line.number)
+                .order_by(Line.number.desc())
+                .limit(3)
+            ).all()[::-1]
+            assert [x.id for x in context] == [x.id for x in expected]
+            assert all(x.character.name for x in context)
+
+
+def test_prompt_template():
+    codebook = CODEBOOKS["dan"]
+    template = codebook.compile()
+    assert codebook.compile() is template
+    assert codebook.compile(compact=False) is not template
+    assert codebook.serialize() in template.system
+    assert json.loads(codebook.serialize()) == codebook.model_dump()
+    assert (
+        "examples"
+        not in json.loads(codebook.serialize(examples=False))["categories"][0]
+    )
+
+    with Db().session() as session:
+        provider = ContextProvider(session)
+        ids = session.scalars(select(Line.id).order_by(Line.id).limit(2)).all()
+        a, b = provider.lines(pd.DataFrame({"id": ids}))
+
+        # Only the user message differs between lines
+        first = template.messages(template.line(a, provider.context(a, 5)))
+        second = template.messages(template.line(b, provider.context(b, 5)))
+        assert first[0] == second[0] and first[0]["role"] == "system"
+        assert b.dialogue in second[1]["content"]
+        assert codebook.name not in second[1]["content"]
+
+    pretty, compact, bare = codebook.token_report()
+    assert pretty["tokens"] > compact["tokens"] > bare["tokens"] > 0
+
+
+def test_pre_classifier():
+    rng = np.random.default_rng(0)
+    vocab = {
+        "Food": ["soup", "rye", "lunch", "muffin", "dinner", "cereal"],
+        "Work": ["boss", "office", "job", "meeting", "salary", "desk"],
+    }
+    filler = ["the", "a", "I", "you", "really", "think", "so", "that"]
+
+    def lines(n):
+        labels = rng.choice(list(vocab), n)
+        texts = [
+            " ".join(
+                rng.choice(vocab[label], 2).tolist() + rng.choice(filler, 4).tolist()
+            )
+            for label in labels
+        ]
+        return texts, labels.tolist()
+
+    texts, labels = lines(400)
+    classifier = PreClassifier(threshold=0.7).fit(texts, labels)
+
+    # Obvious lines are labelled, ambiguous ones are left to the LLM
+    assert classifier.classify(["I really love this soup and rye"]) == ["Food"]
+    assert classifier.classify(["the soup at the office"], threshold=0.99) == [None]
+
+    held_out, reference = lines(100)
+    evaluation = classifier.evaluate(held_out, reference)
+    assert evaluation.lines == 100
+    assert evaluation.skipped > 0.5
+    assert evaluation.agreement > 0.95
+    assert classifier.evaluate(held_out, reference, threshold=0.0).skipped == 1.0
+
+    with tempfile.TemporaryDirectory() as dir:
+        classifier.save(Path(dir) / "classifier.joblib")
+        loaded = PreClassifier.load(Path(dir) / "classifier.joblib")
+        assert loaded.classify(held_out) == classifier.classify(held_out)
+
+    with Db().session() as db:
+        annotations = pd.DataFrame(
+            {
+                "season_number": [1, 1, 1, 99],
+                "episode_number": [1, 1, 1, 1],
+                "line_number": [1, 2, 3, 1],
+                "category": ["Food", "UNKNOWN", "Work", "Food"],
+            }
+        )
+        df = training_data(db, annotations)
+        assert df["category"].tolist() == ["Food", "Work"]
+        assert df["dialogue"].notna().all()
+
+
+def test_ensemble():
+    server, annotator = stand_in()
+
+    def member(model: str) -> OllamaAnnotator:
+        return OllamaAnnotator(
+            "key", model=model, host=annotator.host, codebook=annotator.codebook
+        )
+
+    OllamaStandIn.categories.update({"work": "Work"})
+    OllamaStandIn.delays.update({"work": 5.0, "slow": 1.0})
+    weights = {"a@x": 1.0, "b@x": 1.0, "c@x": 1.0}
+    prompts = [f"line {i}" for i in range(6)]
+
+    try:
+        # Two agreeing votes out of three settle a line without the third
+        ensemble = EnsembleAnnotator(
+            {"a@x": member("a"), "b@x": member("b"), "c@x": member("work")},
+            weights=weights,
+        )
+        start = time.monotonic()
+        results = ensemble.annotate(prompts)
+        # Well under the delay of the third member, with room for a busy machine
+        assert time.monotonic() - start < 2.5
+        assert all(r.category == "Food" and r.decided for r in results)
+        assert all(sorted(v.email for v in r.votes) == ["a@x", "b@x"] for r in results)
+
+        # Members that do not vote in time are left out
+        ensemble = EnsembleAnnotator(
+            {"a@x": member("a"), "c@x": member("slow")},
+            weights=weights,
+            timeout=0.2,
+        )
+        results = ensemble.annotate(prompts[:2])
+        assert all(r.category == "Food" and not r.decided for r in results)
+        slow = [v for v in results[0].votes if v.email == "c@x"][0]
+        assert slow.category is None and isinstance(slow.error, TimeoutError)
+
+        keys = pd.DataFrame(
+            {"season_number": [1, 1], "episode_number": [2, 2], "line_number": [3, 4]}
+        )
+        votes = to_votes(results, keys)
+        assert votes.columns.tolist() == [
+            "season_number",
+            "episode_number",
+            "line_number",
+            "date",
+            "email",
+            "category",
+        ]
+        assert votes["line_number"].tolist() == [3, 4]
+        assert consensus(votes, weights=weights)["category"].tolist() == [
+            "Food",
+            "Food",
+        ]
+
+        # With the real weights, the human votes merged with the ensemble's
+        # outweigh it, so no member is cancelled: a minimax vote can still
+        # decide the consensus
+        OllamaStandIn.delays.update({"slow": 0.2})
+        ensemble = EnsembleAnnotator(
+            {"gpt-oss@dangre.co": member("a"), "minimax-m2@dangre.co": member("slow")}
+        )
+        assert ensemble.outside == 3.0
+        results = ensemble.annotate(prompts[:2])
+        assert all(len(r.votes) == 2 and not r.decided for r in results)
+        votes = to_votes(results, keys)
+        human = keys.assign(
+            date="2025-01-01T00:00:00Z",
+            email="denis.tsariov@mail.mcgill.ca",
+            category="Work",
+        )
+        merged = consensus(pd.concat([human, votes], ignore_index=True))
+        assert merged["category"].tolist() == ["Food", "Food"]
+        alone = votes[votes["email"] == "gpt-oss@dangre.co"]
+        alone = consensus(pd.concat([human, alone], ignore_index=True))
+        assert alone["category"].tolist() == ["Work", "Work"]
+
+        # Lines nobody outside the ensemble voted on are settled by the lead
+        # of gpt-oss alone, the others wait for minimax
+        outside = ensemble.outside_votes(keys, pd.concat([human.iloc[:1], votes]))
+        assert outside == [1.0, 0.0]
+        results = ensemble.annotate(prompts[:2], outside=outside)
+        assert len(results[0].votes) == 2 and not results[0].decided
+        assert len(results[1].votes) == 1 and results[1].decided
+        assert results[1].votes[0].email == "gpt-oss@dangre.co"
+        assert [r.category for r in results] == ["Food", "Food"]
+
+        try:
+            EnsembleAnnotator({"nobody@x": member("a")}, weights=weights)
+            assert False, "Members without a weight are rejected"
+        except ValueError:
+            pass
+    finally:
+        OllamaStandIn.categories.clear()
+        OllamaStandIn.delays.clear()
+        server.shutdown()
+
+
+def test_annotation_store():
+    def task(id: int, updated_at: str, annotations: list[tuple]) -> SimpleNamespace:
+        return SimpleNamespace(
+            id=id,
+            updated_at=updated_at,
+            data={"season": 1, "episode": 2, "number": id},
+            annotations=[
+                {
+                    "id": annotation_id,
+                    "updated_at": updated_at,
+                    "created_username": f"{email}, {annotation_id}",
+                    "result": [{"value": {"choices": [category]}}] if category else [],
+                }
+                for annotation_id, email, category in annotations
+            ],
+        )
+
+    server = [
+        task(1, "2025-01-01T00:00:00Z", [(10, "a@x", "Food"), (11, "b@x", "Work")]),
+        task(2, "2025-01-02T00:00:00Z", [(20, "a@x", "Food"), (21, "b@x", None)]),
+    ]
+    requested = []
+
+    def tasks(since):
+        requested.append(since)
+        return [
+            t
+            for t in server
+            if since is None or pd.Timestamp(t.updated_at) > pd.Timestamp(since)
+        ]
+
+    with tempfile.TemporaryDirectory() as dir:
+        store = AnnotationStore(Path(dir), max_parts=2)
+        assert store.cursor is None and store.read().empty
+
+        # Annotations without a result are left out
+        assert sync(tasks, store) == 3
+        assert requested == [None]
+        assert pd.Timestamp(store.cursor) == pd.Timestamp("2025-01-02T00:00:00Z")
+
+        # Only tasks updated since the cursor are fetched again
+        assert sync(tasks, store) == 0
+        server[0] = task(
+            1, "2025-01-03T00:00:00Z", [(10, "a@x", "Work"), (11, "b@x", "Work")]
+        )
+        assert sync(tasks, store) == 2
+        assert pd.Timestamp(requested[-1]) == pd.Timestamp("2025-01-02T00:00:00Z")
+        df = store.read()
+        assert df["annotation_id"].tolist() == [10, 11, 20]
+        assert df["category"].tolist() == ["Work", "Work", "Food"]
+        assert df["email"].tolist() == ["a@x", "b@x", "a@x"]
+        assert df["line_number"].tolist() == [1, 1, 2]
+        assert pd.Timestamp(store.cursor) == pd.Timestamp("2025-01-03T00:00:00Z")
+
+        # Compaction keeps only the latest version of every annotation
+        server[1] = task(2, "2025-01-04T00:00:00Z", [(20, "a@x", "Fun")])
+        sync(tasks, store)
+        assert len(store.parts()) == 1
+        assert store.read()["category"].tolist() == ["Work", "Work", "Fun"]
+
+        # A full sync starts over
+        server.pop(0)
+        assert sync(tasks, store, full=True) == 1
+        assert requested[-1] is None
+        assert store.read()["annotation_id"].tolist() == [20]
+
+
+def test_annotations(client):
+    votes = pd.DataFrame(
+        {
+            "season_number": [1, 1, 1, 99],
+            "episode_number": [1, 1, 1, 1],
+            "line_number": [1, 1, 2, 1],
+            "date": [
+                "2025-01-01T00:00:00Z",
+                "2025-01-01T00:00:00Z",
+                "2025-01-02T10:00:00+00:00",
+                "2025-01-01T00:00:00Z",
+            ],
+            "email": ["a@x", "b@x", "a@x", "a@x"],
+            "category": ["Food", "Food", "Work", "Food"],
+        }
+    )
+
+    with Db().session() as db:
+        tool = AnnotationTool(db)
+        try:
+            # Votes and categories of unknown lines are left out
+            assert tool.load(votes) == 3
+            assert tool.load_derived(consensus(votes)) == 2
+            assert tool.load(votes) == 3
+            assert tool.counts() == {"Food": 1, "Work": 1}
+
+            line = db.scalars(select(Line).where(Line.id == 1)).one()
+            assert line.derived.category == "Food"
+            assert sorted(a.email for a in line.annotations) == ["a@x", "b@x"]
+
+            query = """
+            query {
+                lines(first: 10) {
+                    edges {
+                        node {
+                            number
+                            category
+                        }
+                    }
+                }
+                food: categoryLines(category: "Food") {
+                    number
+                    dialogue
+                }
+                categoryCounts {
+                    category
+                    count
+                }
+            }
+            """
+
+            statements = []
+
+            def listen(conn, cursor, statement, *args):
+                if "annotation_derived" in statement:
+                    statements.append(statement)
+
+            event.listen(Engine, "before_cursor_execute", listen)
+            try:
+                response = client.post("/api/graphql", json={"query": query})
+            finally:
+                event.remove(Engine, "before_cursor_execute", listen)
+            data = response.json()["data"]
+
+            # The categories of every line are loaded with a single query
+            categories = [edge["node"]["category"] for edge in data["lines"]["edges"]]
+            assert categories[:2] == ["Food", "Work"]
+            assert categories[2:] == [None] * 8
+            assert len(statements) == 3
+
+            assert [line["number"] for line in data["food"]] == [1]
+            assert data["categoryCounts"] == [
+                {"category": "Food", "count": 1},
+                {"category": "Work", "count": 1},
+            ]
+
+            # Negative pages are rejected rather than read as unlimited
+            for args in ["first: -1", "offset: -1"]:
+                response = client.post(
+                    "/api/graphql",
+                    json={
+                        "query": f'{{ categoryLines(category: "Food", {args}) {{ id }} }}'
+                    },
+                )
+                errors = response.json()["errors"]
+                assert "must not be negative" in errors[0]["message"]
+        finally:
+            tool.clear()
+
+
+def test_sample():
+    # Quotas are proportional, add up to the sample size and fit their strata
+    rng = np.random.default_rng(0)
+    for sizes, n in [([5, 3, 2], 4), ([7, 7, 7], 2), ([50, 1, 1, 3], 7)]:
+        for _ in range(100):
+            quotas = allocate(sizes, n, rng)
+            assert quotas.sum() == n
+            assert (quotas <= sizes).all()
+            assert (np.abs(quotas - np.asarray(sizes) * n / sum(sizes)) < 1).all()
+    assert allocate([1, 0, 3], 10, rng).tolist() == [1, 0, 3]
+
+    # With fewer lines than strata, every stratum can still be sampled, in
+    # proportion to its size
+    draws = np.array([allocate([6, 3, 1], 1, rng) for _ in range(4000)])
+    assert (draws.sum(axis=1) == 1).all()
+    assert np.allclose(draws.mean(axis=0), [0.6, 0.3, 0.1], atol=0.03)
+
+    with Db().session() as db:
+        tool = SampleTool(db)
+        characters = db.scalars(
+            select(Line.character_id)
+            .group_by(Line.character_id)
+            .order_by(func.count().desc())
+        ).all()[:3]
+
+        samples = tool.sample(characters, 12, seed=7, minimum_length=15)
+        index = tool.index(characters, minimum_length=15)
+        for character in characters:
+            sample = samples[character]
+            lines = index[index["character_id"] == character]
+            assert sample.columns.tolist() == [
+                "id",
+                "season",
+                "episode",
+                "number",
+                "dialogue",
+            ]
+            assert len(sample) == min(12, len(lines))
+            assert sample["id"].is_unique
+            assert sample["id"].isin(lines["id"]).all()
+            assert (sample["dialogue"].str.len() >= 15).all()
+
+            # Every stratum gets its proportional share (rounded)
+            strata = lines.groupby(["season", "bucket"]).size()
+            share = strata * len(sample) / strata.sum()
+            taken = (
+                lines[lines["id"].isin(sample["id"])]
+                .groupby(["season", "bucket"])
+                .size()
+                .reindex(strata.index, fill_value=0)
+            )
+            assert ((taken - share).abs() < 1).all()
+
+        # Samples are reproducible, and independent of the other characters
+        again = tool.sample(characters[::-1], 12, seed=7, minimum_length=15)
+        alone = tool.sample(characters[:1], 12, seed=7, minimum_length=15)
+        assert all(again[c].equals(samples[c]) for c in characters)
+        assert alone[characters[0]].equals(samples[characters[0]])
+        other = tool.sample(characters[:1], 12, seed=8, minimum_length=15)
+        assert not other[characters[0]]["id"].equals(samples[characters[0]]["id"])
+
+        # A single line per character can come from any season and length
+        seasons = {
+            tuple(
+                tool.sample(characters[:1], 1, seed=seed, minimum_length=15)[
+                    characters[0]
+                ]["season"]
+            )
+            for seed in range(40)
+        }
+        assert len(seasons) > 1
+
+        # Characters with fewer lines are shuffled whole; unknown ones are empty
+        everything = tool.sample([characters[-1], -1], 1_000_000, minimum_length=15)
+        assert (
+            len(everything[characters[-1]])
+            == (index["character_id"] == characters[-1]).sum()
+        )
+        assert everything[-1].empty
+
 
 if __name__ == "__main__":
     main()
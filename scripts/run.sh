@@ -4,8 +4,11 @@ task db:seed
 task data:extract
 task annotations:get
 task annotations:process
+task annotations:load
 task statistics:tf-idf
 task statistics:topics
 task statistics:dashboard
+task db:snapshot
+task data:compress
 
 uv run comp370
@@ -1,4 +1,19 @@
 from .annotator import Annotator
 from .codebook import Codebook, Category, Example
+from .runner import AnnotationRunner
+from .cache import AnnotationCache
+from .context import ContextProvider
+from .ensemble import EnsembleAnnotator
+from .store import AnnotationStore
 
-__all__ = ["Annotator", "Codebook", "Category", "Example"]
+__all__ = [
+    "Annotator",
+    "Codebook",
+    "Category",
+    "Example",
+    "AnnotationRunner",
+    "AnnotationCache",
+    "ContextProvider",
+    "EnsembleAnnotator",
+    "AnnotationStore",
+]
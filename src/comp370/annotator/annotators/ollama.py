@@ -6,13 +6,30 @@ from pydantic import BaseModel
 
 from comp370.db.models import Line
 from ..codebook import Codebook
+from ..codebook import PromptTemplate
 from ..annotator import Annotator
+from ..cache import AnnotationCache
+from ..cache import context_hash
 
 
 class OllamaAnnotationResponse(BaseModel):
     category: str
 
 
+class OllamaBatchAnnotation(BaseModel):
+    id: int
+    category: str
+
+
+class OllamaBatchResponse(BaseModel):
+    annotations: list[OllamaBatchAnnotation]
+
+
+# Response schemas, built once rather than for every request
+RESPONSE_SCHEMA = OllamaAnnotationResponse.model_json_schema()
+BATCH_RESPONSE_SCHEMA = OllamaBatchResponse.model_json_schema()
+
+
 class OllamaAnnotator(Annotator[ollama.Client]):
     def __init__(
         self,
@@ -20,66 +37,68 @@ class OllamaAnnotator(Annotator[ollama.Client]):
         model: str = "gpt-oss:120b",
         host: str = "https://ollama.com",
         codebook: Optional[Codebook] = None,
+        cache: Optional[AnnotationCache] = None,
+        context_size: int = 5,
+        compact: bool = True,
+        examples: bool = True,
     ) -> None:
-        super().__init__(
-            ollama.Client(
-                host=host,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                },
-            ),
-            codebook,
-        )
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+        }
+        super().__init__(ollama.Client(host=host, headers=headers), codebook)
         self.model = model
         self.host = host
-
-    def annotate(self, line: Line, max_attempts: int = 5) -> str:
+        self.headers = headers
+        self.cache = cache
+        self.context_size = context_size
+        self.compact = compact
+        self.examples = examples
+
+    @property
+    def template(self) -> PromptTemplate:
+        """Prompt template of the codebook (compiled once)."""
         if not self.codebook:
             raise ValueError("Codebook is required for annotation.")
+        return self.codebook.compile(compact=self.compact, examples=self.examples)
 
-        exceptions = []
-        context = self.context(line, n=5)
-        prompt = f"""
-        You are an expert in annotating data.
-        You were given the following typology in JSON format:
+    def prompt(self, line: Line, context: Optional[list[Line]] = None) -> str:
+        """
+        Build the user message annotating a line, with its preceding context
+        (the codebook is sent as the system prompt, see template).
+        """
+        if context is None:
+            context = self.context(line, n=self.context_size)
+        return self.template.line(line, context)
 
-        {self.codebook.model_dump_json(indent=2)}
+    def parse(self, content: Optional[str]) -> str:
+        """Validate a model response and return its category."""
+        if not content:
+            raise ValueError("Empty response.")
 
-        Your task is to annotate the proper category for the given data.
-        Choose the most appropriate category from the typology.
-        Output in JSON according to the specified schema.
+        annotation = OllamaAnnotationResponse.model_validate_json(content)
+        for category in self.codebook.categories:
+            if category.name == annotation.category:
+                return annotation.category
 
-        == CONTEXT (previous {len(context)} lines):
-        {"\n".join(map(lambda x: f"- {x.character.name}: `{x.dialogue}`", context))}
-        == LINE TO ANNOTATE:
-        - {line.character.name}: `{line.dialogue}`
-        """
+        raise ValueError("Category not found in codebook.")
 
+    def annotate(self, line: Line, max_attempts: int = 5) -> str:
+        exceptions = []
+        context = self.context(line, n=self.context_size)
+        key = context_hash(line, context)
+        if self.cache is not None:
+            cached = self.cache.get(self.model, self.template, line.id, key)
+            if cached is not None:
+                return cached
+
+        prompt = self.prompt(line, context)
         for attempt in range(max_attempts):
             try:
-                response = self.engine.chat(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": prompt,
-                        }
-                    ],
-                    format=OllamaAnnotationResponse.model_json_schema(),
-                )
-
-                if not response or not response.message or not response.message.content:
-                    continue
-
-                annotation = OllamaAnnotationResponse.model_validate_json(
-                    response.message.content
-                )
-
-                for category in self.codebook.categories:
-                    if category.name == annotation.category:
-                        return annotation.category
-
-                raise ValueError("Category not found in codebook.")
+                response = self.engine.chat(**self._request(prompt))
+                category = self.parse(response.message.content if response else None)
+                if self.cache is not None:
+                    self.cache.put(self.model, self.template, line.id, key, category)
+                return category
             except Exception as e:
                 exceptions.append(e)
                 time.sleep(attempt * 2)
@@ -87,9 +106,74 @@ class OllamaAnnotator(Annotator[ollama.Client]):
 
         raise RuntimeError(f"Failed to annotate: {exceptions}")
 
+    def entry(self, line: Line, context: Optional[list[Line]] = None) -> str:
+        """Describe a line, with its preceding context, for a batch prompt."""
+        if context is None:
+            context = self.context(line, n=self.context_size)
+        return self.template.entry(line, context)
+
+    def batch_prompt(self, entries: list[str]) -> str:
+        """Build the user message annotating several entries (see entry)."""
+        return self.template.batch(entries)
+
+    def parse_batch(self, content: Optional[str], n: int) -> list[Optional[str]]:
+        """
+        Validate a batch response and return the category of each of its n
+        lines (None for lines missing, repeated or with an unknown category).
+        """
+        if not content:
+            raise ValueError("Empty response.")
+
+        response = OllamaBatchResponse.model_validate_json(content)
+        names = {category.name for category in self.codebook.categories}
+        ids = [annotation.id for annotation in response.annotations]
+
+        categories: list[Optional[str]] = [None] * n
+        for annotation in response.annotations:
+            if (
+                1 <= annotation.id <= n
+                and ids.count(annotation.id) == 1
+                and annotation.category in names
+            ):
+                categories[annotation.id - 1] = annotation.category
+        return categories
+
+    def async_engine(self) -> ollama.AsyncClient:
+        """Create an async client (to be used within a single event loop)."""
+        return ollama.AsyncClient(host=self.host, headers=self.headers)
+
+    async def aannotate(self, engine: ollama.AsyncClient, prompt: str) -> str:
+        """Make a single annotation attempt for a prompt (see prompt)."""
+        response = await engine.chat(**self._request(prompt))
+        return self.parse(response.message.content if response else None)
+
+    async def aannotate_batch(
+        self, engine: ollama.AsyncClient, entries: list[str]
+    ) -> list[Optional[str]]:
+        """Annotate several entries (see entry) in a single request."""
+        request = self._request(
+            self.batch_prompt(entries), BATCH_RESPONSE_SCHEMA, batch=True
+        )
+        response = await engine.chat(**request)
+        return self.parse_batch(
+            response.message.content if response else None, len(entries)
+        )
+
     def models(self) -> list[str]:
         url = f"{self.host}/api/tags"
         response = requests.get(url)
         response.raise_for_status()
         data = response.json()
         return list(set(model["name"] for model in data["models"]))
+
+    def _request(
+        self,
+        prompt: str,
+        schema: dict = RESPONSE_SCHEMA,
+        batch: bool = False,
+    ) -> dict:
+        return {
+            "model": self.model,
+            "messages": self.template.messages(prompt, batch=batch),
+            "format": schema,
+        }
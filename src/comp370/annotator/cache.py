@@ -0,0 +1,162 @@
+"""
+Persistent cache of annotation results.
+
+Annotations are keyed by the model, a hash of the system prompts (the codebook
+as compiled for the model, e.g. with or without examples), the line and a hash
+of the text the model saw (the line and its context), so a result is reused
+only if the exact same question was asked before. The cache lives in
+its own SQLite file, outside the (reseedable) database, and every result is
+committed as soon as it is stored, so interrupted runs can be resumed.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable
+from typing import Optional
+
+from comp370.constants import DIR_CACHE
+from comp370.db.models import Line
+from .codebook import PromptTemplate
+
+# Where the cache is stored by default
+PATH_CACHE = DIR_CACHE / "annotations.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    model TEXT NOT NULL,
+    codebook TEXT NOT NULL,
+    line_id INTEGER NOT NULL,
+    context TEXT NOT NULL,
+    category TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model, codebook, line_id, context)
+)
+"""
+
+# Number of keys looked up per query (below SQLite's variable limit)
+CHUNK = 500
+
+
+def template_hash(template: PromptTemplate) -> str:
+    """Hash the system prompts of a compiled codebook."""
+    text = f"{template.system}\0{template.batch_system}"
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def context_hash(line: Line, context: list[Line]) -> str:
+    """Hash a line and the context lines shown along with it."""
+    text = "\n".join(f"{x.character.name}: {x.dialogue}" for x in [*context, line])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class AnnotationCache:
+    """
+    Look up and store annotation results.
+
+    Attributes:
+        path: Path to the cache file
+    """
+
+    def __init__(self, path: Path = PATH_CACHE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(
+        self, model: str, template: PromptTemplate, line_id: int, context: str
+    ) -> Optional[str]:
+        """Get the cached category of a line, if any."""
+        return self.get_many(model, template, [(line_id, context)]).get(
+            (line_id, context)
+        )
+
+    def get_many(
+        self,
+        model: str,
+        template: PromptTemplate,
+        keys: Iterable[tuple[int, str]],
+    ) -> dict[tuple[int, str], str]:
+        """
+        Get the cached categories of many lines.
+
+        Args:
+            model: Model that annotated the lines
+            template: Compiled codebook the lines were annotated with
+            keys: (line id, context hash) of every line
+
+        Returns:
+            Category by key, for the keys found in the cache
+        """
+        keys = list(dict.fromkeys((int(id), ctx) for id, ctx in keys))
+        digest = template_hash(template)
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), CHUNK):
+                chunk = keys[start : start + CHUNK]
+                wanted = set(chunk)
+                rows = self._conn.execute(
+                    "SELECT line_id, context, category FROM annotations"
+                    " WHERE model = ? AND codebook = ?"
+                    f" AND line_id IN ({', '.join('?' * len(chunk))})",
+                    [model, digest, *(id for id, _ in chunk)],
+                )
+                for id, ctx, category in rows:
+                    if (id, ctx) in wanted:
+                        found[(id, ctx)] = category
+        return found
+
+    def put(
+        self,
+        model: str,
+        template: PromptTemplate,
+        line_id: int,
+        context: str,
+        category: str,
+    ) -> None:
+        """Store (and commit) the category of a line."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO annotations"
+                " (model, codebook, line_id, context, category)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (model, template_hash(template), int(line_id), context, category),
+            )
+            self._conn.commit()
+
+    def clear(self, model: Optional[str] = None) -> int:
+        """
+        Remove cached annotations.
+
+        Args:
+            model: Only remove this model's annotations (all if None)
+
+        Returns:
+            Number of annotations removed
+        """
+        with self._lock:
+            if model is None:
+                cursor = self._conn.execute("DELETE FROM annotations")
+            else:
+                cursor = self._conn.execute(
+                    "DELETE FROM annotations WHERE model = ?", (model,)
+                )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "AnnotationCache":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,177 @@
+"""
+Local pre-classification of lines before LLM annotation.
+
+A TF-IDF + logistic regression model, trained on the consensus annotations,
+labels the lines it is confident about; only the others are sent to the
+(remote, much slower) LLM annotator. How many lines are skipped, and how
+often the skipped ones agree with human labels, depends on the confidence
+threshold, which `evaluate` reports on held-out lines.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sqlalchemy.orm import Session
+
+from comp370.constants import DIR_DATA
+from comp370.db.tools.line import LineTool
+from .consensus import UNKNOWN
+
+# Where the trained classifier is saved by default
+PATH_CLASSIFIER = DIR_DATA / "annotations" / "classifier.joblib"
+
+# Minimum predicted probability for a line to be labelled locally
+THRESHOLD = 0.8
+
+
+@dataclass
+class Evaluation:
+    """
+    Performance of a pre-classifier on labelled lines.
+
+    Attributes:
+        threshold: Confidence threshold evaluated
+        lines: Number of lines evaluated
+        skipped: Fraction of lines labelled locally (not sent to the LLM)
+        agreement: Fraction of locally labelled lines matching the reference
+        accuracy: Fraction of all lines whose top prediction matches the
+                  reference, regardless of confidence
+    """
+
+    threshold: float
+    lines: int
+    skipped: float
+    agreement: float
+    accuracy: float
+
+
+class PreClassifier:
+    """
+    Label lines locally when confident enough.
+
+    Attributes:
+        threshold: Minimum predicted probability to label a line
+        model: TF-IDF + logistic regression pipeline
+    """
+
+    def __init__(
+        self,
+        threshold: float = THRESHOLD,
+        min_df: int = 2,
+        max_ngram: int = 2,
+        C: float = 4.0,
+    ):
+        self.threshold = threshold
+        self.model = Pipeline(
+            [
+                (
+                    "tfidf",
+                    TfidfVectorizer(
+                        lowercase=True,
+                        ngram_range=(1, max_ngram),
+                        min_df=min_df,
+                        sublinear_tf=True,
+                    ),
+                ),
+                ("clf", LogisticRegression(C=C, max_iter=1000)),
+            ]
+        )
+
+    def fit(self, texts: list[str], labels: list[str]) -> "PreClassifier":
+        """Train on lines of dialogue and their categories."""
+        self.model.fit(list(texts), list(labels))
+        return self
+
+    def predict(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the most likely category of every line.
+
+        Returns:
+            The categories and their predicted probabilities
+        """
+        if len(texts) == 0:
+            return np.array([], dtype=object), np.array([], dtype=float)
+        probabilities = self.model.predict_proba(list(texts))
+        best = probabilities.argmax(axis=1)
+        classes = self.model.classes_
+        return classes[best], probabilities[np.arange(len(best)), best]
+
+    def classify(
+        self, texts: list[str], threshold: Optional[float] = None
+    ) -> list[Optional[str]]:
+        """
+        Label the lines predicted with enough confidence.
+
+        Args:
+            texts: Lines of dialogue
+            threshold: Confidence threshold (the classifier's if None)
+
+        Returns:
+            The category of every line, or None for lines left to the LLM
+        """
+        threshold = self.threshold if threshold is None else threshold
+        labels, confidence = self.predict(texts)
+        return [
+            str(label) if p >= threshold else None
+            for label, p in zip(labels, confidence)
+        ]
+
+    def evaluate(
+        self,
+        texts: list[str],
+        labels: list[str],
+        threshold: Optional[float] = None,
+    ) -> Evaluation:
+        """
+        Evaluate the classifier against reference labels (e.g. held-out
+        human annotations).
+        """
+        threshold = self.threshold if threshold is None else threshold
+        predicted, confidence = self.predict(texts)
+        labels = np.asarray(labels, dtype=object)
+        confident = confidence >= threshold
+        correct = predicted == labels
+
+        return Evaluation(
+            threshold=threshold,
+            lines=len(labels),
+            skipped=float(confident.mean()) if len(labels) else 0.0,
+            agreement=float(correct[confident].mean()) if confident.any() else 0.0,
+            accuracy=float(correct.mean()) if len(labels) else 0.0,
+        )
+
+    def save(self, path: Path = PATH_CLASSIFIER) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path: Path = PATH_CLASSIFIER) -> "PreClassifier":
+        return joblib.load(path)
+
+
+def training_data(session: Session, annotations: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join annotated lines with their dialogue.
+
+    Args:
+        session: Database session
+        annotations: DataFrame with season_number, episode_number,
+                     line_number and category columns (e.g. the derived
+                     annotations)
+
+    Returns:
+        The annotations with line_id and dialogue columns, without lines
+        labelled UNKNOWN or missing from the database
+    """
+    df = annotations[annotations["category"].notna()]
+    df = df[df["category"] != UNKNOWN].reset_index(drop=True)
+    lines = LineTool(session).lookup(df)
+    df = df.assign(line_id=lines["line_id"], dialogue=lines["dialogue"])
+    return df.dropna(subset=["dialogue"]).reset_index(drop=True)
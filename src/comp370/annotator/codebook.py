@@ -1,5 +1,80 @@
+import re
 import json
+from dataclasses import dataclass
 from pydantic import BaseModel
+from pydantic import PrivateAttr
+
+from comp370.db.models import Line
+
+# Approximates the pre-tokenization of BPE tokenizers, to estimate token counts
+TOKEN_PATTERN = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?\w+| ?[^\s\w]+|\s+")
+
+# Instructions given along with the typology, for one line
+INSTRUCTIONS = """Your task is to annotate the proper category for the given data.
+Choose the most appropriate category from the typology.
+Output in JSON according to the specified schema."""
+
+# Instructions given along with the typology, for a batch of lines
+BATCH_INSTRUCTIONS = """Your task is to annotate the proper category for each of the given lines.
+Choose the most appropriate category from the typology for every line.
+Output in JSON according to the specified schema, with one annotation per line
+whose id is the number of the line."""
+
+
+def count_tokens(text: str) -> int:
+    """Estimate the number of tokens of a text."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    Annotation prompts split into a static system prefix (the instructions
+    and typology, identical for every request, so engines can cache it) and
+    a user message holding only the lines to annotate.
+
+    Attributes:
+        system: System prompt for annotating one line
+        batch_system: System prompt for annotating a batch of lines
+    """
+
+    system: str
+    batch_system: str
+
+    def line(self, line: Line, context: list[Line]) -> str:
+        """User message for annotating one line."""
+        return "\n".join(
+            [
+                f"== CONTEXT (previous {len(context)} lines):",
+                *_quote(context),
+                "== LINE TO ANNOTATE:",
+                *_quote([line]),
+            ]
+        )
+
+    def entry(self, line: Line, context: list[Line]) -> str:
+        """Description of one line of a batch (see batch)."""
+        return "\n".join(
+            [
+                f"Context (previous {len(context)} lines):",
+                *_quote(context),
+                "Line to annotate:",
+                *_quote([line]),
+            ]
+        )
+
+    def batch(self, entries: list[str]) -> str:
+        """User message for annotating several entries, numbered from 1."""
+        return "\n\n".join(
+            f"== LINE {i}\n{entry}" for i, entry in enumerate(entries, start=1)
+        )
+
+    def messages(self, user: str, batch: bool = False) -> list[dict]:
+        """Chat messages for a user message."""
+        return [
+            {"role": "system", "content": self.batch_system if batch else self.system},
+            {"role": "user", "content": user},
+        ]
 
 
 class Codebook(BaseModel):
@@ -7,6 +82,10 @@ class Codebook(BaseModel):
     description: str
     categories: list["Category"]
 
+    # Compiled templates by serialization options (codebooks are not
+    # modified once in use, so they are never invalidated)
+    _templates: dict = PrivateAttr(default_factory=dict)
+
     def load(path: str) -> "Codebook":
         with open(path, "r") as f:
             data = json.load(f)
@@ -16,6 +95,60 @@ class Codebook(BaseModel):
         with open(path, "w") as f:
             json.dump(self.model_dump(), f, indent=4)
 
+    def serialize(self, compact: bool = True, examples: bool = True) -> str:
+        """
+        Serialize the codebook to JSON for a prompt.
+
+        Args:
+            compact: Leave out indentation and line breaks
+            examples: Include the examples of every category
+        """
+        exclude = None if examples else {"categories": {"__all__": {"examples"}}}
+        return self.model_dump_json(indent=None if compact else 2, exclude=exclude)
+
+    def compile(self, compact: bool = True, examples: bool = True) -> PromptTemplate:
+        """
+        Build the prompt template of the codebook, once per set of options.
+
+        Args:
+            compact: Serialize the codebook without indentation
+            examples: Include the examples of every category
+        """
+        key = (compact, examples)
+        if key not in self._templates:
+            typology = self.serialize(compact, examples)
+            prefix = (
+                "You are an expert in annotating data.\n"
+                "You were given the following typology in JSON format:\n\n"
+                f"{typology}\n\n"
+            )
+            self._templates[key] = PromptTemplate(
+                system=prefix + INSTRUCTIONS,
+                batch_system=prefix + BATCH_INSTRUCTIONS,
+            )
+        return self._templates[key]
+
+    def token_report(self) -> list[dict]:
+        """
+        Estimate the size of the system prompt for every serialization.
+
+        Returns:
+            One row per serialization, with its options, characters and
+            estimated tokens
+        """
+        rows = []
+        for compact, examples in [(False, True), (True, True), (True, False)]:
+            system = self.compile(compact, examples).system
+            rows.append(
+                {
+                    "compact": compact,
+                    "examples": examples,
+                    "characters": len(system),
+                    "tokens": count_tokens(system),
+                }
+            )
+        return rows
+
     def to_markdown(self) -> str:
         s = ""
         s += f"# {self.name}\n\n"
@@ -45,3 +178,7 @@ class Example(BaseModel):
     input: str
     include: bool
     why: str
+
+
+def _quote(lines: list[Line]) -> list[str]:
+    return [f"- {x.character.name}: `{x.dialogue}`" for x in lines]
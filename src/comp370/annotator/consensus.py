@@ -0,0 +1,85 @@
+"""
+Consensus labels from multiple annotators.
+
+Every annotator's most recent vote on a line is kept. If the human
+annotators produce a single most-voted category it wins; otherwise the
+category with the largest total annotator weight wins, and ties are
+labelled UNKNOWN.
+"""
+
+import pandas as pd
+
+# Line key shared by all annotation files
+KEYS = ["season_number", "episode_number", "line_number"]
+
+# Weight of each annotator's vote in the weighted consensus
+WEIGHTS = {
+    "me@dangre.co": 1.0,
+    "kejun.fang@mail.mcgill.ca": 1.0,
+    "denis.tsariov@mail.mcgill.ca": 1.0,
+    "gpt-oss@dangre.co": 0.75,
+    "minimax-m2@dangre.co": 0.5,
+}
+
+# Annotators whose votes take precedence when they agree
+HUMANS = ["me@dangre.co", "kejun.fang@mail.mcgill.ca"]
+
+# Label given to lines without a clear winner
+UNKNOWN = "UNKNOWN"
+
+
+def consensus(
+    df: pd.DataFrame,
+    weights: dict[str, float] = WEIGHTS,
+    humans: list[str] = HUMANS,
+) -> pd.DataFrame:
+    """
+    Compute the consensus category of every annotated line.
+
+    Args:
+        df: Annotations with KEYS, "date", "email" and "category" columns
+        weights: Weight of each annotator (unknown annotators weigh 0)
+        humans: Annotators whose plurality vote wins outright
+
+    Returns:
+        DataFrame with KEYS and "category", one row per line, sorted by KEYS
+    """
+    # Most recent vote per annotator per line
+    latest = df.sort_values("date", kind="stable").drop_duplicates(
+        KEYS + ["email"], keep="last"
+    )
+    votes = latest.dropna(subset=["category"])
+
+    human = votes[votes["email"].isin(humans)]
+    human_winner = _unique_max(human.groupby(KEYS + ["category"]).size())
+
+    weighted = votes.assign(weight=votes["email"].map(weights).fillna(0.0))
+    weighted_winner = _unique_max(weighted.groupby(KEYS + ["category"])["weight"].sum())
+
+    lines = pd.MultiIndex.from_frame(df[KEYS].drop_duplicates()).sort_values()
+    category = (
+        human_winner.reindex(lines)
+        .fillna(weighted_winner.reindex(lines))
+        .fillna(UNKNOWN)
+    )
+
+    return category.rename("category").reset_index()
+
+
+def _unique_max(scores: pd.Series) -> pd.Series:
+    """
+    Pick the top category per line, if it is not tied.
+
+    Args:
+        scores: Score per (KEYS..., category)
+
+    Returns:
+        Winning category indexed by KEYS (lines with ties are omitted)
+    """
+    if scores.empty:
+        return pd.Series(dtype=object, index=pd.MultiIndex.from_tuples([], names=KEYS))
+
+    top = scores[scores == scores.groupby(level=KEYS).transform("max")]
+    top = top.reset_index(level="category")["category"]
+    counts = top.groupby(level=KEYS).transform("size")
+    return top[counts == 1]
@@ -0,0 +1,84 @@
+"""
+Context windows for annotators.
+
+Every line is annotated along with the lines preceding it in its episode.
+Rather than querying these for every line, the provider loads each episode's
+lines once (in order, with their characters) and serves context windows as
+slices of the loaded episode.
+"""
+
+from typing import Iterable
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import joinedload
+
+from comp370.db.models import Line
+
+
+class ContextProvider:
+    """
+    Serve lines and their context windows from preloaded episodes.
+
+    Attributes:
+        session: Database session lines are loaded with (and attached to)
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._episodes: dict[int, list[Line]] = {}
+        self._positions: dict[int, tuple[int, int]] = {}
+
+    def prefetch(self, line_ids: Iterable[int]) -> dict[int, Line]:
+        """
+        Load the episodes of the given lines, in a single query.
+
+        Returns:
+            The given lines by id (unknown ids are left out)
+        """
+        ids = list(dict.fromkeys(int(id) for id in line_ids))
+        missing = [id for id in ids if id not in self._positions]
+        if missing:
+            episodes = set(
+                self.session.scalars(
+                    select(Line.episode_id).where(Line.id.in_(missing)).distinct()
+                )
+            )
+            self._load(episodes - set(self._episodes))
+
+        return {id: self._line(id) for id in ids if id in self._positions}
+
+    def lines(self, df: pd.DataFrame) -> list[Line]:
+        """Get the lines of a DataFrame with an "id" column, in order."""
+        lines = self.prefetch(df["id"])
+        return [lines[int(id)] for id in df["id"]]
+
+    def context(self, line: Line, n: int = 1) -> list[Line]:
+        """Get the (up to) n lines before the given line in its episode."""
+        if line.id not in self._positions:
+            self._load({line.episode_id})
+        episode, i = self._positions[line.id]
+        return self._episodes[episode][max(0, i - n) : i]
+
+    def contexts(self, df: pd.DataFrame, n: int = 1) -> list[list[Line]]:
+        """Get the context window of every line of a DataFrame with an "id" column."""
+        return [self.context(line, n) for line in self.lines(df)]
+
+    def _line(self, id: int) -> Line:
+        episode, i = self._positions[id]
+        return self._episodes[episode][i]
+
+    def _load(self, episodes: set[int]) -> None:
+        if not episodes:
+            return
+        stmt = (
+            select(Line)
+            .options(joinedload(Line.character))
+            .where(Line.episode_id.in_(episodes))
+            .order_by(Line.episode_id, Line.number)
+        )
+        for line in self.session.scalars(stmt):
+            lines = self._episodes.setdefault(line.episode_id, [])
+            self._positions[line.id] = (line.episode_id, len(lines))
+            lines.append(line)
@@ -0,0 +1,323 @@
+"""
+Annotation by an ensemble of LLMs queried in parallel.
+
+Every line is sent to all member models at once. Votes are weighted as in
+the consensus (see consensus.WEIGHTS) and returned in the schema of the
+Label Studio export, so they are processed along with the human annotations.
+The remaining requests for a line are only cancelled once its outcome is
+settled: when the leading category is ahead by more than the weight of the
+members yet to vote plus that of the annotators outside the ensemble who
+vote on the line, the missing votes can not change the consensus. By
+default every outside annotator is assumed to vote; callers that know which
+lines are freshly sampled (see outside_votes) pass the weight actually cast
+on each line, so lines nobody else voted on stop at the first clear lead.
+"""
+
+import asyncio
+import datetime
+from collections import Counter
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Optional
+
+import pandas as pd
+
+from .consensus import KEYS
+from .consensus import WEIGHTS
+from .runner import AnnotationRunner
+from .runner import AsyncAnnotator
+
+# Model of every ensemble member by the email its votes are recorded under
+MEMBERS = {
+    "gpt-oss@dangre.co": "gpt-oss:120b",
+    "minimax-m2@dangre.co": "minimax-m2",
+}
+
+
+@dataclass
+class Vote:
+    """
+    A member's vote on a line.
+
+    Attributes:
+        email: Member the vote is recorded under
+        category: Voted category (None if the member failed or timed out)
+        attempts: Number of attempts made
+        error: Last exception raised (None if voted)
+    """
+
+    email: str
+    category: Optional[str]
+    attempts: int
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class EnsembleResult:
+    """
+    Outcome of annotating one prompt with the ensemble.
+
+    Attributes:
+        index: Position of the prompt in the input
+        category: Category with the largest total weight (None if no member
+                  voted or the top categories are tied)
+        decided: Whether the outcome was settled before every member voted
+        votes: Votes collected (members cancelled once the outcome was
+               settled are left out)
+    """
+
+    index: int
+    category: Optional[str]
+    decided: bool
+    votes: list[Vote] = field(default_factory=list)
+
+
+class EnsembleAnnotator:
+    """
+    Annotate prompts with several models concurrently.
+
+    Attributes:
+        members: Annotator of every member, by email
+        weights: Weight of every member's vote
+        runner: Runner whose concurrency (lines in flight), rate limits,
+                attempts and backoff are used
+        timeout: Seconds a member has to vote on a line, retries included
+        others: Weight of every annotator outside the ensemble
+        outside: Total weight of the annotators whose votes are merged with
+                 the ensemble's (by default, all of others)
+    """
+
+    def __init__(
+        self,
+        members: dict[str, AsyncAnnotator],
+        weights: dict[str, float] = WEIGHTS,
+        runner: Optional[AnnotationRunner] = None,
+        timeout: float = 120.0,
+        outside: Optional[float] = None,
+    ):
+        unweighted = [email for email in members if email not in weights]
+        if unweighted:
+            raise ValueError(f"Members without a weight: {', '.join(unweighted)}")
+
+        self.members = members
+        self.weights = {email: weights[email] for email in members}
+        self.runner = runner or AnnotationRunner()
+        self.timeout = timeout
+        self.others = {
+            email: weight for email, weight in weights.items() if email not in members
+        }
+        self.outside = sum(self.others.values()) if outside is None else outside
+
+    def settled(
+        self, totals: Counter, pending: float, outside: Optional[float] = None
+    ) -> bool:
+        """
+        Whether the leading category wins whatever the missing votes are.
+
+        Args:
+            totals: Weight of every category voted for so far
+            pending: Weight of the members yet to vote
+            outside: Weight of the outside votes on the line (defaults to
+                     self.outside)
+        """
+        if not totals:
+            return False
+        best, *rest = sorted(totals.values(), reverse=True)
+        second = rest[0] if rest else 0.0
+        return best - second > pending + (self.outside if outside is None else outside)
+
+    def outside_votes(self, keys: pd.DataFrame, votes: pd.DataFrame) -> list[float]:
+        """
+        Get the weight outside annotators have cast on every line.
+
+        Args:
+            keys: DataFrame with KEYS columns, one row per line
+            votes: Votes recorded so far (e.g. annotations.all.csv)
+
+        Returns:
+            One weight per row of keys (0 for lines only the ensemble votes on)
+        """
+        votes = votes[votes["email"].isin(list(self.others))]
+        weights = (
+            votes.drop_duplicates(KEYS + ["email"])
+            .assign(weight=lambda df: df["email"].map(self.others))
+            .groupby(KEYS)["weight"]
+            .sum()
+        )
+        merged = keys[KEYS].merge(weights.reset_index(), on=KEYS, how="left")
+        return merged["weight"].fillna(0.0).tolist()
+
+    async def run(
+        self, prompts: list[str], outside: Optional[list[float]] = None
+    ) -> AsyncIterator[EnsembleResult]:
+        """
+        Annotate prompts, yielding results in order of completion.
+
+        Args:
+            prompts: Prompts to annotate (e.g. from OllamaAnnotator.prompt)
+            outside: Weight of the outside votes on every prompt (defaults to
+                     self.outside for all of them)
+        """
+        if not prompts:
+            return
+
+        engines = {
+            email: annotator.async_engine() for email, annotator in self.members.items()
+        }
+        lines = asyncio.Semaphore(self.runner.concurrency)
+
+        async def annotate(index: int) -> EnsembleResult:
+            async with lines:
+                return await self._line(
+                    index,
+                    prompts[index],
+                    engines,
+                    None if outside is None else outside[index],
+                )
+
+        tasks = [asyncio.create_task(annotate(i)) for i in range(len(prompts))]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def annotate(
+        self,
+        prompts: list[str],
+        tick: Optional[Callable[[EnsembleResult], None]] = None,
+        outside: Optional[list[float]] = None,
+    ) -> list[EnsembleResult]:
+        """
+        Annotate prompts from synchronous code.
+
+        Args:
+            prompts: Prompts to annotate
+            tick: Called with every result as it completes
+            outside: Weight of the outside votes on every prompt (see
+                     outside_votes)
+
+        Returns:
+            One result per prompt, in input order
+        """
+
+        async def collect():
+            out = []
+            async for result in self.run(prompts, outside):
+                if tick is not None:
+                    tick(result)
+                out.append(result)
+            return out
+
+        return sorted(asyncio.run(collect()), key=lambda r: r.index)
+
+    async def _line(
+        self,
+        index: int,
+        prompt: str,
+        engines: dict[str, Any],
+        outside: Optional[float] = None,
+    ) -> EnsembleResult:
+        """Collect the votes on one line until it is settled or every vote is in."""
+        pending = {
+            asyncio.create_task(self._vote(email, engines[email], prompt))
+            for email in self.members
+        }
+        waiting = sum(self.weights.values())
+        votes = []
+        totals: Counter = Counter()
+        decided = False
+
+        try:
+            while pending and not decided:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    vote = task.result()
+                    votes.append(vote)
+                    waiting -= self.weights[vote.email]
+                    if vote.category is not None:
+                        totals[vote.category] += self.weights[vote.email]
+                decided = self.settled(totals, waiting, outside)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        return EnsembleResult(
+            index=index,
+            category=_winner(totals),
+            decided=decided and len(votes) < len(self.members),
+            votes=votes,
+        )
+
+    async def _vote(self, email: str, engine: Any, prompt: str) -> Vote:
+        """Get a member's vote, retrying until it succeeds or times out."""
+        annotator = self.members[email]
+        limiter = self.runner.limiter(annotator.model)
+        attempts = 0
+        error: Optional[BaseException] = None
+
+        async def attempt() -> str:
+            nonlocal attempts, error
+            while True:
+                attempts += 1
+                if limiter is not None:
+                    await limiter.acquire()
+                try:
+                    return await annotator.aannotate(engine, prompt)
+                except Exception as e:
+                    error = e
+                    if attempts >= self.runner.max_attempts:
+                        raise
+                await asyncio.sleep(self.runner.delay(attempts))
+
+        try:
+            category = await asyncio.wait_for(attempt(), self.timeout)
+        except TimeoutError as e:
+            return Vote(email, None, attempts, e)
+        except Exception:
+            return Vote(email, None, attempts, error)
+        return Vote(email, category, attempts)
+
+
+def to_votes(
+    results: list[EnsembleResult],
+    keys: pd.DataFrame,
+    date: Optional[datetime.datetime] = None,
+) -> pd.DataFrame:
+    """
+    Turn ensemble results into votes in the schema of annotations.all.csv.
+
+    Args:
+        results: Results, one per row of keys (see EnsembleResult.index)
+        keys: DataFrame with KEYS columns
+        date: Date recorded for the votes (now if None)
+
+    Returns:
+        DataFrame with KEYS, date, email and category, one row per vote cast
+    """
+    date = date or datetime.datetime.now(datetime.timezone.utc)
+    keys = keys[KEYS].reset_index(drop=True)
+    rows = [
+        (*keys.iloc[result.index], date.isoformat(), vote.email, vote.category)
+        for result in results
+        for vote in result.votes
+        if vote.category is not None
+    ]
+    return pd.DataFrame(rows, columns=KEYS + ["date", "email", "category"])
+
+
+def _winner(totals: Counter) -> Optional[str]:
+    """Category with the largest total weight, if not tied."""
+    if not totals:
+        return None
+    best = max(totals.values())
+    top = [category for category, total in totals.items() if total == best]
+    return top[0] if len(top) == 1 else None
@@ -0,0 +1,226 @@
+"""
+Concurrent annotation of many lines with an LLM annotator.
+
+A fixed pool of async workers keeps a bounded number of requests in flight.
+Requests to the same model are spaced out by a per-model rate limit, and
+failed attempts are retried after a jittered exponential backoff. A line
+waiting out its backoff is put back in the queue rather than held by a
+worker, so other lines keep being annotated meanwhile. Results are streamed
+as they complete.
+
+With a batch size above one, each request annotates several items at once
+(see OllamaAnnotator.entry), and only the items the model failed to
+annotate are queued again.
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any
+from typing import AsyncIterator
+from typing import Callable
+from typing import Optional
+from typing import Protocol
+
+# Requests per second allowed for each model (models not listed are unlimited)
+RATE_LIMITS: dict[str, float] = {}
+
+
+class AsyncAnnotator(Protocol):
+    """An annotator able to make single async annotation attempts."""
+
+    model: str
+
+    def async_engine(self) -> Any:
+        """Create the client used by aannotate, within the running event loop."""
+        ...
+
+    async def aannotate(self, engine: Any, prompt: str) -> str:
+        """Annotate a prompt once, raising if the attempt fails."""
+        ...
+
+    async def aannotate_batch(
+        self, engine: Any, entries: list[str]
+    ) -> list[Optional[str]]:
+        """
+        Annotate several entries in one request, raising if the request
+        fails; entries without a valid category are None.
+        """
+        ...
+
+
+@dataclass
+class Result:
+    """
+    Outcome of annotating one item.
+
+    Attributes:
+        index: Position of the item in the input
+        category: Annotated category (None if every attempt failed)
+        attempts: Number of attempts made
+        error: Last exception raised (None if annotated)
+    """
+
+    index: int
+    category: Optional[str]
+    attempts: int
+    error: Optional[BaseException] = None
+
+
+class RateLimiter:
+    """Space out requests to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def acquire(self) -> None:
+        # No await between reading and reserving the slot, so this is atomic
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AnnotationRunner:
+    """
+    Annotate prompts, or batches of entries, concurrently.
+
+    Attributes:
+        concurrency: Maximum number of requests in flight
+        batch_size: Maximum number of items annotated per request
+        rate_limits: Requests per second allowed for each model
+        max_attempts: Attempts per item before giving up
+        backoff: Base delay (seconds) before the first retry, doubled on
+                 every further attempt
+        max_backoff: Maximum delay before a retry
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        batch_size: int = 1,
+        rate_limits: dict[str, float] = RATE_LIMITS,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.rate_limits = rate_limits
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._limiters: dict[str, RateLimiter] = {}
+
+    def delay(self, attempt: int) -> float:
+        """Jittered delay before retrying after the given (1-based) attempt."""
+        cap = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(cap / 2, cap)
+
+    async def run(
+        self, annotator: AsyncAnnotator, items: list[str]
+    ) -> AsyncIterator[Result]:
+        """
+        Annotate items, yielding results in order of completion.
+
+        Args:
+            annotator: Annotator making the requests
+            items: Prompts to annotate (e.g. from OllamaAnnotator.prompt) or,
+                   with a batch size above one, entries to batch (e.g. from
+                   OllamaAnnotator.entry)
+        """
+        if not items:
+            return
+
+        engine = annotator.async_engine()
+        limiter = self.limiter(annotator.model)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        results: asyncio.Queue[Result] = asyncio.Queue()
+        for index in range(len(items)):
+            queue.put_nowait((index, 1))
+
+        def retry(index: int, attempt: int, error: Exception, delay: float):
+            if attempt >= self.max_attempts:
+                results.put_nowait(Result(index, None, attempt, error))
+            else:
+                loop.call_later(delay, queue.put_nowait, (index, attempt + 1))
+
+        async def worker():
+            while True:
+                batch = [await queue.get()]
+                while len(batch) < self.batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                if limiter is not None:
+                    await limiter.acquire()
+                try:
+                    if self.batch_size == 1:
+                        prompt = items[batch[0][0]]
+                        categories = [await annotator.aannotate(engine, prompt)]
+                    else:
+                        entries = [items[index] for index, _ in batch]
+                        categories = await annotator.aannotate_batch(engine, entries)
+                except Exception as e:
+                    for index, attempt in batch:
+                        retry(index, attempt, e, self.delay(attempt))
+                    continue
+
+                # The request went through, so invalid items are retried at once
+                for (index, attempt), category in zip(batch, categories):
+                    if category is None:
+                        error = ValueError("No valid category returned.")
+                        retry(index, attempt, error, 0)
+                    else:
+                        results.put_nowait(Result(index, category, attempt))
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(min(self.concurrency, len(items)))
+        ]
+        try:
+            for _ in range(len(items)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def annotate(
+        self,
+        annotator: AsyncAnnotator,
+        items: list[str],
+        tick: Optional[Callable[[Result], None]] = None,
+    ) -> list[Result]:
+        """
+        Annotate items from synchronous code.
+
+        Args:
+            annotator: Annotator making the requests
+            items: Prompts or entries to annotate (see run)
+            tick: Called with every result as it completes
+
+        Returns:
+            One result per item, in input order
+        """
+
+        async def collect():
+            out = []
+            async for result in self.run(annotator, items):
+                if tick is not None:
+                    tick(result)
+                out.append(result)
+            return out
+
+        return sorted(asyncio.run(collect()), key=lambda r: r.index)
+
+    def limiter(self, model: str) -> Optional[RateLimiter]:
+        """Get the limiter shared by every run against a model."""
+        if model not in self.rate_limits:
+            return None
+        if model not in self._limiters:
+            self._limiters[model] = RateLimiter(self.rate_limits[model])
+        return self._limiters[model]
@@ -0,0 +1,231 @@
+"""
+Incrementally synced store of Label Studio annotations.
+
+Annotations are appended as columnar NumPy parts (`part-NNNNNN.npz`), each
+holding the annotations of the tasks updated since the previous sync, along
+with the sync cursor (the latest task update seen). Reading the store keeps
+the most recent version of every (task, annotation) pair, and parts are
+compacted into one once there are too many of them.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from comp370.constants import DIR_DATA
+
+# Where the store is kept by default
+DIR_STORE = DIR_DATA / "annotations" / "store"
+
+# Columns of every part
+COLUMNS = [
+    "task_id",
+    "annotation_id",
+    "season_number",
+    "episode_number",
+    "line_number",
+    "date",
+    "email",
+    "category",
+]
+
+# Columns identifying an annotation
+KEY = ["task_id", "annotation_id"]
+
+# Columns stored as text (the others are integers)
+TEXT = ["date", "email", "category"]
+
+# Number of annotations appended per part while syncing
+CHUNK = 5_000
+
+
+def records(task: Any) -> list[tuple]:
+    """
+    Get the rows of a Label Studio task's annotations (see COLUMNS).
+
+    Annotations without a result are left out.
+    """
+    rows = []
+    for annotation in task.annotations:
+        if not len(annotation["result"]):
+            continue
+        rows.append(
+            (
+                task.id,
+                annotation["id"],
+                task.data["season"],
+                task.data["episode"],
+                task.data["number"],
+                str(annotation["updated_at"]),
+                annotation["created_username"].split(",")[0].strip(),
+                annotation["result"][0]["value"]["choices"][0],
+            )
+        )
+    return rows
+
+
+class AnnotationStore:
+    """
+    Append-only columnar store of annotations.
+
+    Attributes:
+        dir: Directory the parts are written to
+        max_parts: Number of parts above which they are compacted
+    """
+
+    def __init__(self, dir: Path = DIR_STORE, max_parts: int = 32):
+        self.dir = dir
+        self.max_parts = max_parts
+
+    @property
+    def cursor(self) -> Optional[str]:
+        """ISO timestamp of the latest task update synced, if any."""
+        return self._meta().get("cursor")
+
+    def parts(self) -> list[Path]:
+        return sorted(self.dir.glob("part-*.npz"))
+
+    def append(self, rows: list[tuple], cursor: Optional[str]) -> None:
+        """
+        Append annotations as a new part and advance the cursor.
+
+        Args:
+            rows: Annotations (see records)
+            cursor: Latest task update covered by the rows
+        """
+        os.makedirs(self.dir, exist_ok=True)
+        meta = self._meta()
+        if rows:
+            number = meta.get("parts", 0) + 1
+            _save(
+                self.dir / f"part-{number:06d}.npz", pd.DataFrame(rows, columns=COLUMNS)
+            )
+            meta["parts"] = number
+        if cursor is not None and (
+            meta.get("cursor") is None
+            or pd.Timestamp(cursor) > pd.Timestamp(meta["cursor"])
+        ):
+            meta["cursor"] = cursor
+        self._save_meta(meta)
+
+        if len(self.parts()) > self.max_parts:
+            self.compact()
+
+    def read(self) -> pd.DataFrame:
+        """Read the latest version of every annotation (see COLUMNS)."""
+        frames = [_load(path) for path in self.parts()]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.concat(frames, ignore_index=True)
+        return (
+            df.drop_duplicates(KEY, keep="last")
+            .sort_values(KEY, kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def compact(self) -> None:
+        """Merge every part into one."""
+        parts = self.parts()
+        if len(parts) <= 1:
+            return
+        meta = self._meta()
+        number = meta.get("parts", 0) + 1
+        _save(self.dir / f"part-{number:06d}.npz", self.read())
+        meta["parts"] = number
+        self._save_meta(meta)
+        for path in parts:
+            path.unlink()
+
+    def clear(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _meta(self) -> dict:
+        path = self.dir / "meta.json"
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_meta(self, meta: dict) -> None:
+        tmp = self.dir / "meta.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self.dir / "meta.json")
+
+
+def sync(
+    tasks: Callable[[Optional[str]], Iterable[Any]],
+    store: AnnotationStore,
+    full: bool = False,
+    tick: Optional[Callable[[], None]] = None,
+) -> int:
+    """
+    Append the annotations of the tasks updated since the store's cursor.
+
+    Tasks must come oldest update first, so that the cursor saved with
+    every chunk covers every task before it.
+
+    Args:
+        tasks: Called with the cursor, yields the tasks updated at or after
+               it (e.g. label_studio.Client.get_tasks_since)
+        store: Store to append to
+        full: Clear the store and sync every task
+        tick: Called once per task
+
+    Returns:
+        Number of annotations appended
+    """
+    if full:
+        store.clear()
+
+    rows: list[tuple] = []
+    cursor: Optional[pd.Timestamp] = None
+    total = 0
+    for task in tasks(store.cursor):
+        rows.extend(records(task))
+        updated = _timestamp(task.updated_at)
+        if cursor is None or updated > cursor:
+            cursor = updated
+        if tick is not None:
+            tick()
+
+        if len(rows) >= CHUNK:
+            store.append(rows, cursor.isoformat())
+            total += len(rows)
+            rows = []
+
+    store.append(rows, None if cursor is None else cursor.isoformat())
+    return total + len(rows)
+
+
+def _timestamp(value: Any) -> pd.Timestamp:
+    """Parse a datetime (or ISO string) as a UTC timestamp."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _save(path: Path, df: pd.DataFrame) -> None:
+    tmp = path.with_name(f".tmp-{path.name}")
+    np.savez_compressed(
+        tmp,
+        **{
+            column: df[column].astype(str).to_numpy(dtype=str)
+            if column in TEXT
+            else df[column].to_numpy(dtype=np.int64)
+            for column in COLUMNS
+        },
+    )
+    os.replace(tmp, path)
+
+
+def _load(path: Path) -> pd.DataFrame:
+    with np.load(path) as data:
+        return pd.DataFrame({column: data[column] for column in COLUMNS})
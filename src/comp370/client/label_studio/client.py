@@ -1,4 +1,7 @@
+import json
+from typing import Optional
 from label_studio_sdk import LabelStudio
+from label_studio_sdk.core.api_error import ApiError
 from label_studio_sdk.types import RoleBasedTask
 from collections.abc import Iterator
 
@@ -28,3 +31,109 @@ class Client:
 
         for task in tasks:
             yield task
+
+    def get_tasks_since(
+        self,
+        since: Optional[str] = None,
+        page_size: int = 250,
+    ) -> Iterator[RoleBasedTask]:
+        """
+        Yield the annotated tasks updated at or after a cursor, oldest first.
+
+        Pages are fetched by keyset on (updated_at, id): every request asks
+        for the tasks after the last one seen, so tasks updated during the
+        sync move to the end instead of shifting the pages still to come.
+        Tasks at the cursor's own timestamp are yielded again (the store
+        deduplicates them) rather than skipped.
+
+        Args:
+            since: ISO timestamp of the last update already synced (all
+                   tasks if None)
+            page_size: Number of tasks per page
+        """
+        tasks = self._get_page(page_size, self._query(since, "greater_or_equal"))
+        while True:
+            yield from tasks
+            if len(tasks) < page_size:
+                return
+            updated_at = _isoformat(tasks[-1].updated_at)
+
+            # Tasks updated at the same time as the last one, by id
+            last_id = tasks[-1].id
+            while True:
+                tasks = self._get_page(
+                    page_size, self._query(updated_at, "equal", last_id)
+                )
+                yield from tasks
+                if len(tasks) < page_size:
+                    break
+                last_id = tasks[-1].id
+
+            tasks = self._get_page(page_size, self._query(updated_at, "greater"))
+
+    def _query(
+        self,
+        updated_at: Optional[str],
+        operator: str,
+        after_id: Optional[int] = None,
+    ) -> str:
+        """
+        Query of the annotated tasks by update time, oldest (then lowest id)
+        first.
+
+        Args:
+            updated_at: ISO timestamp to compare the update time to (every
+                        task if None)
+            operator: "greater", "greater_or_equal" or "equal"
+            after_id: Only tasks with a greater id
+        """
+        filters = []
+        if updated_at is not None:
+            operators = ["greater_or_equal", "less_or_equal"]
+            if operator != "equal":
+                operators = [operator]
+            filters.extend(
+                {
+                    "filter": "filter:tasks:updated_at",
+                    "operator": op,
+                    "type": "Datetime",
+                    "value": updated_at,
+                }
+                for op in operators
+            )
+        if after_id is not None:
+            filters.append(
+                {
+                    "filter": "filter:tasks:id",
+                    "operator": "greater",
+                    "type": "Number",
+                    "value": after_id,
+                }
+            )
+        return json.dumps(
+            {
+                "filters": {"conjunction": "and", "items": filters},
+                "ordering": ["tasks:updated_at", "tasks:id"],
+            }
+        )
+
+    def _get_page(self, page_size: int, query: str) -> list[RoleBasedTask]:
+        """Fetch the first page of tasks matching a query."""
+        try:
+            pager = self.client.tasks.list(
+                project=self.project,
+                page=1,
+                page_size=page_size,
+                only_annotated=True,
+                query=query,
+            )
+        except ApiError as e:
+            if e.status_code == 404:
+                return []
+            raise
+        return list(pager.items or [])
+
+
+def _isoformat(value) -> str:
+    """ISO timestamp of a task update (a datetime or already a string)."""
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
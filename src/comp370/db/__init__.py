@@ -12,7 +12,33 @@ from .models import (
     Episode,
     Character,
     Line,
+    DataVersion,
+    SummaryMeta,
+    CharacterSeasonSummary,
+    CharacterSummary,
+    EpisodeSummary,
+    WriterSummary,
+    LineTokens,
+    Annotation,
+    DerivedAnnotation,
 )
 from .client import Client
 
-__all__ = ["Base", "Season", "Person", "Episode", "Character", "Line", "Client"]
+__all__ = [
+    "Base",
+    "Season",
+    "Person",
+    "Episode",
+    "Character",
+    "Line",
+    "DataVersion",
+    "SummaryMeta",
+    "CharacterSeasonSummary",
+    "CharacterSummary",
+    "EpisodeSummary",
+    "WriterSummary",
+    "LineTokens",
+    "Annotation",
+    "DerivedAnnotation",
+    "Client",
+]
@@ -5,6 +5,7 @@ This module provides a Client class that handles database initialization,
 connections, and session management for the Seinfeld data.
 """
 
+import uuid
 from pathlib import Path
 from typing import Optional
 
@@ -15,6 +16,7 @@ from sqlalchemy.orm import Session
 from comp370.constants import DIR_DATA
 from .constants import SQLITE_DATABASE
 from .models import Base, Season, Episode, Person, Character, Line  # noqa: F401
+from .models import VERSIONED_TABLES
 
 
 class Client:
@@ -64,6 +66,28 @@ class Client:
             return
         self.engine = create_engine(f"sqlite:///{self.path}")
         Base.metadata.create_all(self.engine)
+        self._install_versioning()
+
+    def _install_versioning(self) -> None:
+        """
+        Create the data_version row and the triggers bumping it (idempotent,
+        so databases created before versioning get them too).
+        """
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO data_version (id, epoch, version) "
+                "VALUES (1, ?, 0)",
+                (uuid.uuid4().hex,),
+            )
+            for table in VERSIONED_TABLES:
+                for operation in ["INSERT", "UPDATE", "DELETE"]:
+                    conn.exec_driver_sql(
+                        f"CREATE TRIGGER IF NOT EXISTS "
+                        f"{table}_{operation.lower()}_version "
+                        f'AFTER {operation} ON "{table}" '
+                        "BEGIN UPDATE data_version SET version = version + 1 "
+                        "WHERE id = 1; END"
+                    )
 
     def session(self):
         """
@@ -2,12 +2,14 @@
 SQLAlchemy ORM models for Seinfeld episode data.
 
 This module defines the database schema for storing seasons, episodes,
-writers, characters, and dialogue lines with their relationships.
+writers, characters, dialogue lines and their annotations with their
+relationships.
 """
 
 from __future__ import annotations
 import datetime
 from typing import List
+from typing import Optional
 from sqlalchemy import ForeignKey
 from sqlalchemy import Table
 from sqlalchemy import Column
@@ -194,6 +196,8 @@ class Line(Base):
         episode: The episode this line is from
         character_id: Foreign key to Character
         character: The character who speaks this line
+        annotations: Every annotator's votes on the category of this line
+        derived: Consensus category of this line, if annotated
     """
 
     __tablename__ = "line"
@@ -213,3 +217,206 @@ class Line(Base):
         ForeignKey("character.id"),
         nullable=False,
     )
+
+    annotations: Mapped[List["Annotation"]] = relationship(
+        back_populates="line",
+        cascade="all, delete-orphan",
+    )
+
+    derived: Mapped[Optional["DerivedAnnotation"]] = relationship(
+        back_populates="line",
+        cascade="all, delete-orphan",
+    )
+
+
+class Annotation(Base):
+    """
+    Represents an annotator's vote on the category of a line.
+
+    Attributes:
+        id: Primary key
+        line_id: Foreign key to Line
+        line: The annotated line
+        email: Annotator (Label Studio user or LLM ensemble member)
+        category: Category voted for
+        date: When the vote was cast or last updated
+    """
+
+    __tablename__ = "annotation"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    email: Mapped[str] = mapped_column(nullable=False)
+    category: Mapped[str] = mapped_column(nullable=False)
+    date: Mapped[datetime.datetime] = mapped_column(nullable=False)
+
+    line: Mapped["Line"] = relationship(back_populates="annotations")
+    line_id: Mapped[int] = mapped_column(
+        ForeignKey("line.id"),
+        nullable=False,
+        index=True,
+    )
+
+
+class DerivedAnnotation(Base):
+    """
+    Represents the consensus category of a line (see annotator.consensus).
+
+    Attributes:
+        line_id: Foreign key to Line
+        line: The annotated line
+        category: Consensus category (UNKNOWN if there is no clear winner)
+    """
+
+    __tablename__ = "annotation_derived"
+
+    line_id: Mapped[int] = mapped_column(
+        ForeignKey("line.id"),
+        primary_key=True,
+    )
+    category: Mapped[str] = mapped_column(nullable=False, index=True)
+
+    line: Mapped["Line"] = relationship(back_populates="derived")
+
+
+# Tables the summaries (and the corpus) are derived from; every row written to
+# them bumps DataVersion.version (see Client.connect)
+VERSIONED_TABLES = ["line", "episode", "character", "episode_writer_link"]
+
+
+class DataVersion(Base):
+    """
+    Version of the source tables, maintained by triggers.
+
+    Attributes:
+        id: Primary key (a single row is kept)
+        epoch: Random id of the database, so a rebuilt database does not
+               reuse the versions of the previous one
+        version: Number of rows inserted, updated or deleted in the
+                 VERSIONED_TABLES
+    """
+
+    __tablename__ = "data_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    epoch: Mapped[str] = mapped_column(nullable=False)
+    version: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class SummaryMeta(Base):
+    """
+    Bookkeeping for the materialized summary tables.
+
+    Attributes:
+        id: Primary key (a single row is kept)
+        fingerprint: Fingerprint of the source tables when last built
+        built_at: When the summary tables were last built
+    """
+
+    __tablename__ = "summary_meta"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(nullable=False)
+    built_at: Mapped[datetime.datetime] = mapped_column(nullable=False)
+
+
+class CharacterSeasonSummary(Base):
+    """
+    Materialized number of lines per character per season.
+
+    Attributes:
+        character_id: Foreign key to Character
+        season_id: Foreign key to Season
+        lines: Number of lines spoken by the character in the season
+    """
+
+    __tablename__ = "summary_character_season"
+
+    character_id: Mapped[int] = mapped_column(
+        ForeignKey("character.id"),
+        primary_key=True,
+    )
+    season_id: Mapped[int] = mapped_column(
+        ForeignKey("season.id"),
+        primary_key=True,
+    )
+    lines: Mapped[int] = mapped_column(nullable=False)
+
+
+class CharacterSummary(Base):
+    """
+    Materialized line and episode counts per character.
+
+    Attributes:
+        character_id: Foreign key to Character
+        lines: Number of lines spoken by the character
+        episodes: Number of distinct episodes the character speaks in
+        type: Character type derived from episodes (e.g., "main", "side")
+    """
+
+    __tablename__ = "summary_character"
+
+    character_id: Mapped[int] = mapped_column(
+        ForeignKey("character.id"),
+        primary_key=True,
+    )
+    lines: Mapped[int] = mapped_column(nullable=False)
+    episodes: Mapped[int] = mapped_column(nullable=False)
+    type: Mapped[str] = mapped_column(nullable=False, index=True)
+
+
+class EpisodeSummary(Base):
+    """
+    Materialized number of lines per episode.
+
+    Attributes:
+        episode_id: Foreign key to Episode
+        lines: Number of lines in the episode
+    """
+
+    __tablename__ = "summary_episode"
+
+    episode_id: Mapped[int] = mapped_column(
+        ForeignKey("episode.id"),
+        primary_key=True,
+    )
+    lines: Mapped[int] = mapped_column(nullable=False)
+
+
+class WriterSummary(Base):
+    """
+    Materialized number of episodes per writer.
+
+    Attributes:
+        person_id: Foreign key to Person
+        episodes: Number of episodes written by the person
+    """
+
+    __tablename__ = "summary_writer"
+
+    person_id: Mapped[int] = mapped_column(
+        ForeignKey("person.id"),
+        primary_key=True,
+    )
+    episodes: Mapped[int] = mapped_column(nullable=False)
+
+
+class LineTokens(Base):
+    """
+    Cached preprocessed tokens of a line of dialogue.
+
+    Attributes:
+        line_id: Foreign key to Line
+        config: Hash of the preprocessing configuration and model version
+        text_hash: Hash of the dialogue the tokens were computed from
+        tokens: Space-separated preprocessed tokens
+    """
+
+    __tablename__ = "line_tokens"
+
+    line_id: Mapped[int] = mapped_column(
+        ForeignKey("line.id"),
+        primary_key=True,
+    )
+    config: Mapped[str] = mapped_column(primary_key=True)
+    text_hash: Mapped[str] = mapped_column(nullable=False)
+    tokens: Mapped[str] = mapped_column(nullable=False)
@@ -0,0 +1,121 @@
+"""
+Consistent, compacted snapshots of the database for download.
+
+The live database can be mid-write (e.g. during a reseed) and carries free
+pages. A snapshot is written with `VACUUM INTO`, which copies the database
+as of a single read transaction into a compacted file; it is made read-only,
+hashed, and only rebuilt once the source database changes.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from comp370.constants import DIR_DATA
+from comp370.downloads import record_digest
+from .constants import SQLITE_DATABASE
+
+# Where snapshots are written by default
+DIR_SNAPSHOT = DIR_DATA / "snapshot"
+
+
+class Snapshot:
+    """
+    Build and locate the snapshot of a database.
+
+    Attributes:
+        source: Path to the live database
+        dir: Directory the snapshot is written to
+    """
+
+    def __init__(
+        self,
+        source: Path = DIR_DATA / f"{SQLITE_DATABASE}.db",
+        dir: Path = DIR_SNAPSHOT,
+    ):
+        self.source = source
+        self.dir = dir
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        """Path of the snapshot file."""
+        return self.dir / self.source.name
+
+    @property
+    def meta(self) -> Path:
+        return self.dir / f"{self.source.name}.json"
+
+    def version(self) -> Optional[list[int]]:
+        """
+        Get the version of the source database (its and its WAL's mtime and
+        size), or None if it does not exist.
+        """
+        if not self.source.exists():
+            return None
+        version = []
+        for path in [self.source, self.source.with_name(self.source.name + "-wal")]:
+            if path.exists():
+                stat = path.stat()
+                version += [stat.st_mtime_ns, stat.st_size]
+        return version
+
+    def info(self) -> Optional[dict]:
+        """Get the metadata of the current snapshot, if any."""
+        if not self.meta.exists() or not self.path.exists():
+            return None
+        with open(self.meta) as f:
+            return json.load(f)
+
+    def is_stale(self) -> bool:
+        """Whether the snapshot is missing or older than the source database."""
+        info = self.info()
+        return info is None or info["source"] != self.version()
+
+    def build(self, force: bool = False) -> Optional[Path]:
+        """
+        Get the snapshot, rebuilding it first if the source database changed.
+
+        Args:
+            force: Rebuild the snapshot even if it is up to date
+
+        Returns:
+            Path to the snapshot, or None if there is no source database
+        """
+        with self._lock:
+            version = self.version()
+            if version is None:
+                return None
+            if not force and not self.is_stale():
+                return self.path
+
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            if tmp.exists():
+                tmp.unlink()
+
+            # The source is only read, so a reseed in progress is not disturbed
+            source = sqlite3.connect(f"file:{self.source}?mode=ro", uri=True)
+            try:
+                source.execute("VACUUM INTO ?", (str(tmp),))
+            finally:
+                source.close()
+            os.chmod(tmp, 0o444)
+
+            # Readers holding the previous snapshot open keep their copy
+            os.replace(tmp, self.path)
+            sha256 = record_digest(self.path)
+            with open(self.meta, "w") as f:
+                json.dump(
+                    {
+                        "source": version,
+                        "sha256": sha256,
+                        "size": self.path.stat().st_size,
+                    },
+                    f,
+                    indent=2,
+                )
+            return self.path
@@ -0,0 +1,128 @@
+from typing import Iterable
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from comp370.db.models import Annotation
+from comp370.db.models import DerivedAnnotation
+from comp370.db.models import Line
+from .line import LineTool
+from .tool import Tool
+
+# Number of line ids per IN (...) clause
+CHUNK = 5_000
+
+
+class AnnotationTool(Tool):
+    """Tool for loading annotations into the database and querying them."""
+
+    def load(self, annotations: pd.DataFrame) -> int:
+        """
+        Replace every annotator vote with the given ones.
+
+        Args:
+            annotations: DataFrame with season_number, episode_number,
+                         line_number, date, email and category columns
+                         (e.g. annotations.all.csv or AnnotationStore.read)
+
+        Returns:
+            Number of votes loaded (votes on unknown lines are left out)
+        """
+        df = self._lines(annotations.dropna(subset=["category"]))
+        dates = pd.to_datetime(df["date"], utc=True, format="ISO8601")
+        rows = [
+            {
+                "line_id": int(line_id),
+                "email": email,
+                "category": category,
+                "date": date.tz_convert(None).to_pydatetime(),
+            }
+            for line_id, email, category, date in zip(
+                df["line_id"], df["email"], df["category"], dates
+            )
+        ]
+
+        self.session.execute(delete(Annotation))
+        if rows:
+            self.session.execute(insert(Annotation), rows)
+        self.session.commit()
+        return len(rows)
+
+    def load_derived(self, derived: pd.DataFrame) -> int:
+        """
+        Replace every consensus category with the given ones.
+
+        Args:
+            derived: DataFrame with season_number, episode_number,
+                     line_number and category columns (e.g.
+                     annotations.derived.csv)
+
+        Returns:
+            Number of lines loaded (unknown lines are left out)
+        """
+        df = self._lines(derived.dropna(subset=["category"]))
+        df = df.drop_duplicates("line_id", keep="last")
+        rows = [
+            {"line_id": int(line_id), "category": category}
+            for line_id, category in zip(df["line_id"], df["category"])
+        ]
+
+        self.session.execute(delete(DerivedAnnotation))
+        if rows:
+            self.session.execute(insert(DerivedAnnotation), rows)
+        self.session.commit()
+        return len(rows)
+
+    def categories(self, line_ids: Iterable[int]) -> dict[int, str]:
+        """
+        Get the consensus category of lines in bulk.
+
+        Returns:
+            Category by line id (lines without one are left out)
+        """
+        ids = list(dict.fromkeys(int(id) for id in line_ids))
+        out = {}
+        for i in range(0, len(ids), CHUNK):
+            stmt = select(DerivedAnnotation.line_id, DerivedAnnotation.category).where(
+                DerivedAnnotation.line_id.in_(ids[i : i + CHUNK])
+            )
+            out.update(self.session.execute(stmt).all())
+        return out
+
+    def lines(
+        self, category: str, limit: Optional[int] = None, offset: int = 0
+    ) -> list[Line]:
+        """Get the lines of a consensus category, in id order."""
+        stmt = (
+            select(Line)
+            .join(DerivedAnnotation, DerivedAnnotation.line_id == Line.id)
+            .where(DerivedAnnotation.category == category)
+            .order_by(Line.id)
+            .offset(offset)
+            .limit(limit)
+        )
+        return list(self.session.scalars(stmt))
+
+    def counts(self) -> dict[str, int]:
+        """Number of lines per consensus category."""
+        stmt = select(DerivedAnnotation.category, func.count()).group_by(
+            DerivedAnnotation.category
+        )
+        return dict(self.session.execute(stmt).all())
+
+    def clear(self) -> None:
+        """Delete every loaded vote and consensus category."""
+        self.session.execute(delete(Annotation))
+        self.session.execute(delete(DerivedAnnotation))
+        self.session.commit()
+
+    def _lines(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add the line_id of every row, dropping rows of unknown lines."""
+        df = df.reset_index(drop=True)
+        lines = LineTool(self.session).lookup(df)
+        df = df.assign(line_id=lines["line_id"])
+        return df.dropna(subset=["line_id"])
@@ -1,94 +1,166 @@
-from enum import Enum
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
 from typing import Optional
+from typing import Union
 from sqlalchemy import func
 
 from comp370.db.models import Character
 from comp370.db.models import Episode
-from comp370.db.models import Line
+from .statistics import StatisticsTool
+from .summary import SummaryTool
 from .tool import Tool
+from .types import CharacterType
 
 
-THRESH_MAIN = 0.700
-THRESH_SIDE = 0.100
-THRESH_RECURRING = 0.005
-assert 0 < THRESH_RECURRING < THRESH_SIDE < THRESH_MAIN < 1
+@dataclass(frozen=True)
+class CharacterRow:
+    """Lightweight view of a character with its counts and type."""
 
+    id: int
+    name: str
+    lines: int
+    episodes: int
+    type: CharacterType
 
-class CharacterType(Enum):
-    MAIN = "main"
-    SIDE = "side"
-    RECURRING = "recurring"
-    GUEST = "guest"
 
-    @staticmethod
-    def classify(n: int, total: int) -> "CharacterType":
-        ratio = n / total if total > 0 else 0
-        if ratio >= THRESH_MAIN:
-            return CharacterType.MAIN
-        elif ratio >= THRESH_SIDE:
-            return CharacterType.SIDE
-        elif ratio >= THRESH_RECURRING:
-            return CharacterType.RECURRING
-        else:
-            return CharacterType.GUEST
+def slug(name: str) -> str:
+    """Get the slug of a character name (e.g. "Susan Ross" -> "susan_ross")."""
+    return name.replace(" ", "_").lower()
+
+
+# Latest classification and its (database URL, fingerprint), shared by all tools
+_CLASSIFICATION: Optional[tuple[tuple[str, str], Mapping[int, CharacterRow]]] = None
 
 
 class CharacterTool(Tool):
     """Tool for analyzing characters in the database."""
 
-    def get_character_types(self) -> dict[Character, CharacterType]:
-        """Get the type of each character based on their number of episode appearances."""
-        total_episodes = self.session.query(func.count(Episode.id)).scalar()
-        if total_episodes is None or total_episodes == 0:
-            return {}
-
-        results = (
-            self.session.query(
-                Character,
-                func.count(func.distinct(Line.episode_id)).label("episode_count"),
-            )
-            .outerjoin(Line, Character.id == Line.character_id)
-            .group_by(Character.id)
-            .all()
-        )
+    def classification(self) -> Mapping[int, CharacterRow]:
+        """
+        Get every character's counts and type, keyed by character id.
 
-        types = {
-            character: CharacterType.classify(n, total_episodes)
-            for character, n in results
+        The classification is computed once per database version (see
+        SummaryTool.fingerprint) and the latest one is cached for subsequent
+        calls. The returned mapping is shared, hence read-only.
+        """
+        global _CLASSIFICATION
+
+        key = (
+            str(self.session.get_bind().url),
+            SummaryTool(self.session).fingerprint(),
+        )
+        if _CLASSIFICATION is not None and _CLASSIFICATION[0] == key:
+            return _CLASSIFICATION[1]
+
+        total_episodes = self.session.query(func.count(Episode.id)).scalar() or 0
+        classification = {
+            row.character_id: CharacterRow(
+                id=row.character_id,
+                name=row.character_name,
+                lines=row.lines,
+                episodes=row.episodes,
+                type=CharacterType.classify(row.episodes, total_episodes),
+            )
+            for row in StatisticsTool(self.session).character_counts()
         }
 
-        return types
+        _CLASSIFICATION = (key, MappingProxyType(classification))
+        return _CLASSIFICATION[1]
+
+    def get_character_types(self) -> dict[Character, CharacterType]:
+        """Get the type of each character based on their number of episode appearances."""
+        classification = self.classification()
+        return {
+            character: classification[character.id].type
+            for character in self._entities(list(classification))
+        }
 
     def get_characters(
         self,
         type: Optional[CharacterType] = None,
-    ) -> list[Character]:
-        """Get all characters, optionally filtered by type."""
-        character_types = self.get_character_types()
-        if type is None:
-            return list(character_types.keys())
-
-        return [
-            character
-            for character, char_type in character_types.items()
-            if char_type == type
+        rows: bool = False,
+    ) -> Union[list[Character], list[CharacterRow]]:
+        """
+        Get all characters, optionally filtered by type.
+
+        Args:
+            type: Only return characters of this type
+            rows: Return CharacterRow views instead of ORM entities
+        """
+        selected = [
+            row
+            for row in self.classification().values()
+            if type is None or row.type == type
         ]
+        if rows:
+            return selected
+        return self._entities([row.id for row in selected])
+
+    def get_characters_by_type(
+        self,
+        rows: bool = False,
+    ) -> dict[CharacterType, Union[list[Character], list[CharacterRow]]]:
+        """
+        Get the characters of every type at once.
+
+        Args:
+            rows: Return CharacterRow views instead of ORM entities
+        """
+        classification = self.classification()
+        grouped: dict[CharacterType, list[CharacterRow]] = {
+            t: [] for t in CharacterType
+        }
+        for row in classification.values():
+            grouped[row.type].append(row)
+
+        if rows:
+            return grouped
+
+        entities = {
+            character.id: character
+            for character in self._entities(list(classification))
+        }
+        return {
+            type: [entities[row.id] for row in members]
+            for type, members in grouped.items()
+        }
 
     def sort_characters_by_lines(
         self,
-        characters: list[Character],
-    ) -> list[tuple[Character, int]]:
+        characters: Union[list[Character], list[CharacterRow]],
+    ) -> list[tuple[Union[Character, CharacterRow], int]]:
         """Sort characters by the number of lines they have."""
-        results = (
-            self.session.query(
-                Character,
-                func.count(Line.id).label("line_count"),
-            )
-            .outerjoin(Line, Character.id == Line.character_id)
-            .filter(Character.id.in_([c.id for c in characters]))
-            .group_by(Character.id)
-            .order_by(func.count(Line.id).desc())
-            .all()
-        )
+        classification = self.classification()
+        ranked = [
+            (character, classification[character.id].lines) for character in characters
+        ]
+        ranked.sort(key=lambda x: x[1], reverse=True)
+        return ranked
+
+    def ids_by_slug(self, slugs: list[str]) -> dict[str, int]:
+        """
+        Get the id of every character with one of the given slugs.
+
+        Args:
+            slugs: Character slugs (see slug)
+
+        Returns:
+            Character id by slug (unknown slugs are missing)
+        """
+        wanted = set(slugs)
+        return {
+            slug(row.name): row.id
+            for row in self.classification().values()
+            if slug(row.name) in wanted
+        }
 
-        return results
+    def _entities(self, ids: list[int]) -> list[Character]:
+        """Load ORM characters for the given ids, preserving their order."""
+        entities = {
+            character.id: character
+            for character in self.session.query(Character)
+            .filter(Character.id.in_(ids))
+            .all()
+        }
+        return [entities[id] for id in ids if id in entities]
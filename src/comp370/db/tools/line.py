@@ -0,0 +1,107 @@
+import pandas as pd
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+from sqlalchemy import and_
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from comp370.db.models import Character
+from comp370.db.models import Episode
+from comp370.db.models import Line
+from comp370.db.models import Season
+from .tool import Tool
+
+# Natural key of a line, as used in the annotation files
+KEYS = ["season_number", "episode_number", "line_number"]
+
+# Columns returned for each looked up line
+COLUMNS = [
+    "line_id",
+    "episode_id",
+    "character_id",
+    "character",
+    "dialogue",
+]
+
+_keys = Table(
+    "line_keys",
+    MetaData(),
+    Column("idx", Integer, primary_key=True),
+    Column("season_number", Integer, nullable=False),
+    Column("episode_number", Integer, nullable=False),
+    Column("line_number", Integer, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+class LineTool(Tool):
+    """Tool for looking up lines in bulk."""
+
+    def lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        """
+        Look up lines by (season, episode, line number) in a single query.
+
+        The keys are loaded into a temporary table and joined against the
+        line, episode, season and character tables.
+
+        Args:
+            keys: DataFrame with season_number, episode_number and
+                  line_number columns
+
+        Returns:
+            DataFrame with the same index as `keys` and COLUMNS; rows whose
+            key matches no line are NaN
+        """
+        records = [
+            {
+                "idx": i,
+                "season_number": int(s),
+                "episode_number": int(e),
+                "line_number": int(n),
+            }
+            for i, (s, e, n) in enumerate(keys[KEYS].itertuples(index=False))
+        ]
+
+        conn = self.session.connection()
+        _keys.create(conn, checkfirst=True)
+        try:
+            if records:
+                conn.execute(insert(_keys), records)
+
+            stmt = (
+                select(
+                    _keys.c.idx,
+                    Line.id.label("line_id"),
+                    Line.episode_id.label("episode_id"),
+                    Line.character_id.label("character_id"),
+                    Character.name.label("character"),
+                    Line.dialogue.label("dialogue"),
+                )
+                .select_from(_keys)
+                .join(Season, Season.number == _keys.c.season_number)
+                .join(
+                    Episode,
+                    and_(
+                        Episode.season_id == Season.id,
+                        Episode.number == _keys.c.episode_number,
+                    ),
+                )
+                .join(
+                    Line,
+                    and_(
+                        Line.episode_id == Episode.id,
+                        Line.number == _keys.c.line_number,
+                    ),
+                )
+                .join(Character, Character.id == Line.character_id)
+            )
+            rows = conn.execute(stmt).all()
+        finally:
+            _keys.drop(conn)
+
+        df = pd.DataFrame(rows, columns=["idx"] + COLUMNS)
+        df = df.drop_duplicates("idx").set_index("idx").reindex(range(len(keys)))
+        df.index = keys.index
+        return df
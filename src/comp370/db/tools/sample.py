@@ -0,0 +1,185 @@
+from typing import Iterable
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import select
+
+from comp370.db.models import Episode
+from comp370.db.models import Line
+from comp370.db.models import Season
+from .tool import Tool
+
+# Seed of the default random generator, so samples are reproducible
+SEED = 42
+
+# Lower bounds of the dialogue length buckets lines are stratified by
+LENGTH_BUCKETS = (0, 40, 80)
+
+# Columns lines are stratified by (within a character)
+STRATA = ("season", "bucket")
+
+# Columns of every sampled line
+COLUMNS = ["id", "season", "episode", "number", "dialogue"]
+
+# Number of line ids per IN (...) clause
+CHUNK = 5_000
+
+
+def allocate(sizes: Sequence[int], n: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Split a sample size across strata in proportion to their sizes.
+
+    Quotas are rounded down, and the remainder is handed out by systematic
+    sampling over the fractional parts: a stratum gets one more line with
+    probability equal to its fractional part. Every line is thus sampled
+    with probability n / total, even when n is smaller than the number of
+    strata, and quotas add up to n without exceeding their stratum.
+
+    Args:
+        sizes: Number of lines in every stratum
+        n: Sample size (every line is taken if it is larger than the total)
+        rng: Generator the remainder is handed out with
+
+    Returns:
+        Number of lines to sample from every stratum
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    total = int(sizes.sum())
+    if n >= total:
+        return sizes
+    exact = sizes * n / total
+    quotas = np.floor(exact).astype(np.int64)
+    remainder = n - int(quotas.sum())
+    if remainder > 0:
+        fractions = exact - quotas
+        strata = np.flatnonzero(fractions > 0)
+        edges = np.cumsum(fractions[strata])
+        edges[-1] = remainder
+        points = rng.random() + np.arange(remainder)
+        quotas[strata[np.searchsorted(edges, points, side="right")]] += 1
+    return quotas
+
+
+class SampleTool(Tool):
+    """Tool for sampling lines reproducibly without extracting them all."""
+
+    def index(
+        self,
+        character_ids: Iterable[int],
+        minimum_length: int = 0,
+        buckets: Sequence[int] = LENGTH_BUCKETS,
+    ) -> pd.DataFrame:
+        """
+        Get the stratum of every qualifying line of the given characters.
+
+        Only ids and stratum columns are selected (lengths are bucketed in
+        SQL), so the index stays small however many lines qualify.
+
+        Args:
+            character_ids: Characters whose lines are indexed
+            minimum_length: Minimum dialogue length of a line
+            buckets: Lower bounds of the length buckets, ascending
+
+        Returns:
+            DataFrame with id, character_id, season and bucket columns, in
+            id order
+        """
+        length = func.length(Line.dialogue)
+        bucket = case(
+            *[
+                (length >= bound, i)
+                for i, bound in reversed(list(enumerate(buckets)))
+                if i > 0
+            ],
+            else_=0,
+        )
+        ids = list(dict.fromkeys(int(id) for id in character_ids))
+
+        rows = []
+        for i in range(0, len(ids), CHUNK):
+            stmt = (
+                select(
+                    Line.id,
+                    Line.character_id,
+                    Season.number.label("season"),
+                    bucket.label("bucket"),
+                )
+                .join(Episode, Episode.id == Line.episode_id)
+                .join(Season, Season.id == Episode.season_id)
+                .where(Line.character_id.in_(ids[i : i + CHUNK]))
+                .where(length >= minimum_length)
+            )
+            rows.extend(self.session.execute(stmt).all())
+
+        df = pd.DataFrame(rows, columns=["id", "character_id", "season", "bucket"])
+        return df.sort_values("id", kind="stable").reset_index(drop=True)
+
+    def sample(
+        self,
+        character_ids: Iterable[int],
+        n: int,
+        seed: int = SEED,
+        minimum_length: int = 0,
+        strata: Sequence[str] = STRATA,
+        buckets: Sequence[int] = LENGTH_BUCKETS,
+    ) -> dict[int, pd.DataFrame]:
+        """
+        Sample lines of every character, stratified by season and length.
+
+        Every character's sample is drawn from its own generator, seeded with
+        (seed, character id), so it does not depend on which other characters
+        are sampled. Only the sampled lines are read from the database.
+
+        Args:
+            character_ids: Characters to sample lines of
+            n: Number of lines per character (all of them, shuffled, if the
+               character has fewer)
+            seed: Seed of the random generators
+            minimum_length: Minimum dialogue length of a line
+            strata: Index columns lines are stratified by within a character
+            buckets: Lower bounds of the length buckets, ascending
+
+        Returns:
+            Sampled lines (see COLUMNS) in random order, by character id;
+            characters without qualifying lines get an empty DataFrame
+        """
+        character_ids = list(dict.fromkeys(int(id) for id in character_ids))
+        index = self.index(character_ids, minimum_length, buckets)
+
+        sampled = {}
+        for character_id, df in index.groupby("character_id"):
+            rng = np.random.default_rng([seed, int(character_id)])
+            df = df.assign(key=rng.random(len(df)))
+            groups = df.groupby(list(strata), sort=True) if strata else [(None, df)]
+            groups = [group.sort_values("key") for _, group in groups]
+            quotas = allocate([len(group) for group in groups], n, rng)
+            picked = pd.concat([group.head(int(q)) for group, q in zip(groups, quotas)])
+            sampled[int(character_id)] = picked.sort_values("key")["id"].tolist()
+
+        lines = self._lines([id for ids in sampled.values() for id in ids])
+        return {
+            character_id: lines.loc[sampled.get(character_id, [])].reset_index()
+            for character_id in character_ids
+        }
+
+    def _lines(self, ids: list[int]) -> pd.DataFrame:
+        """Get the columns of the given lines, indexed by id."""
+        rows = []
+        for i in range(0, len(ids), CHUNK):
+            stmt = (
+                select(
+                    Line.id,
+                    Season.number.label("season"),
+                    Episode.number.label("episode"),
+                    Line.number,
+                    Line.dialogue,
+                )
+                .join(Episode, Episode.id == Line.episode_id)
+                .join(Season, Season.id == Episode.season_id)
+                .where(Line.id.in_(ids[i : i + CHUNK]))
+            )
+            rows.extend(self.session.execute(stmt).all())
+        return pd.DataFrame(rows, columns=COLUMNS).set_index("id")
@@ -0,0 +1,289 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy import join
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from comp370.db.models import Character
+from comp370.db.models import CharacterSeasonSummary
+from comp370.db.models import CharacterSummary
+from comp370.db.models import Episode
+from comp370.db.models import EpisodeSummary
+from comp370.db.models import Line
+from comp370.db.models import Person
+from comp370.db.models import Season
+from comp370.db.models import WriterSummary
+from comp370.db.models import episode_writer_link
+from .summary import SummaryTool
+from .tool import Tool
+
+
+class LineGroup(Enum):
+    CHARACTER = "character"
+    SEASON = "season"
+    EPISODE = "episode"
+
+
+@dataclass
+class LineFilter:
+    """Restrict which lines are counted."""
+
+    character_ids: Optional[list[int]] = None
+    character_names: Optional[list[str]] = None
+    seasons: Optional[list[int]] = None
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+
+
+@dataclass
+class LineCount:
+    """Number of lines in a group. Fields not grouped by are None."""
+
+    count: int
+    character_id: Optional[int] = None
+    character_name: Optional[str] = None
+    season: Optional[int] = None
+    episode_id: Optional[int] = None
+    episode: Optional[int] = None
+    episode_title: Optional[str] = None
+
+
+@dataclass
+class CharacterCount:
+    """Number of lines and distinct episodes with lines for a character."""
+
+    character_id: int
+    character_name: str
+    lines: int
+    episodes: int
+
+
+@dataclass
+class WriterCount:
+    """Number of episodes written by a person."""
+
+    person_id: int
+    name: str
+    episodes: int
+
+
+class StatisticsTool(Tool):
+    """
+    Tool for computing aggregate statistics in single GROUP BY statements.
+
+    When `materialized` is set and the summary tables are up to date, counts
+    are read from them instead of being aggregated over the line table.
+    """
+
+    def __init__(self, session: Session, materialized: bool = True):
+        super().__init__(session)
+        self.materialized = materialized
+        self._fresh: Optional[bool] = None
+
+    def fresh(self) -> bool:
+        """Whether the summary tables can be used for this tool's queries."""
+        if not self.materialized:
+            return False
+        if self._fresh is None:
+            self._fresh = not SummaryTool(self.session).is_stale()
+        return self._fresh
+
+    def line_counts(
+        self,
+        group_by: list[LineGroup],
+        filter: Optional[LineFilter] = None,
+    ) -> list[LineCount]:
+        """Count lines grouped by any combination of character, season and episode."""
+        stmt = self._summary_line_counts(group_by, filter or LineFilter())
+        if stmt is None:
+            stmt = self._line_counts(group_by, filter)
+
+        return [LineCount(**row._asdict()) for row in self.session.execute(stmt)]
+
+    def _line_counts(self, group_by: list[LineGroup], filter: Optional[LineFilter]):
+        columns = []
+        if LineGroup.CHARACTER in group_by:
+            columns += [
+                Character.id.label("character_id"),
+                Character.name.label("character_name"),
+            ]
+        if LineGroup.SEASON in group_by or LineGroup.EPISODE in group_by:
+            columns += [Season.number.label("season")]
+        if LineGroup.EPISODE in group_by:
+            columns += [
+                Episode.id.label("episode_id"),
+                Episode.number.label("episode"),
+                Episode.title.label("episode_title"),
+            ]
+
+        stmt = (
+            select(*columns, func.count(Line.id).label("count"))
+            .select_from(Line)
+            .join(Character, Character.id == Line.character_id)
+            .join(Episode, Episode.id == Line.episode_id)
+            .join(Season, Season.id == Episode.season_id)
+        )
+        stmt = self._filter(stmt, filter)
+        if columns:
+            stmt = stmt.group_by(*columns).order_by(*columns)
+        return stmt
+
+    def _summary_line_counts(self, group_by: list[LineGroup], filter: LineFilter):
+        """Build the same statement over the summary tables, if they can answer it."""
+        if filter.min_length is not None or filter.max_length is not None:
+            return None
+        if not self.fresh():
+            return None
+
+        if LineGroup.EPISODE not in group_by:
+            columns = []
+            if LineGroup.CHARACTER in group_by:
+                columns += [
+                    Character.id.label("character_id"),
+                    Character.name.label("character_name"),
+                ]
+            if LineGroup.SEASON in group_by:
+                columns += [Season.number.label("season")]
+
+            stmt = (
+                select(
+                    *columns,
+                    func.coalesce(func.sum(CharacterSeasonSummary.lines), 0).label(
+                        "count"
+                    ),
+                )
+                .select_from(CharacterSeasonSummary)
+                .join(Character, Character.id == CharacterSeasonSummary.character_id)
+                .join(Season, Season.id == CharacterSeasonSummary.season_id)
+            )
+        elif LineGroup.CHARACTER not in group_by and (
+            filter.character_ids is None and filter.character_names is None
+        ):
+            columns = [
+                Season.number.label("season"),
+                Episode.id.label("episode_id"),
+                Episode.number.label("episode"),
+                Episode.title.label("episode_title"),
+            ]
+            stmt = (
+                select(
+                    *columns,
+                    func.coalesce(func.sum(EpisodeSummary.lines), 0).label("count"),
+                )
+                .select_from(EpisodeSummary)
+                .join(Episode, Episode.id == EpisodeSummary.episode_id)
+                .join(Season, Season.id == Episode.season_id)
+            )
+        else:
+            return None
+
+        stmt = self._filter(stmt, filter)
+        if columns:
+            stmt = stmt.group_by(*columns).order_by(*columns)
+        return stmt
+
+    def character_counts(
+        self,
+        filter: Optional[LineFilter] = None,
+    ) -> list[CharacterCount]:
+        """
+        Count lines and distinct episodes for every character.
+
+        Characters without a line matching the filter are counted with 0
+        lines and episodes.
+        """
+        if filter is None and self.fresh():
+            stmt = (
+                select(
+                    Character.id.label("character_id"),
+                    Character.name.label("character_name"),
+                    CharacterSummary.lines.label("lines"),
+                    CharacterSummary.episodes.label("episodes"),
+                )
+                .join(CharacterSummary, CharacterSummary.character_id == Character.id)
+                .order_by(Character.id)
+            )
+            return [
+                CharacterCount(**row._asdict()) for row in self.session.execute(stmt)
+            ]
+
+        stmt = (
+            select(
+                Character.id.label("character_id"),
+                Character.name.label("character_name"),
+                func.count(Line.id).label("lines"),
+                func.count(func.distinct(Line.episode_id)).label("episodes"),
+            )
+            .select_from(Character)
+            .outerjoin(
+                join(Line, Episode, Episode.id == Line.episode_id).join(
+                    Season, Season.id == Episode.season_id
+                ),
+                # Line filters restrict the joined lines, not the characters
+                and_(Line.character_id == Character.id, *self._line_conditions(filter)),
+            )
+            .where(*self._character_conditions(filter))
+            .group_by(Character.id)
+            .order_by(Character.id)
+        )
+
+        return [CharacterCount(**row._asdict()) for row in self.session.execute(stmt)]
+
+    def writer_counts(self) -> list[WriterCount]:
+        """Count the episodes written by each writer."""
+        if self.fresh():
+            stmt = (
+                select(
+                    Person.id.label("person_id"),
+                    Person.name.label("name"),
+                    WriterSummary.episodes.label("episodes"),
+                )
+                .join(WriterSummary, WriterSummary.person_id == Person.id)
+                .order_by(WriterSummary.episodes.desc(), Person.id)
+            )
+            return [WriterCount(**row._asdict()) for row in self.session.execute(stmt)]
+
+        stmt = (
+            select(
+                Person.id.label("person_id"),
+                Person.name.label("name"),
+                func.count(episode_writer_link.c.episode_id).label("episodes"),
+            )
+            .join(episode_writer_link, episode_writer_link.c.writer_id == Person.id)
+            .group_by(Person.id)
+            .order_by(func.count(episode_writer_link.c.episode_id).desc(), Person.id)
+        )
+
+        return [WriterCount(**row._asdict()) for row in self.session.execute(stmt)]
+
+    def _filter(self, stmt, filter: Optional[LineFilter]):
+        return stmt.where(
+            *self._character_conditions(filter), *self._line_conditions(filter)
+        )
+
+    def _character_conditions(self, filter: Optional[LineFilter]) -> list:
+        """Conditions of the filter on the characters."""
+        conditions = []
+        if filter is None:
+            return conditions
+        if filter.character_ids is not None:
+            conditions.append(Character.id.in_(filter.character_ids))
+        if filter.character_names is not None:
+            conditions.append(Character.name.in_(filter.character_names))
+        return conditions
+
+    def _line_conditions(self, filter: Optional[LineFilter]) -> list:
+        """Conditions of the filter on the lines (and their seasons)."""
+        conditions = []
+        if filter is None:
+            return conditions
+        if filter.seasons is not None:
+            conditions.append(Season.number.in_(filter.seasons))
+        if filter.min_length is not None:
+            conditions.append(func.length(Line.dialogue) >= filter.min_length)
+        if filter.max_length is not None:
+            conditions.append(func.length(Line.dialogue) <= filter.max_length)
+        return conditions
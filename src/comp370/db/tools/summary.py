@@ -0,0 +1,133 @@
+import datetime
+from collections import defaultdict
+from typing import Optional
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from comp370.db.models import Character
+from comp370.db.models import CharacterSeasonSummary
+from comp370.db.models import CharacterSummary
+from comp370.db.models import DataVersion
+from comp370.db.models import Episode
+from comp370.db.models import EpisodeSummary
+from comp370.db.models import Line
+from comp370.db.models import SummaryMeta
+from comp370.db.models import WriterSummary
+from comp370.db.models import episode_writer_link
+from .tool import Tool
+from .types import CharacterType
+
+
+class SummaryTool(Tool):
+    """Tool for building and checking the materialized summary tables."""
+
+    def fingerprint(self) -> str:
+        """
+        Fingerprint the source tables the summaries are derived from.
+
+        The fingerprint is the version kept by triggers on those tables (see
+        DataVersion), so any insert, update or delete changes it, at the cost
+        of reading a single row. Pending ORM changes are not flushed.
+        """
+        with self.session.no_autoflush:
+            epoch, version = self.session.execute(
+                select(DataVersion.epoch, DataVersion.version).where(
+                    DataVersion.id == 1
+                )
+            ).one()
+        return f"{epoch}:{version}"
+
+    def built_at(self) -> Optional[datetime.datetime]:
+        """When the summaries were last built, or None if never."""
+        meta = self.session.get(SummaryMeta, 1)
+        return meta.built_at if meta is not None else None
+
+    def is_stale(self) -> bool:
+        """Whether the summaries are missing or out of date."""
+        meta = self.session.get(SummaryMeta, 1)
+        return meta is None or meta.fingerprint != self.fingerprint()
+
+    def refresh(self) -> None:
+        """
+        Rebuild all summary tables.
+
+        Lines are scanned once, grouped by (character, episode); every other
+        summary is derived from that result and the (small) episode table.
+        """
+        season_of = dict(
+            self.session.execute(select(Episode.id, Episode.season_id)).all()
+        )
+        total_episodes = len(season_of)
+
+        by_season = defaultdict(int)
+        by_episode = defaultdict(int)
+        lines = defaultdict(int)
+        episodes = defaultdict(int)
+
+        stmt = select(Line.character_id, Line.episode_id, func.count(Line.id)).group_by(
+            Line.character_id, Line.episode_id
+        )
+        for character_id, episode_id, n in self.session.execute(stmt):
+            by_season[(character_id, season_of[episode_id])] += n
+            by_episode[episode_id] += n
+            lines[character_id] += n
+            episodes[character_id] += 1
+
+        characters = self.session.execute(select(Character.id)).scalars().all()
+        writers = self.session.execute(
+            select(
+                episode_writer_link.c.writer_id,
+                func.count(episode_writer_link.c.episode_id),
+            ).group_by(episode_writer_link.c.writer_id)
+        ).all()
+
+        for model in [
+            CharacterSeasonSummary,
+            CharacterSummary,
+            EpisodeSummary,
+            WriterSummary,
+            SummaryMeta,
+        ]:
+            self.session.execute(delete(model))
+
+        self._insert(
+            CharacterSeasonSummary,
+            [
+                {"character_id": c, "season_id": s, "lines": n}
+                for (c, s), n in by_season.items()
+            ],
+        )
+        self._insert(
+            CharacterSummary,
+            [
+                {
+                    "character_id": c,
+                    "lines": lines[c],
+                    "episodes": episodes[c],
+                    "type": CharacterType.classify(episodes[c], total_episodes).value,
+                }
+                for c in characters
+            ],
+        )
+        self._insert(
+            EpisodeSummary,
+            [{"episode_id": e, "lines": n} for e, n in by_episode.items()],
+        )
+        self._insert(
+            WriterSummary,
+            [{"person_id": p, "episodes": n} for p, n in writers],
+        )
+        self.session.add(
+            SummaryMeta(
+                id=1,
+                fingerprint=self.fingerprint(),
+                built_at=datetime.datetime.now(),
+            )
+        )
+        self.session.commit()
+
+    def _insert(self, model, rows: list[dict]) -> None:
+        if rows:
+            self.session.execute(insert(model), rows)
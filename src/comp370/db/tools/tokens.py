@@ -0,0 +1,114 @@
+import hashlib
+from typing import Optional
+from typing import Protocol
+
+import pandas as pd
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from comp370.db.models import LineTokens
+from .tool import Tool
+
+# Number of line ids per IN (...) clause
+CHUNK = 5_000
+
+
+class Tokenizer(Protocol):
+    """Anything that preprocesses text, e.g. comp370.nlp.Preprocessor."""
+
+    def fingerprint(self) -> str: ...
+
+    def tokens(self, texts: list[str]) -> list[str]: ...
+
+
+def text_hash(text: str) -> str:
+    """Hash of a line's dialogue, to detect edited lines."""
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class TokenTool(Tool):
+    """Tool for caching preprocessed tokens of lines in the database."""
+
+    def tokens(self, lines: pd.DataFrame, tokenizer: Tokenizer) -> pd.Series:
+        """
+        Get the preprocessed tokens of lines, reusing cached tokens.
+
+        Only lines that are not cached for the tokenizer's configuration, or
+        whose dialogue changed since they were cached, are preprocessed; their
+        tokens are then written back to the cache.
+
+        Args:
+            lines: DataFrame with line_id and dialogue columns (e.g., the
+                   output of LineTool.lookup); rows without a line_id get
+                   empty tokens and are not cached
+            tokenizer: Preprocessor producing the tokens
+
+        Returns:
+            Tokens per line, with the same index as `lines`
+        """
+        config = tokenizer.fingerprint()
+        known = lines.dropna(subset=["line_id"])
+        known = known.drop_duplicates("line_id")
+        ids = known["line_id"].astype(int).tolist()
+        hashes = [text_hash(text) for text in known["dialogue"]]
+
+        cached = self._cached(ids, config)
+        missing = [
+            (id, text, h)
+            for id, text, h in zip(ids, known["dialogue"], hashes)
+            if cached.get(id, (None,))[0] != h
+        ]
+
+        out = {id: tokens for id, (_, tokens) in cached.items()}
+        if missing:
+            computed = tokenizer.tokens([text for _, text, _ in missing])
+            self._store(config, missing, computed)
+            out.update((id, tokens) for (id, _, _), tokens in zip(missing, computed))
+
+        return lines["line_id"].map(out).fillna("").rename("tokens")
+
+    def clear(self, config: Optional[str] = None) -> None:
+        """Delete cached tokens, for a single configuration or all of them."""
+        stmt = delete(LineTokens)
+        if config is not None:
+            stmt = stmt.where(LineTokens.config == config)
+        self.session.execute(stmt)
+        self.session.commit()
+
+    def _cached(self, ids: list[int], config: str) -> dict[int, tuple[str, str]]:
+        """Get (text hash, tokens) of cached lines, keyed by line id."""
+        cached = {}
+        for i in range(0, len(ids), CHUNK):
+            stmt = select(
+                LineTokens.line_id, LineTokens.text_hash, LineTokens.tokens
+            ).where(
+                LineTokens.config == config,
+                LineTokens.line_id.in_(ids[i : i + CHUNK]),
+            )
+            for id, h, tokens in self.session.execute(stmt):
+                cached[id] = (h, tokens)
+        return cached
+
+    def _store(
+        self,
+        config: str,
+        lines: list[tuple[int, str, str]],
+        tokens: list[str],
+    ) -> None:
+        ids = [id for id, _, _ in lines]
+        for i in range(0, len(ids), CHUNK):
+            self.session.execute(
+                delete(LineTokens).where(
+                    LineTokens.config == config,
+                    LineTokens.line_id.in_(ids[i : i + CHUNK]),
+                )
+            )
+        self.session.execute(
+            insert(LineTokens),
+            [
+                {"line_id": id, "config": config, "text_hash": h, "tokens": t}
+                for (id, _, h), t in zip(lines, tokens)
+            ],
+        )
+        self.session.commit()
@@ -0,0 +1,26 @@
+from enum import Enum
+
+
+THRESH_MAIN = 0.700
+THRESH_SIDE = 0.100
+THRESH_RECURRING = 0.005
+assert 0 < THRESH_RECURRING < THRESH_SIDE < THRESH_MAIN < 1
+
+
+class CharacterType(Enum):
+    MAIN = "main"
+    SIDE = "side"
+    RECURRING = "recurring"
+    GUEST = "guest"
+
+    @staticmethod
+    def classify(n: int, total: int) -> "CharacterType":
+        ratio = n / total if total > 0 else 0
+        if ratio >= THRESH_MAIN:
+            return CharacterType.MAIN
+        elif ratio >= THRESH_SIDE:
+            return CharacterType.SIDE
+        elif ratio >= THRESH_RECURRING:
+            return CharacterType.RECURRING
+        else:
+            return CharacterType.GUEST
@@ -0,0 +1,208 @@
+"""
+File downloads with content-hash ETags and precompressed variants.
+
+Files offered for download can be precompressed at build time into `.gz`
+(and `.zst`, if the zstandard package is installed) siblings, with their
+SHA-256 recorded in a `.sha256` sidecar. Requests are answered with the
+smallest variant the client accepts, a strong ETag per variant, 304 Not
+Modified for matching If-None-Match headers, and byte ranges (handled by
+Starlette's FileResponse) for resumable downloads. Files without an up to date
+sidecar are hashed in the threadpool, off the event loop.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse
+from starlette.responses import Response
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Content codings in order of preference, with the suffix of their sibling
+ENCODINGS = {"zstd": ".zst", "gzip": ".gz"}
+
+# Bytes read at a time when hashing or compressing
+CHUNK = 1 << 20
+
+# Digests of files hashed at request time, keyed by (path, mtime, size)
+_DIGESTS: dict[tuple[str, int, int], str] = {}
+
+
+def precompress(path: Path, level: int = 9) -> list[Path]:
+    """
+    Write the compressed siblings and hash sidecar of a file.
+
+    Siblings that are already up to date are left alone.
+
+    Args:
+        path: File to precompress
+        level: Compression level
+
+    Returns:
+        The siblings that were written
+    """
+    written = []
+    for encoding, suffix in ENCODINGS.items():
+        sibling = _sibling(path, suffix)
+        if encoding == "zstd" and zstandard is None:
+            continue
+        if _fresh(path, sibling):
+            continue
+
+        tmp = sibling.with_name(sibling.name + ".tmp")
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            if encoding == "gzip":
+                with gzip.GzipFile(
+                    fileobj=dst, mode="wb", compresslevel=level, mtime=0
+                ) as out:
+                    shutil.copyfileobj(src, out, CHUNK)
+            else:
+                zstandard.ZstdCompressor(level=level).copy_stream(src, dst)
+        os.replace(tmp, sibling)
+        written.append(sibling)
+
+    if _read_sidecar(path) is None:
+        record_digest(path)
+        written.append(_sibling(path, ".sha256"))
+
+    return written
+
+
+def record_digest(path: Path) -> str:
+    """
+    Hash a file and record the hash in its sidecar.
+
+    Returns:
+        The SHA-256 of the file
+    """
+    stat = path.stat()
+    tag = _hash(path)
+    _sibling(path, ".sha256").write_text(f"{tag} {stat.st_mtime_ns} {stat.st_size}\n")
+    return tag
+
+
+def digest(path: Path) -> str:
+    """
+    Get the SHA-256 of a file, from its sidecar if up to date.
+
+    Otherwise the file is hashed, once per version of the file.
+    """
+    recorded = _read_sidecar(path)
+    if recorded is not None:
+        return recorded
+
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _DIGESTS:
+        _DIGESTS[key] = _hash(path)
+    return _DIGESTS[key]
+
+
+async def download(
+    request: Request,
+    path: Path,
+    filename: str,
+    media_type: str = "application/octet-stream",
+) -> Response:
+    """
+    Serve a file for download.
+
+    Args:
+        request: The request, whose Accept-Encoding, If-None-Match and Range
+                 headers are honoured
+        path: File to serve
+        filename: Name the file is saved as
+        media_type: Media type of the (uncompressed) file
+    """
+    if not path.exists():
+        return Response("Not Found", status_code=404)
+
+    encoding, file = _variant(request, path)
+    tag = await run_in_threadpool(digest, path)
+    etag = f'"{tag}-{ENCODINGS[encoding][1:]}"' if encoding else f'"{tag}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(file, media_type=media_type, filename=filename, headers=headers)
+
+
+def _variant(request: Request, path: Path) -> tuple[Optional[str], Path]:
+    """Pick the preferred up-to-date variant of a file the client accepts."""
+    accepted = _accepted(request.headers.get("accept-encoding", ""))
+    for encoding, suffix in ENCODINGS.items():
+        sibling = _sibling(path, suffix)
+        if encoding in accepted and _fresh(path, sibling):
+            return encoding, sibling
+    return None, path
+
+
+def _accepted(header: str) -> set[str]:
+    """Parse the codings of an Accept-Encoding header, without q=0 ones."""
+    accepted = set()
+    for part in header.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _sibling(path: Path, suffix: str) -> Path:
+    return path.with_name(path.name + suffix)
+
+
+def _fresh(path: Path, sibling: Path) -> bool:
+    """Whether a sibling was written after the last change to its file."""
+    return sibling.exists() and sibling.stat().st_mtime_ns >= path.stat().st_mtime_ns
+
+
+def _read_sidecar(path: Path) -> Optional[str]:
+    """Get the hash recorded for the current version of a file, if any."""
+    sidecar = _sibling(path, ".sha256")
+    if not sidecar.exists():
+        return None
+    try:
+        tag, mtime, size = sidecar.read_text().split()
+    except ValueError:
+        return None
+
+    stat = path.stat()
+    if int(mtime) != stat.st_mtime_ns or int(size) != stat.st_size:
+        return None
+    return tag
+
+
+def _hash(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            sha.update(chunk)
+    return sha.hexdigest()
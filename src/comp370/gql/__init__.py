@@ -5,7 +5,17 @@ This module provides a Graphene-based GraphQL schema for querying
 seasons, episodes, writers, characters, and dialogue lines.
 """
 
-from .schema import schema, SeasonType, EpisodeType, PersonType, CharacterType, LineType
+from .schema import (
+    schema,
+    SeasonType,
+    EpisodeType,
+    PersonType,
+    CharacterType,
+    LineType,
+    AnnotationType,
+)
+from .cost import Cardinalities, CostAnalyzer, QueryCost
+from .app import GraphQLApp
 
 __all__ = [
     "schema",
@@ -14,4 +24,9 @@ __all__ = [
     "PersonType",
     "CharacterType",
     "LineType",
+    "AnnotationType",
+    "Cardinalities",
+    "CostAnalyzer",
+    "QueryCost",
+    "GraphQLApp",
 ]
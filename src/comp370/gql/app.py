@@ -0,0 +1,185 @@
+"""
+Starlette application for serving the GraphQL schema with cost limits.
+
+Every operation is scored by the CostAnalyzer before execution, from the
+execution context shared by HTTP and WebSocket queries. Operations above the
+cost or depth budget are rejected without touching the database, and the
+computed cost is reported in the `extensions` of every HTTP response.
+"""
+
+import json
+import logging
+from contextvars import ContextVar
+from typing import Any
+from typing import Optional
+
+from graphql import ExecutionContext
+from graphql import GraphQLError
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette_graphene3 import GraphQLApp as BaseGraphQLApp
+
+from .cost import Cardinalities
+from .cost import CostAnalyzer
+from .cost import QueryCost
+from .constants import MAX_QUERY_COST
+from .constants import MAX_QUERY_DEPTH
+
+# Cost extensions of the operation being executed, for the HTTP response
+_EXTENSIONS: ContextVar[Optional[dict[str, Any]]] = ContextVar(
+    "extensions", default=None
+)
+
+
+class CostExecutionContext(ExecutionContext):
+    """
+    Execution context that scores operations before executing them.
+
+    The budget is set on subclasses (see GraphQLApp), since graphql-core
+    builds execution contexts from their class.
+
+    Attributes:
+        analyzer: CostAnalyzer used to score operations
+        max_cost: Maximum estimated number of objects per operation
+        max_depth: Maximum nesting depth of object fields per operation
+        cost: Estimated cost of the operation being executed
+    """
+
+    analyzer: CostAnalyzer
+    max_cost: int = MAX_QUERY_COST
+    max_depth: int = MAX_QUERY_DEPTH
+    cost: QueryCost
+
+    @classmethod
+    def build(
+        cls,
+        schema,
+        document,
+        root_value=None,
+        context_value=None,
+        raw_variable_values=None,
+        operation_name=None,
+        *args,
+        **kwargs,
+    ):
+        """Build the context once variables are coerced, unless over budget."""
+        context = super().build(
+            schema,
+            document,
+            root_value,
+            context_value,
+            raw_variable_values,
+            operation_name,
+            *args,
+            **kwargs,
+        )
+        if isinstance(context, list):
+            return context
+
+        try:
+            cost = cls.analyzer.estimate(
+                document, context.variable_values, operation_name
+            )
+        except GraphQLError as e:
+            return [e]
+
+        _EXTENSIONS.set(cls.extensions(cost))
+        error = cls.check(cost)
+        if error is not None:
+            return [error]
+
+        context.cost = cost
+        return context
+
+    @classmethod
+    def extensions(cls, cost: QueryCost) -> dict[str, Any]:
+        """Cost extensions reported with a response."""
+        return {
+            "cost": {
+                **cost.to_dict(),
+                "maxCost": cls.max_cost,
+                "maxDepth": cls.max_depth,
+            }
+        }
+
+    @classmethod
+    def check(cls, cost: QueryCost) -> Optional[GraphQLError]:
+        """Get the error rejecting an operation of the given cost, if any."""
+        if cost.depth > cls.max_depth:
+            return GraphQLError(
+                f"Query depth {cost.depth} exceeds the maximum of {cls.max_depth}.",
+                extensions=cls.extensions(cost),
+            )
+        if cost.cost > cls.max_cost:
+            return GraphQLError(
+                f"Query cost {cost.cost} exceeds the maximum of {cls.max_cost}. "
+                "Use `first` to limit connections.",
+                extensions=cls.extensions(cost),
+            )
+        return None
+
+    def build_response(self, data, errors):
+        result = super().build_response(data, errors)
+        result.extensions = self.extensions(self.cost)
+        return result
+
+
+class GraphQLApp(BaseGraphQLApp):
+    """
+    GraphQL ASGI app that rejects queries above a cost budget.
+
+    Attributes:
+        analyzer: CostAnalyzer used to score incoming queries
+        max_cost: Maximum estimated number of objects per query
+        max_depth: Maximum nesting depth of object fields per query
+    """
+
+    def __init__(
+        self,
+        schema,
+        *,
+        cardinalities: Cardinalities,
+        max_cost: int = MAX_QUERY_COST,
+        max_depth: int = MAX_QUERY_DEPTH,
+        **kwargs,
+    ):
+        self.analyzer = CostAnalyzer(schema.graphql_schema, cardinalities)
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+
+        base = kwargs.pop("execution_context_class", None) or ExecutionContext
+        context_class = type(
+            "CostExecutionContext",
+            (CostExecutionContext, base),
+            {
+                "analyzer": self.analyzer,
+                "max_cost": max_cost,
+                "max_depth": max_depth,
+            },
+        )
+        super().__init__(schema, execution_context_class=context_class, **kwargs)
+        if not any(isinstance(f, _ExpectedErrors) for f in self.logger.filters):
+            self.logger.addFilter(_ExpectedErrors())
+
+    async def _handle_http_request(self, request: Request) -> JSONResponse:
+        token = _EXTENSIONS.set(None)
+        try:
+            response = await super()._handle_http_request(request)
+            extensions = _EXTENSIONS.get()
+        finally:
+            _EXTENSIONS.reset(token)
+
+        # Rejected operations report their cost too
+        if extensions is None or response.status_code != 200:
+            return response
+        content = json.loads(response.body)
+        content["extensions"] = extensions
+        return JSONResponse(content, background=response.background)
+
+
+class _ExpectedErrors(logging.Filter):
+    """Leave out errors raised on purpose by resolvers (e.g. invalid arguments)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        error = record.exc_info[1] if record.exc_info else None
+        return not isinstance(error, GraphQLError)
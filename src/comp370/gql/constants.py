@@ -0,0 +1,12 @@
+"""Constants for GraphQL query limits."""
+
+import os
+
+# Maximum estimated number of objects a single query may resolve
+MAX_QUERY_COST = int(os.environ.get("GQL_MAX_QUERY_COST", 50_000))
+
+# Maximum nesting depth of object fields (connection wrappers not counted)
+MAX_QUERY_DEPTH = int(os.environ.get("GQL_MAX_QUERY_DEPTH", 10))
+
+# Maximum number of lines returned by categoryLines per page
+MAX_CATEGORY_LINES = int(os.environ.get("GQL_MAX_CATEGORY_LINES", 1_000))
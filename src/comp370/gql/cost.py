@@ -0,0 +1,334 @@
+"""
+Static cost analysis for GraphQL queries.
+
+This module scores a parsed query before it is executed by walking its
+selection set and estimating how many objects each field resolves, using
+`first`/`last`/`n` arguments where given and table cardinalities otherwise.
+"""
+
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import Optional
+
+from graphql import DocumentNode
+from graphql import FieldNode
+from graphql import FragmentDefinitionNode
+from graphql import FragmentSpreadNode
+from graphql import GraphQLError
+from graphql import GraphQLField
+from graphql import GraphQLList
+from graphql import GraphQLObjectType
+from graphql import GraphQLSchema
+from graphql import InlineFragmentNode
+from graphql import SelectionSetNode
+from graphql import get_named_type
+from graphql import get_nullable_type
+from graphql.execution.values import get_argument_values
+from graphql.utilities import get_operation_ast
+from graphene.utils.str_converters import to_camel_case
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import RelationshipDirection
+
+from comp370.db.models import Base
+
+# Arguments that bound the number of items returned by a field
+LIMIT_ARGUMENTS = ("first", "last", "n")
+
+
+@dataclass
+class Cardinalities:
+    """
+    Row counts and worst-case relationship fan-out used to score queries.
+
+    Attributes:
+        tables: Number of rows per model name (e.g. {"Line": 54000})
+        fanout: Largest number of objects related to a single object, per
+                (model, relationship)
+    """
+
+    tables: dict[str, int] = field(default_factory=dict)
+    fanout: dict[tuple[str, str], int] = field(default_factory=dict)
+
+    @staticmethod
+    def from_session(session: Session) -> "Cardinalities":
+        """
+        Compute cardinalities for every mapped model from the database.
+
+        Args:
+            session: Session used to count rows
+
+        Returns:
+            Cardinalities for all models and relationships in Base
+        """
+        cardinalities = Cardinalities()
+        mappers = list(Base.registry.mappers)
+
+        for mapper in mappers:
+            count = session.execute(
+                select(func.count()).select_from(mapper.local_table)
+            ).scalar_one()
+            cardinalities.tables[mapper.class_.__name__] = count
+
+        for mapper in mappers:
+            source = mapper.class_.__name__
+            for rel in mapper.relationships:
+                if rel.direction == RelationshipDirection.MANYTOONE:
+                    cardinalities.fanout[(source, rel.key)] = 1
+                    continue
+
+                # Relationships are skewed (main characters have most of
+                # the lines), so the largest group bounds the cost, not the
+                # average
+                table = rel.secondary if rel.secondary is not None else rel.target
+                keys = [column for _, column in rel.synchronize_pairs]
+                groups = (
+                    select(func.count().label("n"))
+                    .select_from(table)
+                    .where(*[key.is_not(None) for key in keys])
+                    .group_by(*keys)
+                    .subquery()
+                )
+                fanout = session.execute(select(func.max(groups.c.n))).scalar()
+                cardinalities.fanout[(source, rel.key)] = fanout or 0
+
+        return cardinalities
+
+
+@dataclass
+class QueryCost:
+    """
+    Estimated cost of a query.
+
+    Attributes:
+        cost: Estimated number of objects resolved by the query
+        depth: Deepest nesting of object fields in the query
+    """
+
+    cost: int = 0
+    depth: int = 0
+
+    def to_dict(self) -> dict[str, int]:
+        return {"cost": self.cost, "depth": self.depth}
+
+
+class CostAnalyzer:
+    """
+    Estimate the cost of GraphQL operations against a schema.
+
+    Each object-typed field contributes the number of objects it is
+    expected to resolve, multiplied by the number of parents it is
+    resolved for. Connection wrappers (edges/node) do not add depth.
+    """
+
+    def __init__(self, schema: GraphQLSchema, cardinalities: Cardinalities):
+        self.schema = schema
+        self.cardinalities = cardinalities
+
+    def estimate(
+        self,
+        document: DocumentNode,
+        variables: Optional[dict[str, Any]] = None,
+        operation_name: Optional[str] = None,
+    ) -> QueryCost:
+        """
+        Estimate the cost of an operation in a parsed document.
+
+        Args:
+            document: Parsed (and validated) query document
+            variables: Variable values supplied with the query, coerced
+                       (see graphql.execution.values.get_variable_values)
+            operation_name: Name of the operation to score
+
+        Returns:
+            The estimated QueryCost (zero if the operation is not found)
+        """
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return QueryCost()
+
+        root = self.schema.get_root_type(operation.operation)
+        if root is None:
+            return QueryCost()
+
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        walk = _Walk(self, fragments, variables or {})
+        return walk.selection_set(root, operation.selection_set, 1, 0)
+
+    def count(
+        self,
+        parent: GraphQLObjectType,
+        definition: GraphQLField,
+        name: str,
+        args: dict[str, Any],
+    ) -> int:
+        """Estimate how many objects a field resolves for a single parent."""
+        typ = get_nullable_type(definition.type)
+        many = isinstance(typ, GraphQLList) or _is_connection(get_named_type(typ))
+
+        if not many:
+            return 1
+
+        estimate = self._estimate(parent, get_named_type(typ), name)
+        limits = [max(0, value) for value in _limits(args).values()]
+        if limits:
+            return min(estimate, *limits)
+        return estimate
+
+    def _estimate(self, parent: GraphQLObjectType, typ, name: str) -> int:
+        parent_model = _model(parent)
+        if parent_model is not None:
+            attribute = _attribute(parent, name)
+            key = (parent_model.__name__, attribute)
+            if key in self.cardinalities.fanout:
+                return self.cardinalities.fanout[key]
+
+        if _is_connection(typ):
+            typ = _node_type(typ)
+
+        model = _model(typ)
+        if model is not None:
+            return self.cardinalities.tables.get(model.__name__, 1)
+
+        return 1
+
+
+class _Walk:
+    def __init__(
+        self,
+        analyzer: CostAnalyzer,
+        fragments: dict[str, FragmentDefinitionNode],
+        variables: dict[str, Any],
+    ):
+        self.analyzer = analyzer
+        self.fragments = fragments
+        self.variables = variables
+
+    def selection_set(
+        self,
+        parent: GraphQLObjectType,
+        selection_set: Optional[SelectionSetNode],
+        multiplier: int,
+        depth: int,
+    ) -> QueryCost:
+        total = QueryCost(depth=depth)
+        for node in self.fields(parent, selection_set):
+            cost = self.field(parent, node, multiplier, depth)
+            total.cost += cost.cost
+            total.depth = max(total.depth, cost.depth)
+        return total
+
+    def field(
+        self,
+        parent: GraphQLObjectType,
+        node: FieldNode,
+        multiplier: int,
+        depth: int,
+    ) -> QueryCost:
+        name = node.name.value
+        definition = parent.fields.get(name)
+        if definition is None or name.startswith("__"):
+            return QueryCost(depth=depth)
+
+        typ = get_named_type(definition.type)
+        if not isinstance(typ, GraphQLObjectType):
+            return QueryCost(depth=depth)
+
+        args = get_argument_values(definition, node, self.variables)
+        for arg, value in _limits(args).items():
+            if value < 0:
+                raise GraphQLError(
+                    f"Argument `{arg}` of `{name}` must not be negative.",
+                    [node],
+                )
+        items = multiplier * self.analyzer.count(parent, definition, name, args)
+        cost = QueryCost(cost=items, depth=depth + 1)
+
+        if not _is_connection(typ):
+            inner = self.selection_set(typ, node.selection_set, items, depth + 1)
+            cost.cost += inner.cost
+            cost.depth = max(cost.depth, inner.depth)
+            return cost
+
+        edge = get_named_type(typ.fields["edges"].type)
+        node_type = _node_type(typ)
+        for edges in self.fields(typ, node.selection_set):
+            if edges.name.value != "edges":
+                continue
+            for child in self.fields(edge, edges.selection_set):
+                if child.name.value != "node":
+                    continue
+                inner = self.selection_set(
+                    node_type, child.selection_set, items, depth + 1
+                )
+                cost.cost += inner.cost
+                cost.depth = max(cost.depth, inner.depth)
+
+        return cost
+
+    def fields(
+        self,
+        parent: GraphQLObjectType,
+        selection_set: Optional[SelectionSetNode],
+    ) -> list[FieldNode]:
+        """Flatten fragments so that only field nodes remain."""
+        if selection_set is None:
+            return []
+
+        nodes = []
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                nodes.append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                nodes.extend(self.fields(parent, selection.selection_set))
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is not None:
+                    nodes.extend(self.fields(parent, fragment.selection_set))
+        return nodes
+
+
+def _limits(args: dict[str, Any]) -> dict[str, int]:
+    """Get the (coerced, integer) arguments bounding the number of items."""
+    return {
+        arg: args[arg]
+        for arg in LIMIT_ARGUMENTS
+        if isinstance(args.get(arg), int) and not isinstance(args[arg], bool)
+    }
+
+
+def _is_connection(typ) -> bool:
+    return (
+        isinstance(typ, GraphQLObjectType)
+        and "edges" in typ.fields
+        and "pageInfo" in typ.fields
+    )
+
+
+def _node_type(connection: GraphQLObjectType):
+    edge = get_named_type(connection.fields["edges"].type)
+    return get_named_type(edge.fields["node"].type)
+
+
+def _model(typ) -> Optional[type]:
+    graphene_type = getattr(typ, "graphene_type", None)
+    meta = getattr(graphene_type, "_meta", None)
+    return getattr(meta, "model", None)
+
+
+def _attribute(typ, name: str) -> Optional[str]:
+    """Map a (camel-cased) GraphQL field name back to its model attribute."""
+    model = _model(typ)
+    if model is None:
+        return None
+    for key in inspect(model).relationships.keys():
+        if to_camel_case(key) == name:
+            return key
+    return None
@@ -0,0 +1,41 @@
+"""
+Batched loaders for GraphQL fields that are not mapped relationships.
+
+Resolvers load through a DataLoader, so a field requested on a list of
+objects (e.g. the category of every line of a connection) is resolved with
+a single query per execution step instead of one query per object.
+"""
+
+from asyncio import get_event_loop
+from weakref import WeakKeyDictionary
+
+from graphene.utils.dataloader import DataLoader
+from sqlalchemy.orm import Session
+
+from comp370.db.tools.annotation import AnnotationTool
+
+
+class CategoryLoader(DataLoader):
+    """Load the consensus category of lines by line id."""
+
+    def __init__(self, session: Session):
+        # Not cached: the loader outlives requests, and categories may be
+        # reloaded in between
+        super().__init__(cache=False)
+        self.session = session
+
+    async def batch_load_fn(self, line_ids):
+        categories = AnnotationTool(self.session).categories(line_ids)
+        return [categories.get(id) for id in line_ids]
+
+
+_CATEGORY_LOADERS: WeakKeyDictionary[Session, CategoryLoader] = WeakKeyDictionary()
+
+
+def category_loader(session: Session) -> CategoryLoader:
+    """Get the category loader of a session for the current event loop."""
+    loader = _CATEGORY_LOADERS.get(session)
+    if loader is None or loader.loop != get_event_loop():
+        loader = CategoryLoader(session)
+        _CATEGORY_LOADERS[session] = loader
+    return loader
@@ -10,10 +10,20 @@ import graphene
 from graphene import relay
 from graphene_sqlalchemy import SQLAlchemyObjectType
 from graphene_sqlalchemy import SQLAlchemyConnectionField
+from graphql import GraphQLError
 from sqlalchemy import func
 from typing import Any
+from typing import Optional
 
-from comp370.db.models import Season, Episode, Person, Character, Line
+from comp370.db.models import Season, Episode, Person, Character, Line, Annotation
+from comp370.db.tools.annotation import AnnotationTool
+from comp370.db.tools.character import CharacterTool
+from comp370.db.tools.character import CharacterType as CharacterKind
+from comp370.db.tools.statistics import LineFilter
+from comp370.db.tools.statistics import LineGroup
+from comp370.db.tools.statistics import StatisticsTool
+from .constants import MAX_CATEGORY_LINES
+from .loaders import category_loader
 
 
 class SeasonType(SQLAlchemyObjectType):
@@ -46,6 +56,24 @@ class LineType(SQLAlchemyObjectType):
     class Meta:
         model = Line
         interfaces = (relay.Node,)
+        exclude_fields = ("derived",)
+
+    category = graphene.String(
+        description="Consensus category of the line (null if not annotated)"
+    )
+
+    def resolve_category(self, info):
+        """Resolve the category, batched across the lines of a query."""
+        return category_loader(info.context["session"]).load(self.id)
+
+
+class AnnotationType(SQLAlchemyObjectType):
+    """GraphQL type for Annotation model with Relay support, without annotators."""
+
+    class Meta:
+        model = Annotation
+        interfaces = (relay.Node,)
+        exclude_fields = ("email",)
 
 
 class CharacterType(SQLAlchemyObjectType):
@@ -56,6 +84,70 @@ class CharacterType(SQLAlchemyObjectType):
         interfaces = (relay.Node,)
 
 
+LineCountGroup = graphene.Enum.from_enum(LineGroup, name="LineCountGroup")
+
+CharacterClass = graphene.Enum.from_enum(CharacterKind, name="CharacterClass")
+
+
+class LineCountFilter(graphene.InputObjectType):
+    """Restrict which lines are counted by aggregate queries."""
+
+    character_ids = graphene.List(graphene.NonNull(graphene.Int))
+    character_names = graphene.List(graphene.NonNull(graphene.String))
+    seasons = graphene.List(graphene.NonNull(graphene.Int))
+    min_length = graphene.Int()
+    max_length = graphene.Int()
+
+
+class LineCountType(graphene.ObjectType):
+    """Number of lines in a group. Fields not grouped by are null."""
+
+    count = graphene.Int(required=True)
+    character_id = graphene.Int()
+    character_name = graphene.String()
+    season = graphene.Int()
+    episode_id = graphene.Int()
+    episode = graphene.Int()
+    episode_title = graphene.String()
+
+
+class CharacterClassificationType(graphene.ObjectType):
+    """A character with its line/episode counts and derived type."""
+
+    character_id = graphene.Int(required=True)
+    character_name = graphene.String(required=True)
+    type = graphene.Field(CharacterClass, required=True)
+    lines = graphene.Int(required=True)
+    episodes = graphene.Int(required=True)
+
+
+class CategoryCountType(graphene.ObjectType):
+    """Number of lines with a consensus category."""
+
+    category = graphene.String(required=True)
+    count = graphene.Int(required=True)
+
+
+class WriterCountType(graphene.ObjectType):
+    """Number of episodes written by a person."""
+
+    person_id = graphene.Int(required=True)
+    name = graphene.String(required=True)
+    episodes = graphene.Int(required=True)
+
+
+def _line_filter(filter) -> Optional[LineFilter]:
+    if filter is None:
+        return None
+    return LineFilter(
+        character_ids=filter.get("character_ids"),
+        character_names=filter.get("character_names"),
+        seasons=filter.get("seasons"),
+        min_length=filter.get("min_length"),
+        max_length=filter.get("max_length"),
+    )
+
+
 def _resolve_random(
     typ: Any,
     info,
@@ -239,6 +331,82 @@ class Query(graphene.ObjectType):
         sampled = random.sample(ids, n)
         return session.query(Line).filter(Line.id.in_(sampled)).all()
 
+    # Aggregate queries (computed as single GROUP BY statements)
+    line_counts = graphene.List(
+        graphene.NonNull(LineCountType),
+        group_by=graphene.List(graphene.NonNull(LineCountGroup), required=True),
+        filter=LineCountFilter(required=False),
+        description="Count lines grouped by character, season and/or episode",
+    )
+
+    character_types = graphene.List(
+        graphene.NonNull(CharacterClassificationType),
+        type=CharacterClass(required=False),
+        description="Get the type of every character from its episode appearances",
+    )
+
+    writer_episode_counts = graphene.List(
+        graphene.NonNull(WriterCountType),
+        description="Count the episodes written by each writer",
+    )
+
+    category_lines = graphene.List(
+        graphene.NonNull(LineType),
+        category=graphene.String(required=True),
+        first=graphene.Int(required=False, default_value=100),
+        offset=graphene.Int(required=False, default_value=0),
+        description=(
+            "Get the lines with a consensus category, in id order "
+            f"(at most {MAX_CATEGORY_LINES} at a time)"
+        ),
+    )
+
+    category_counts = graphene.List(
+        graphene.NonNull(CategoryCountType),
+        description="Count the lines of every consensus category",
+    )
+
+    def resolve_line_counts(self, info, group_by, filter=None):
+        """Resolve line counts for the requested grouping."""
+        session = info.context["session"]
+        return StatisticsTool(session).line_counts(group_by, _line_filter(filter))
+
+    def resolve_character_types(self, info, type=None):
+        """Resolve character types, optionally filtered by type."""
+        session = info.context["session"]
+        return [
+            CharacterClassificationType(
+                character_id=row.id,
+                character_name=row.name,
+                type=row.type,
+                lines=row.lines,
+                episodes=row.episodes,
+            )
+            for row in CharacterTool(session).get_characters(type, rows=True)
+        ]
+
+    def resolve_writer_episode_counts(self, info):
+        """Resolve the number of episodes per writer."""
+        session = info.context["session"]
+        return StatisticsTool(session).writer_counts()
+
+    def resolve_category_lines(self, info, category, first=100, offset=0):
+        """Resolve the lines of a category with a single indexed join."""
+        if first < 0 or offset < 0:
+            raise GraphQLError("`first` and `offset` must not be negative.")
+        session = info.context["session"]
+        return AnnotationTool(session).lines(
+            category, limit=min(first, MAX_CATEGORY_LINES), offset=offset
+        )
+
+    def resolve_category_counts(self, info):
+        """Resolve the number of lines per category."""
+        session = info.context["session"]
+        return [
+            CategoryCountType(category=category, count=count)
+            for category, count in sorted(AnnotationTool(session).counts().items())
+        ]
+
 
 # Main GraphQL schema
 schema = graphene.Schema(query=Query)
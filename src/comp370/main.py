@@ -11,10 +11,15 @@ from starlette.routing import Mount
 from starlette.staticfiles import StaticFiles
 from starlette.responses import RedirectResponse
 from starlette.responses import FileResponse
-from starlette_graphene3 import GraphQLApp
+from starlette.concurrency import run_in_threadpool
 
 from comp370.db import Client as Db
+from comp370.db.snapshot import Snapshot
 from comp370.gql import schema
+from comp370.gql import Cardinalities
+from comp370.gql import GraphQLApp
+from comp370.statistics.api import StatisticsApi
+from comp370.downloads import download
 from comp370.constants import DIR_DATA
 
 
@@ -26,35 +31,36 @@ async def dashboard(request):
     return FileResponse(DIR_DATA / "statistics" / "statistics.topics.html")
 
 
+# Snapshot of the database served for download, instead of the live file
+snapshot = Snapshot()
+
+
 async def download_db(request):
-    return FileResponse(
-        DIR_DATA / "comp370.db",
-        media_type="application/octet-stream",
-        filename="comp370.db",
-    )
+    path = await run_in_threadpool(snapshot.build)
+    return await download(request, path or snapshot.path, "comp370.db")
 
 
 async def download_stats_tfidf(request):
-    return FileResponse(
+    return await download(
+        request,
         DIR_DATA / "statistics" / "statistics.tfidf.csv",
-        media_type="application/octet-stream",
-        filename="comp370.tf-idf.csv",
+        "comp370.tf-idf.csv",
     )
 
 
 async def download_stats_topics(request):
-    return FileResponse(
+    return await download(
+        request,
         DIR_DATA / "statistics" / "statistics.topics.csv",
-        media_type="application/octet-stream",
-        filename="comp370.topics.csv",
+        "comp370.topics.csv",
     )
 
 
 async def download_annotations(request):
-    return FileResponse(
+    return await download(
+        request,
         DIR_DATA / "annotations" / "annotations.derived.csv",
-        media_type="application/octet-stream",
-        filename="comp370.annotations.csv",
+        "comp370.annotations.csv",
     )
 
 
@@ -62,10 +68,12 @@ def create_app():
     # Initialize database connection
     db = Db()
     db.connect()
+    session = db.session()
 
     graphql_app = GraphQLApp(
         schema=schema,
-        context_value={"session": db.session()},
+        context_value={"session": session},
+        cardinalities=Cardinalities.from_session(session),
     )
 
     # Create Starlette application
@@ -78,6 +86,7 @@ def create_app():
             Route("/download/annotations", download_annotations),
             Route("/api/graphql", graphql_app),
             Route("/api/graphql/", graphql_app),
+            Mount("/api/statistics", routes=StatisticsApi().routes()),
             Mount(
                 "/gql",
                 StaticFiles(
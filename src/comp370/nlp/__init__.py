@@ -1,4 +1,5 @@
 from .nltk import NLTK
 from .spacy import SpaCy
+from .preprocess import Preprocessor
 
-__all__ = ["NLTK", "SpaCy"]
+__all__ = ["NLTK", "SpaCy", "Preprocessor"]
@@ -0,0 +1,265 @@
+"""
+Batched spaCy preprocessing of dialogue.
+
+Texts are run through `nlp.pipe` in batches (optionally over several
+processes) with the pipeline components each stage does not need disabled,
+and n-gram analyses are memoized so each distinct term is parsed once.
+N-grams are short and few, so they are always parsed in-process: starting
+worker processes would cost more than parsing them.
+"""
+
+import hashlib
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable
+from typing import Iterator
+from typing import Optional
+
+import contractions
+import spacy
+
+# Hardcoded list of Seinfeld main character names to remove
+CHARACTER_NAMES = {
+    "jerry",
+    "george",
+    "elaine",
+    "kramer",
+    "newman",
+    "costanza",
+    "seinfeld",
+    "benes",
+    "morty",
+    "helen",
+    "izzy",
+    "ray",
+}
+
+# Generic verbs to exclude (specific action verbs are more distinctive)
+GENERIC_VERBS = {
+    "be",
+    "have",
+    "do",
+    "will",
+    "would",
+    "could",
+    "should",
+    "may",
+    "might",
+    "can",
+    "must",
+    "shall",
+    "go",
+    "get",
+    "make",
+    "know",
+    "think",
+    "tell",
+    "come",
+    "want",
+    "look",
+    "say",
+    "ask",
+    "need",
+    "use",
+    "let",
+    "try",
+    "seem",
+    "happen",
+    "mean",
+    "give",
+    "take",
+    "find",
+    "talk",
+    "bring",
+    "feel",
+}
+
+# Components not needed by each stage (lemmas and POS tags only need the
+# tagger, attribute ruler and lemmatizer; entities need the NER)
+DISABLE_TOKENS = ["parser", "ner"]
+DISABLE_NAMES = ["parser", "tagger", "attribute_ruler", "lemmatizer"]
+DISABLE_NGRAMS = ["parser"]
+
+# Bump when the token filtering rules below change, to invalidate caches
+VERSION = 1
+
+
+def expand(text: str) -> str:
+    """Expand contractions word by word."""
+    return " ".join(contractions.fix(word) for word in text.split())
+
+
+def keep_token(token) -> bool:
+    """Whether a token is a distinctive noun, adjective or action verb."""
+    if token.lemma_ in CHARACTER_NAMES:
+        return False
+    if token.is_stop or token.is_punct:
+        return False
+    if len(token.text) <= 2 or not token.text.isalpha():
+        return False
+
+    # Keep most nouns and adjectives, but only specific action verbs
+    if token.pos_ in ["NOUN", "ADJ", "PROPN"]:
+        return True
+    return token.pos_ == "VERB" and token.lemma_ not in GENERIC_VERBS
+
+
+def is_meaningful(doc, min_ngram_size: int = 2) -> bool:
+    """
+    Check if a parsed n-gram is a meaningful phrase (named entity, fixed
+    expression) rather than just a random combination of words.
+
+    Args:
+        doc: the parsed n-gram
+        min_ngram_size: minimum size to check (smaller n-grams always pass)
+    """
+    if len(doc.text.split()) < min_ngram_size:
+        return True
+
+    # Named entities (places, organizations, products, etc.)
+    if doc.ents:
+        return True
+
+    # Mostly proper nouns (likely a name/place), allowing one other word
+    pos_tags = [token.pos_ for token in doc]
+    if pos_tags.count("PROPN") >= len(doc.text.split()) - 1:
+        return True
+
+    # Compound noun phrases are often meaningful fixed expressions
+    if all(pos in ["NOUN", "ADJ", "PROPN"] for pos in pos_tags):
+        return True
+
+    # Reject phrases with a verb (likely an action like "steal wallet")
+    return "VERB" not in pos_tags
+
+
+class Preprocessor:
+    """
+    Preprocess dialogue with a spaCy pipeline in batches.
+
+    Attributes:
+        timings: Seconds spent in each stage, accumulated across calls
+        counts: Number of texts handled by each stage
+    """
+
+    def __init__(
+        self,
+        nlp: spacy.Language,
+        batch_size: int = 256,
+        n_process: int = 1,
+    ):
+        self.nlp = nlp
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.timings: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+        self._ngrams: dict[tuple[str, int], bool] = {}
+
+    def fingerprint(self) -> str:
+        """
+        Hash everything that determines the output of `tokens`: the filtering
+        rules, the disabled components and the spaCy model and version.
+        """
+        config = {
+            "version": VERSION,
+            "names": sorted(CHARACTER_NAMES),
+            "verbs": sorted(GENERIC_VERBS),
+            "disable": DISABLE_TOKENS,
+            "model": f"{self.nlp.meta.get('lang')}_{self.nlp.meta.get('name')}",
+            "model_version": self.nlp.meta.get("version"),
+            "spacy": spacy.__version__,
+        }
+        return hashlib.sha256(json.dumps(config).encode()).hexdigest()[:16]
+
+    def pipe(
+        self,
+        texts: Iterable[str],
+        disable: list[str],
+        n_process: Optional[int] = None,
+    ) -> Iterator:
+        """
+        Run the pipeline over texts in batches, without the given components.
+
+        Args:
+            texts: Texts to parse
+            disable: Components to leave out
+            n_process: Number of processes (defaults to self.n_process)
+        """
+        return self.nlp.pipe(
+            texts,
+            batch_size=self.batch_size,
+            n_process=self.n_process if n_process is None else n_process,
+            disable=disable,
+        )
+
+    def tokens(self, texts: list[str]) -> list[str]:
+        """
+        Lemmatize texts, keeping only distinctive tokens.
+
+        Args:
+            texts: raw dialogue
+
+        Returns:
+            space-separated lemmas for each text, in order
+        """
+        if not texts:
+            return []
+
+        with self._timed("tokens", len(texts)):
+            expanded = (expand(text).lower() for text in texts)
+            return [
+                " ".join(token.lemma_ for token in doc if keep_token(token))
+                for doc in self.pipe(expanded, DISABLE_TOKENS)
+            ]
+
+    def remove_names(self, texts: list[str]) -> list[str]:
+        """Remove words that are part of a PERSON entity from each text."""
+        with self._timed("names", len(texts)):
+            out = []
+            for text, doc in zip(texts, self.pipe(texts, DISABLE_NAMES)):
+                names = {ent.text.lower() for ent in doc.ents if ent.label_ == "PERSON"}
+                out.append(" ".join(w for w in text.split() if w.lower() not in names))
+            return out
+
+    def meaningful_ngrams(
+        self,
+        terms: list[str],
+        min_ngram_size: int = 2,
+    ) -> dict[str, bool]:
+        """
+        Check which terms are meaningful n-grams (see is_meaningful).
+
+        Only terms not seen before are parsed, in a single batched pass.
+        """
+        pending = [
+            term
+            for term in dict.fromkeys(terms)
+            if len(term.split()) >= min_ngram_size
+            and (term, min_ngram_size) not in self._ngrams
+        ]
+        if pending:
+            with self._timed("ngrams", len(pending)):
+                docs = self.pipe(pending, DISABLE_NGRAMS, n_process=1)
+                for term, doc in zip(pending, docs):
+                    self._ngrams[(term, min_ngram_size)] = is_meaningful(
+                        doc, min_ngram_size
+                    )
+
+        return {term: self._ngrams.get((term, min_ngram_size), True) for term in terms}
+
+    def report(self) -> list[tuple[str, int, float]]:
+        """Get (stage, texts, seconds) for every stage run so far."""
+        return [
+            (stage, self.counts[stage], self.timings[stage]) for stage in self.timings
+        ]
+
+    @contextmanager
+    def _timed(self, stage: str, n: int):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - start
+            self.counts[stage] += n
@@ -17,6 +17,7 @@ from comp370.db.models import Season
 from comp370.db.models import Character
 from comp370.db.models import Episode
 from comp370.db.models import Line
+from comp370.db.tools.summary import SummaryTool
 from comp370.client.fandom import Client as Fandom
 from comp370.client.fandom.models import Character as FCharacter
 from comp370.client.imsdb import Client as Imsdb
@@ -492,3 +493,23 @@ class Seeder:
                 return go(tick=lambda: bar.update(task, advance=1))
         else:
             return go()
+
+    def write_summaries(self, log: bool = True) -> None:
+        def go(tick: Optional[Callable] = None) -> None:
+            with self.db.session() as db:
+                SummaryTool(db).refresh()
+
+            if tick:
+                tick()
+
+        if log:
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(),
+                TaskProgressColumn(),
+            ) as bar:
+                task = bar.add_task("Summaries...", total=1)
+                go(tick=lambda: bar.update(task, advance=1))
+        else:
+            go()
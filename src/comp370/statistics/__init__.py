@@ -0,0 +1,13 @@
+"""
+Statistics over the dialogue corpus.
+
+This module provides a corpus-wide sparse document-term matrix that
+statistics for any grouping of lines (character, season, category) are
+computed from, and an engine keeping per-season partitions of line, topic
+and term counts for every character and episode.
+"""
+
+from .corpus import Corpus, Distinctive
+from .engine import StatisticsEngine
+
+__all__ = ["Corpus", "Distinctive", "StatisticsEngine"]
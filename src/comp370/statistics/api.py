@@ -0,0 +1,252 @@
+"""
+HTTP endpoints serving precomputed statistics.
+
+Every dataset is read from a file in the statistics directory, optionally
+reshaped (e.g. pivoted for a chart), and encoded as columnar JSON (an object
+of column name to list of values, as Bokeh's AjaxDataSource expects) or as
+Arrow IPC when pyarrow is installed and the client asks for it.
+
+Encoded responses are cached (a bounded number of them, least recently used
+first out) until their source file changes, and are read and encoded off the
+event loop. Every variant (identity or gzip) carries its own strong ETag, so
+unchanged data is answered with 304 Not Modified.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+from typing import Optional
+
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.responses import Response
+from starlette.routing import Route
+
+from comp370.constants import DIR_DATA
+from comp370.downloads import _accepted
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+# Media types of the supported encodings
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# Responses smaller than this are not worth compressing
+MIN_GZIP_SIZE = 512
+
+# Number of encoded responses kept in memory
+MAX_CACHED = 64
+
+
+def overall_topics(df: pd.DataFrame) -> pd.DataFrame:
+    """Overall topic ratios, one row per character and one column per topic."""
+    overall = df[df["scope"] == "overall"]
+    out = overall.pivot(index="character", columns="topic", values="ratio")
+    out.columns.name = None
+    return out.fillna(0).reset_index()
+
+
+def season_topics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-season topic ratios, one row per (character, season) with a ratio
+    column and a "<topic>_lines" column per topic.
+    """
+    seasons = df[df["scope"] == "season"].astype({"season": int})
+    out = seasons.pivot_table(
+        index=["character", "season"],
+        columns="topic",
+        values=["ratio", "topic_lines"],
+        aggfunc="first",
+        fill_value=0,
+    )
+    out.columns = [
+        topic if value == "ratio" else f"{topic}_lines" for value, topic in out.columns
+    ]
+    totals = seasons.groupby(["character", "season"])["total_lines"].first()
+    return out.assign(total_lines=totals).reset_index()
+
+
+@dataclass
+class Dataset:
+    """A file in the statistics directory, optionally reshaped."""
+
+    path: str
+    view: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+
+
+# Datasets served under /api/statistics/<name>
+DATASETS = {
+    "topics": Dataset("statistics.topics.csv"),
+    "topics/overall": Dataset("statistics.topics.csv", overall_topics),
+    "topics/seasons": Dataset("statistics.topics.csv", season_topics),
+    "topics/all": Dataset("statistics.topics.all.csv"),
+    "tfidf": Dataset("statistics.tfidf.csv"),
+}
+
+
+@dataclass
+class Encoded:
+    """An encoded dataset and the version of the file it was encoded from."""
+
+    version: tuple[int, int]
+    etag: str
+    body: bytes
+    gzipped: Optional[bytes]
+
+    @property
+    def gzip_etag(self) -> str:
+        return f'{self.etag[:-1]}-gz"'
+
+
+class StatisticsApi:
+    """
+    Serve the statistics datasets.
+
+    Query parameters naming a column filter the rows to those where the
+    column equals the given value (e.g. `?character=Newman`); other query
+    parameters are ignored.
+
+    Attributes:
+        dir: Directory the dataset files are read from
+        datasets: Datasets by name
+        max_cached: Number of encoded responses kept in memory
+    """
+
+    def __init__(
+        self,
+        dir: Path = DIR_DATA / "statistics",
+        datasets: dict[str, Dataset] = DATASETS,
+        max_cached: int = MAX_CACHED,
+    ):
+        self.dir = dir
+        self.datasets = datasets
+        self.max_cached = max_cached
+        self._frames: dict[tuple, tuple[tuple[int, int], pd.DataFrame]] = {}
+        self._cache: OrderedDict[tuple, Encoded] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def routes(self) -> list[Route]:
+        return [
+            Route("/", self.index),
+            Route("/{name:path}", self.dataset),
+        ]
+
+    async def index(self, request: Request) -> Response:
+        """List the available datasets."""
+        return JSONResponse(
+            {
+                name: (self.dir / dataset.path).exists()
+                for name, dataset in self.datasets.items()
+            }
+        )
+
+    async def dataset(self, request: Request) -> Response:
+        name = request.path_params["name"].strip("/")
+        dataset = self.datasets.get(name)
+        if dataset is None or not (self.dir / dataset.path).exists():
+            return JSONResponse({"error": f"Unknown dataset: {name}"}, status_code=404)
+
+        format = ARROW if ARROW in request.headers.get("accept", "") and pa else JSON
+        params = list(request.query_params.items())
+        encoded = await run_in_threadpool(self._encode, dataset, format, params)
+
+        gzipped = encoded.gzipped is not None and "gzip" in _accepted(
+            request.headers.get("accept-encoding", "")
+        )
+        headers = {
+            "ETag": encoded.gzip_etag if gzipped else encoded.etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+        }
+        etags = _etags(request.headers.get("if-none-match", ""))
+        if "*" in etags or headers["ETag"] in etags:
+            return Response(status_code=304, headers=headers)
+
+        body = encoded.body
+        if gzipped:
+            body = encoded.gzipped
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=format, headers=headers)
+
+    def _frame(self, dataset: Dataset) -> tuple[tuple[int, int], pd.DataFrame]:
+        """Read (and reshape) a dataset, reusing it if its file is unchanged."""
+        path = self.dir / dataset.path
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        key = (dataset.path, dataset.view)
+        with self._lock:
+            cached = self._frames.get(key)
+        if cached is not None and cached[0] == version:
+            return cached
+
+        df = pd.read_csv(path)
+        if dataset.view is not None:
+            df = dataset.view(df)
+        with self._lock:
+            self._frames[key] = (version, df)
+        return version, df
+
+    def _encode(
+        self, dataset: Dataset, format: str, params: list[tuple[str, str]]
+    ) -> Encoded:
+        """Encode a dataset, reusing the cached encoding if its file is unchanged."""
+        version, df = self._frame(dataset)
+
+        # Only parameters naming a column are part of the key, so clients can
+        # not grow the cache with arbitrary parameters
+        filters = tuple(sorted((k, v) for k, v in params if k in df.columns))
+        key = (dataset.path, dataset.view, format, filters)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached.version == version:
+                self._cache.move_to_end(key)
+                return cached
+
+        for column, value in filters:
+            df = df[df[column].astype(str) == value]
+
+        if format == ARROW:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            body = sink.getvalue().to_pybytes()
+        else:
+            columns = {
+                column: [None if pd.isna(v) else v for v in df[column].tolist()]
+                for column in df.columns
+            }
+            body = json.dumps(columns, separators=(",", ":")).encode()
+
+        gzipped = None
+        if len(body) >= MIN_GZIP_SIZE:
+            gzipped = gzip.compress(body, mtime=0)
+
+        encoded = Encoded(
+            version=version,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            body=body,
+            gzipped=gzipped,
+        )
+        with self._lock:
+            self._cache[key] = encoded
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return encoded
+
+
+def _etags(header: str) -> set[str]:
+    """Parse the entity tags of an If-None-Match header."""
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
@@ -0,0 +1,298 @@
+"""
+Corpus-wide document-term matrix.
+
+Every line of dialogue is a row of a sparse CSR matrix of term counts, with
+the line, character, episode and season of each row kept alongside. The
+matrix is built once, saved as plain NumPy arrays and memory-mapped on load,
+so statistics over any grouping of lines are a few sparse matrix operations
+instead of a refit of a vectorizer.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.feature_extraction.text import TfidfTransformer
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from comp370.constants import DIR_DATA
+from comp370.db.models import Episode
+from comp370.db.models import Line
+from comp370.db.models import Season
+from comp370.db.tools.summary import SummaryTool
+from comp370.db.tools.tokens import Tokenizer
+from comp370.db.tools.tokens import TokenTool
+
+# Where the corpus is saved by default
+DIR_CORPUS = DIR_DATA / "statistics" / "corpus"
+
+# Row metadata kept for every line
+ROWS = ["line_id", "character_id", "episode_id", "season"]
+
+# Arrays making up a saved corpus (besides the row metadata)
+ARRAYS = ["data", "indices", "indptr", "vocabulary"]
+
+
+@dataclass
+class Distinctive:
+    """A term that is more common in a group than in the whole corpus."""
+
+    term: str
+    tfidf: float
+    distinctiveness: float
+    score: float
+
+
+class Corpus:
+    """
+    Sparse document-term matrix over lines of dialogue.
+
+    Attributes:
+        matrix: Term counts, one row per line (lines x terms)
+        vocabulary: Term of each column
+        rows: Line, character, episode and season of each row
+        meta: How and from what the corpus was built
+    """
+
+    matrix: sp.csr_matrix
+    vocabulary: np.ndarray
+    rows: pd.DataFrame
+    meta: dict
+
+    def __init__(
+        self,
+        matrix: sp.csr_matrix,
+        vocabulary: np.ndarray,
+        rows: pd.DataFrame,
+        meta: Optional[dict] = None,
+    ):
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.rows = rows
+        self.meta = meta or {}
+
+    @classmethod
+    def build(
+        cls,
+        session: Session,
+        tokenizer: Optional[Tokenizer] = None,
+        min_df: int = 3,
+        max_df: float = 1.0,
+        max_ngram: int = 1,
+        max_features: Optional[int] = None,
+    ) -> "Corpus":
+        """
+        Build the corpus from every line in the database.
+
+        Args:
+            session: Database session
+            tokenizer: Preprocessor for the dialogue (tokens are cached, see
+                       TokenTool); lowercased raw dialogue is used if None
+            min_df: Minimum number of lines a term must appear in
+            max_df: Maximum fraction of lines a term may appear in
+            max_ngram: Maximum n-gram size
+            max_features: Keep only the most frequent terms
+        """
+        stmt = (
+            select(
+                Line.id.label("line_id"),
+                Line.character_id.label("character_id"),
+                Line.episode_id.label("episode_id"),
+                Season.number.label("season"),
+                Line.dialogue.label("dialogue"),
+            )
+            .join(Episode, Episode.id == Line.episode_id)
+            .join(Season, Season.id == Episode.season_id)
+            .order_by(Line.id)
+        )
+        lines = pd.DataFrame(session.execute(stmt).all(), columns=ROWS + ["dialogue"])
+
+        if tokenizer is not None:
+            texts = TokenTool(session).tokens(lines, tokenizer)
+        else:
+            texts = lines["dialogue"]
+
+        vec = CountVectorizer(
+            lowercase=True,
+            stop_words="english",
+            min_df=min_df,
+            max_df=max_df,
+            ngram_range=(1, max_ngram),
+            max_features=max_features,
+        )
+        matrix = vec.fit_transform(texts).tocsr()
+        matrix.sort_indices()
+
+        meta = {
+            "fingerprint": SummaryTool(session).fingerprint(),
+            "tokenizer": tokenizer.fingerprint() if tokenizer is not None else None,
+            "min_df": min_df,
+            "max_df": max_df,
+            "max_ngram": max_ngram,
+            "max_features": max_features,
+            "shape": list(matrix.shape),
+        }
+        return cls(
+            matrix,
+            vec.get_feature_names_out().astype(str),
+            lines[ROWS].reset_index(drop=True),
+            meta,
+        )
+
+    def save(self, dir: Path = DIR_CORPUS) -> None:
+        """Save the corpus as .npy arrays (loadable with memory mapping)."""
+        os.makedirs(dir, exist_ok=True)
+        np.save(dir / "data.npy", self.matrix.data)
+        np.save(dir / "indices.npy", self.matrix.indices)
+        np.save(dir / "indptr.npy", self.matrix.indptr)
+        np.save(dir / "vocabulary.npy", self.vocabulary)
+        for column in ROWS:
+            np.save(dir / f"{column}.npy", self.rows[column].to_numpy(np.int64))
+        with open(dir / "meta.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, dir: Path = DIR_CORPUS, mmap: bool = True) -> "Corpus":
+        """
+        Load a saved corpus.
+
+        Args:
+            dir: Directory the corpus was saved to
+            mmap: Memory-map the arrays instead of reading them into memory
+        """
+        mode = "r" if mmap else None
+        arrays = {name: np.load(dir / f"{name}.npy", mmap_mode=mode) for name in ARRAYS}
+        with open(dir / "meta.json") as f:
+            meta = json.load(f)
+
+        matrix = sp.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        rows = pd.DataFrame(
+            {column: np.load(dir / f"{column}.npy", mmap_mode=mode) for column in ROWS}
+        )
+        return cls(matrix, arrays["vocabulary"], rows, meta)
+
+    @staticmethod
+    def exists(dir: Path = DIR_CORPUS) -> bool:
+        """Whether a corpus was saved to dir."""
+        return (dir / "meta.json").exists()
+
+    def is_stale(self, session: Session) -> bool:
+        """Whether the lines in the database changed since the corpus was built."""
+        return self.meta.get("fingerprint") != SummaryTool(session).fingerprint()
+
+    def select(self, mask: np.ndarray) -> "Corpus":
+        """Get the corpus restricted to the rows where mask is true."""
+        (idx,) = np.nonzero(np.asarray(mask))
+        return Corpus(
+            self.matrix[idx],
+            self.vocabulary,
+            self.rows.iloc[idx].reset_index(drop=True),
+            self.meta,
+        )
+
+    def tfidf(self) -> sp.csr_matrix:
+        """
+        TF-IDF of every row, with document frequencies over this corpus'
+        rows (the same weighting as sklearn's TfidfVectorizer).
+        """
+        return TfidfTransformer().fit_transform(self.matrix).tocsr()
+
+    def group(self, labels) -> tuple[np.ndarray, sp.csr_matrix]:
+        """
+        Build the indicator matrix of a grouping of rows.
+
+        Args:
+            labels: Group of every row (rows labelled NaN/None are left out)
+
+        Returns:
+            (groups, indicator) where indicator[g, i] is 1 if row i is in
+            groups[g]
+        """
+        labels = pd.Series(np.asarray(labels, dtype=object))
+        codes, groups = pd.factorize(labels, sort=True)
+        keep = codes >= 0
+        indicator = sp.csr_matrix(
+            (
+                np.ones(keep.sum()),
+                (codes[keep], np.nonzero(keep)[0]),
+            ),
+            shape=(len(groups), len(labels)),
+        )
+        return np.asarray(groups), indicator
+
+    def distinctive(
+        self,
+        labels,
+        top_k: int = 15,
+        min_distinctiveness: float = 1.5,
+    ) -> dict[object, list[Distinctive]]:
+        """
+        Find the most distinctive terms of every group of rows.
+
+        A term's distinctiveness in a group is its mean TF-IDF over the
+        group's rows divided by its mean over all (labelled) rows; terms are
+        ranked by mean TF-IDF times distinctiveness.
+
+        Args:
+            labels: Group of every row, e.g. self.rows["character_id"] or
+                    annotation categories (rows labelled NaN are left out)
+            top_k: Number of terms per group
+            min_distinctiveness: Only keep terms at least this distinctive
+        """
+        labels = np.asarray(labels, dtype=object)
+        labelled = ~pd.isna(labels)
+        corpus = self.select(labelled)
+
+        groups, indicator = corpus.group(labels[labelled])
+        X = corpus.tfidf()
+        sizes = np.asarray(indicator.sum(axis=1)).ravel()
+        means = (sp.diags(1.0 / sizes) @ (indicator @ X)).tocsr()
+        means.sort_indices()
+        overall = np.asarray(X.mean(axis=0)).ravel()
+
+        # Means stay sparse (groups x vocabulary): only the terms a group
+        # uses are scored, row by row
+        results = {}
+        for g, group in enumerate(groups):
+            start, end = means.indptr[g], means.indptr[g + 1]
+            terms = means.indices[start:end]
+            tfidf = means.data[start:end]
+            totals = overall[terms]
+            distinctiveness = np.divide(
+                tfidf,
+                totals + 1e-10,
+                out=np.zeros_like(tfidf),
+                where=totals > 1e-10,
+            )
+            keep = distinctiveness > min_distinctiveness
+            terms, tfidf = terms[keep], tfidf[keep]
+            distinctiveness = distinctiveness[keep]
+            scores = tfidf * distinctiveness
+
+            k = min(top_k, len(scores))
+            if k == 0:
+                results[group] = []
+                continue
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results[group] = [
+                Distinctive(
+                    term=str(corpus.vocabulary[terms[i]]),
+                    tfidf=float(tfidf[i]),
+                    distinctiveness=float(distinctiveness[i]),
+                    score=float(scores[i]),
+                )
+                for i in top
+            ]
+        return results
@@ -0,0 +1,414 @@
+"""
+Statistics over every character, season and episode.
+
+Lines are streamed from the database once, in season order, and aggregated
+per (character, episode): line counts, annotated topic counts and term
+counts. Term counts are summed from the rows of the corpus document-term
+matrix (see Corpus), so they use the same tokens and vocabulary as every
+other term statistic. Only one season's aggregates are held in memory at a
+time; each is written as a partition of columnar NumPy archives
+(`season=NN/*.npz`).
+
+Every partition is fingerprinted with a checksum of its lines, its
+annotations and the corpus vocabulary, so a refresh only rebuilds the
+seasons whose lines or annotations changed (edits and reassignments
+included).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+from collections import defaultdict
+from itertools import groupby
+from pathlib import Path
+from typing import Iterator
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfTransformer
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from comp370.constants import DIR_DATA
+from comp370.db.models import Character
+from comp370.db.models import Episode
+from comp370.db.models import Line
+from comp370.db.models import Season
+from .corpus import Corpus
+from .topics import EXCLUDED
+
+# Bump when the partition format or aggregation changes, to force a rebuild
+VERSION = 2
+
+# Where the partitions are written by default
+DIR_ENGINE = DIR_DATA / "statistics" / "engine"
+
+# Line key shared by all annotation files
+KEYS = ["season_number", "episode_number", "line_number"]
+
+# Tables written for every season
+TABLES = ["lines", "topics", "terms"]
+
+# Columns identifying each grouping
+GROUPS = {
+    "character": ["character_id", "character"],
+    "season": ["season"],
+    "episode": ["season", "episode_id", "episode"],
+}
+
+
+class StatisticsEngine:
+    """
+    Build and query per-season partitions of corpus statistics.
+
+    Attributes:
+        session: Database session lines are streamed from
+        corpus: Corpus (built from the same database) terms are counted from
+        dir: Directory the partitions are written to
+        batch_size: Number of lines fetched from the database at a time
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        corpus: Corpus,
+        dir: Path = DIR_ENGINE,
+        batch_size: int = 2_000,
+    ):
+        self.session = session
+        self.corpus = corpus
+        self.dir = dir
+        self.batch_size = batch_size
+
+    def fingerprints(self, annotations: pd.DataFrame) -> dict[int, str]:
+        """
+        Fingerprint every season's lines, annotations and terms.
+
+        Lines are checksummed with their content (character, number and
+        dialogue), so edited or reassigned lines change their season's
+        fingerprint. Term ids are corpus columns, so every season changes
+        with the corpus vocabulary and options.
+
+        Args:
+            annotations: DataFrame with KEYS and category columns
+        """
+        stmt = (
+            select(
+                Season.number,
+                Line.id,
+                Line.character_id,
+                Line.episode_id,
+                Line.number,
+                Line.dialogue,
+            )
+            .join(Episode, Episode.season_id == Season.id)
+            .join(Line, Line.episode_id == Episode.id)
+            .order_by(Season.number, Line.id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        checksums = defaultdict(lambda: hashlib.blake2b(digest_size=16))
+        for season, *row in self.session.execute(stmt):
+            checksums[season].update(repr(tuple(row)).encode() + b"\n")
+
+        annotated = {
+            int(season): int(pd.util.hash_pandas_object(rows, index=False).sum())
+            for season, rows in annotations[KEYS + ["category"]]
+            .sort_values(KEYS)
+            .groupby("season_number")
+        }
+        vocabulary = self._corpus_hash()
+        return {
+            season: f"{VERSION}:{vocabulary}:{checksum.hexdigest()}:"
+            f"{annotated.get(season, 0)}"
+            for season, checksum in checksums.items()
+        }
+
+    def manifest(self) -> dict[int, str]:
+        """Get the fingerprint of every season partition written so far."""
+        path = self.dir / "manifest.json"
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return {int(season): fp for season, fp in json.load(f).items()}
+
+    def stale(self, annotations: pd.DataFrame) -> list[int]:
+        """Get the seasons whose partitions are missing or out of date."""
+        manifest = self.manifest()
+        return sorted(
+            season
+            for season, fp in self.fingerprints(annotations).items()
+            if manifest.get(season) != fp
+        )
+
+    def refresh(self, annotations: pd.DataFrame, force: bool = False) -> list[int]:
+        """
+        Rebuild the partitions of stale seasons in a single pass over their lines.
+
+        Args:
+            annotations: DataFrame with KEYS and category columns (e.g. the
+                         derived annotations)
+            force: Rebuild every season
+
+        Returns:
+            The seasons that were rebuilt
+
+        Raises:
+            ValueError: If the corpus is out of date with the database
+        """
+        if self.corpus.is_stale(self.session):
+            raise ValueError("The corpus is out of date, rebuild it first")
+
+        fingerprints = self.fingerprints(annotations)
+        manifest = self.manifest()
+        seasons = sorted(
+            season
+            for season, fp in fingerprints.items()
+            if force or manifest.get(season) != fp
+        )
+
+        # Drop partitions of seasons no longer in the database
+        for season in set(manifest) - set(fingerprints):
+            shutil.rmtree(self._partition(season), ignore_errors=True)
+            del manifest[season]
+
+        categories = {
+            tuple(key): category
+            for *key, category in annotations[
+                annotations["season_number"].isin(seasons)
+            ][KEYS + ["category"]].itertuples(index=False)
+        }
+
+        for season, rows in self._stream(seasons):
+            self._write(season, rows, categories)
+            manifest[season] = fingerprints[season]
+            self._save_manifest(manifest)
+
+        self._save_manifest(manifest)
+        return seasons
+
+    def table(self, name: str, seasons: Optional[list[int]] = None) -> pd.DataFrame:
+        """
+        Read a table from the season partitions.
+
+        Args:
+            name: One of TABLES
+            seasons: Only read these seasons (all if None)
+        """
+        frames = []
+        for season in sorted(self.manifest()):
+            if seasons is not None and season not in seasons:
+                continue
+            with np.load(self._partition(season) / f"{name}.npz") as data:
+                frame = pd.DataFrame({column: data[column] for column in data.files})
+            frames.append(frame.assign(season=season))
+
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+
+        # Topic and term rows only carry ids; add the names from the lines table
+        if name != "lines":
+            keys = self.table("lines", seasons)[
+                ["character_id", "character", "episode_id", "episode"]
+            ].drop_duplicates(["character_id", "episode_id"])
+            df = df.merge(keys, on=["character_id", "episode_id"], how="left")
+        return df
+
+    def line_counts(self, by: list[str]) -> pd.DataFrame:
+        """
+        Count lines per group.
+
+        Args:
+            by: Any of "character", "season" and "episode"
+        """
+        columns = _columns(by)
+        return (
+            self.table("lines").groupby(columns, sort=True)["lines"].sum().reset_index()
+        )
+
+    def topic_ratios(self, by: list[str]) -> pd.DataFrame:
+        """
+        Compute the share of each group's lines annotated with each topic.
+
+        Args:
+            by: Any of "character", "season" and "episode"
+
+        Returns:
+            DataFrame with the group columns, topic, topic_lines, total_lines
+            and ratio (every topic is listed for every group)
+        """
+        columns = _columns(by)
+        totals = self.line_counts(by).set_index(columns)["lines"]
+
+        topics = self.table("topics")
+        topics = topics[~topics["topic"].isin(EXCLUDED)]
+        counts = (
+            topics.groupby(columns + ["topic"])["count"]
+            .sum()
+            .unstack("topic", fill_value=0)
+            .reindex(totals.index, fill_value=0)
+        )
+
+        out = counts.stack().rename("topic_lines").reset_index()
+        out["total_lines"] = np.repeat(totals.to_numpy(), counts.shape[1])
+        out["ratio"] = out["topic_lines"] / out["total_lines"]
+        return out
+
+    def distinctive_terms(self, by: list[str], top_k: int = 15) -> pd.DataFrame:
+        """
+        Find the top TF-IDF terms of every group, each group being a document.
+
+        Args:
+            by: Any of "character", "season" and "episode"
+            top_k: Number of terms per group
+
+        Returns:
+            DataFrame with the group columns, term, count and tfidf, ordered
+            by decreasing tfidf within each group
+        """
+        columns = _columns(by)
+        terms = self.table("terms")
+        vocabulary = np.load(self.dir / "vocabulary.npy")
+
+        groups = terms.groupby(columns, sort=True).ngroup().to_numpy()
+        keys = terms[columns].drop_duplicates().sort_values(columns)
+        counts = sp.csr_matrix(
+            (terms["count"].to_numpy(), (groups, terms["term_id"].to_numpy())),
+            shape=(groups.max() + 1 if len(groups) else 0, len(vocabulary)),
+        )
+        counts.sum_duplicates()
+        tfidf = TfidfTransformer().fit_transform(counts).tocsr()
+
+        rows = []
+        for g, key in enumerate(keys.itertuples(index=False)):
+            start, end = tfidf.indptr[g], tfidf.indptr[g + 1]
+            scores, ids = tfidf.data[start:end], tfidf.indices[start:end]
+            k = min(top_k, len(scores))
+            if k == 0:
+                continue
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            for i in top:
+                rows.append(
+                    (*key, vocabulary[ids[i]], int(counts[g, ids[i]]), float(scores[i]))
+                )
+
+        return pd.DataFrame(rows, columns=columns + ["term", "count", "tfidf"])
+
+    def _stream(self, seasons: list[int]) -> Iterator[tuple[int, Iterator]]:
+        """Stream the lines of the given seasons, yielding one season at a time."""
+        if not seasons:
+            return
+
+        stmt = (
+            select(
+                Season.number,
+                Episode.id,
+                Episode.number,
+                Line.number,
+                Line.character_id,
+                Character.name,
+            )
+            .join(Episode, Episode.season_id == Season.id)
+            .join(Line, Line.episode_id == Episode.id)
+            .join(Character, Character.id == Line.character_id)
+            .where(Season.number.in_(seasons))
+            .order_by(Season.number, Episode.number, Line.number)
+            .execution_options(yield_per=self.batch_size)
+        )
+        rows = self.session.execute(stmt)
+        for season, group in groupby(rows, key=lambda row: row[0]):
+            yield season, group
+
+    def _write(
+        self,
+        season: int,
+        rows: Iterator,
+        categories: dict[tuple, str],
+    ) -> None:
+        """Aggregate one season's lines and write its partition."""
+        lines = Counter()
+        topics = Counter()
+        names = {}
+        episodes = {}
+
+        for _, episode_id, episode, number, character_id, name in rows:
+            key = (character_id, episode_id)
+            lines[key] += 1
+            names[character_id] = name
+            episodes[episode_id] = episode
+
+            category = categories.get((season, episode, number))
+            if category is not None and not pd.isna(category):
+                topics[(*key, category)] += 1
+
+        terms = self._terms(season)
+
+        dir = self._partition(season)
+        os.makedirs(dir, exist_ok=True)
+        np.savez_compressed(
+            dir / "lines.npz",
+            character_id=np.array([c for c, _ in lines], dtype=np.int64),
+            character=np.array([names[c] for c, _ in lines], dtype=str),
+            episode_id=np.array([e for _, e in lines], dtype=np.int64),
+            episode=np.array([episodes[e] for _, e in lines], dtype=np.int64),
+            lines=np.array(list(lines.values()), dtype=np.int64),
+        )
+        np.savez_compressed(
+            dir / "topics.npz",
+            character_id=np.array([c for c, _, _ in topics], dtype=np.int64),
+            episode_id=np.array([e for _, e, _ in topics], dtype=np.int64),
+            topic=np.array([t for _, _, t in topics], dtype=str),
+            count=np.array(list(topics.values()), dtype=np.int64),
+        )
+        np.savez_compressed(dir / "terms.npz", **terms)
+
+    def _terms(self, season: int) -> dict[str, np.ndarray]:
+        """Sum the corpus rows of a season per (character, episode)."""
+        mask = (self.corpus.rows["season"] == season).to_numpy()
+        season_corpus = self.corpus.select(mask)
+        codes, keys = pd.MultiIndex.from_frame(
+            season_corpus.rows[["character_id", "episode_id"]]
+        ).factorize()
+        groups, indicator = season_corpus.group(codes)
+        counts = (indicator @ season_corpus.matrix).tocoo()
+        keys = keys[groups.astype(np.int64)]
+        return {
+            "character_id": keys.get_level_values(0).to_numpy(np.int64)[counts.row],
+            "episode_id": keys.get_level_values(1).to_numpy(np.int64)[counts.row],
+            "term_id": counts.col.astype(np.int64),
+            "count": np.rint(counts.data).astype(np.int64),
+        }
+
+    def _corpus_hash(self) -> str:
+        """Hash the corpus vocabulary and options (term ids depend on them)."""
+        options = {
+            key: value
+            for key, value in self.corpus.meta.items()
+            if key not in ("fingerprint", "shape")
+        }
+        checksum = hashlib.blake2b(digest_size=8)
+        checksum.update(json.dumps(options, sort_keys=True).encode())
+        checksum.update("\n".join(self.corpus.vocabulary.tolist()).encode())
+        return checksum.hexdigest()
+
+    def _save_manifest(self, manifest: dict[int, str]):
+        os.makedirs(self.dir, exist_ok=True)
+        np.save(self.dir / "vocabulary.npy", self.corpus.vocabulary)
+        with open(self.dir / "manifest.json", "w") as f:
+            json.dump({str(s): fp for s, fp in sorted(manifest.items())}, f, indent=2)
+
+    def _partition(self, season: int) -> Path:
+        return self.dir / f"season={season:02d}"
+
+
+def _columns(by: list[str]) -> list[str]:
+    """Get the columns identifying a grouping, without duplicates."""
+    unknown = set(by) - set(GROUPS)
+    if unknown:
+        raise ValueError(f"Unknown groupings: {', '.join(sorted(unknown))}")
+    return list(dict.fromkeys(column for group in by for column in GROUPS[group]))
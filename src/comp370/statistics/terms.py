@@ -0,0 +1,110 @@
+"""
+Selection of top terms without redundant n-grams.
+
+Terms are split into their words once, as a sparse term x word matrix, so
+checking whether an n-gram overlaps with already selected terms is an array
+lookup rather than a set intersection over strings.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+
+# Number of candidates checked against the kept terms at once
+CHUNK = 1024
+
+
+def term_words(vocabulary) -> sp.csr_matrix:
+    """
+    Build the binary term x word matrix of a vocabulary.
+
+    Args:
+        vocabulary: Terms (space-separated n-grams)
+
+    Returns:
+        Matrix whose entry (t, w) is 1 if word w is part of term t
+    """
+    words: dict[str, int] = {}
+    indices = []
+    indptr = [0]
+    for term in vocabulary:
+        indices.extend(
+            words.setdefault(w, len(words)) for w in dict.fromkeys(term.split())
+        )
+        indptr.append(len(indices))
+
+    return sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.int8), indices, indptr),
+        shape=(len(indptr) - 1, len(words)),
+    )
+
+
+def ngram_sizes(vocabulary) -> np.ndarray:
+    """Get the number of words of every term."""
+    return np.fromiter((len(term.split()) for term in vocabulary), dtype=np.int64)
+
+
+def top_terms(
+    candidates: np.ndarray,
+    score: np.ndarray,
+    sizes: np.ndarray,
+    words: sp.csr_matrix,
+    top_k: int,
+) -> np.ndarray:
+    """
+    Select the top scoring terms, skipping redundant n-grams.
+
+    Candidates are visited longest n-gram first and, for the same size, by
+    decreasing score; a term is kept unless it shares a word with a term
+    kept before it. The kept terms are then ranked by score.
+
+    Args:
+        candidates: Indices of the terms to choose from
+        score: Score of every term
+        sizes: N-gram size of every term (see ngram_sizes)
+        words: Term x word matrix (see term_words)
+        top_k: Number of terms to select
+
+    Returns:
+        Indices of up to top_k terms, by decreasing score
+    """
+    candidates = np.asarray(candidates)
+    if top_k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+
+    order = candidates[np.lexsort((-score[candidates], -sizes[candidates]))]
+    smallest = sizes[order[-1]]
+
+    # Words already taken by a kept term (the array is a view of the buffer)
+    taken = bytearray(words.shape[1])
+    used = np.frombuffer(taken, dtype=bool)
+    indptr, indices = words.indptr, words.indices
+
+    kept = []
+    last = 0
+    for start in range(0, len(order), CHUNK):
+        if last >= top_k:
+            break
+        chunk = order[start : start + CHUNK]
+
+        # Drop every term overlapping a kept one with a single product, then
+        # check the (few) remaining ones against each other in order
+        chunk = chunk[(words[chunk] @ used) == 0]
+        for t in chunk.tolist():
+            w = indices[indptr[t] : indptr[t + 1]].tolist()
+            if any(taken[i] for i in w):
+                continue
+            for i in w:
+                taken[i] = 1
+            kept.append(t)
+
+            # Terms of the smallest size cannot block anything, and later
+            # ones score lower, so once top_k of them are kept we are done
+            if sizes[t] == smallest:
+                last += 1
+                if last >= top_k:
+                    break
+
+    kept = np.asarray(kept, dtype=np.int64)
+    if len(kept) > top_k:
+        kept = kept[np.argpartition(-score[kept], top_k - 1)[:top_k]]
+    return kept[np.argsort(-score[kept], kind="stable")]
@@ -0,0 +1,118 @@
+"""
+Per-character topic ratios.
+
+The share of each character's lines annotated with each topic, per season
+and overall, computed with two grouped counts over the annotations.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Categories left out of the ratios
+EXCLUDED = ["Miscellaneous", "UNKNOWN"]
+
+# Columns of the long-format output
+COLUMNS = [
+    "character",
+    "season",
+    "topic",
+    "topic_lines",
+    "total_lines",
+    "ratio",
+    "scope",
+]
+
+
+def topic_ratios(
+    annotations: pd.DataFrame,
+    totals: pd.Series,
+    season_totals: pd.Series,
+) -> pd.DataFrame:
+    """
+    Compute per-season and overall topic ratios for each character.
+
+    Ratios are relative to all of a character's lines (annotated or not),
+    so they are comparable across characters with different coverage.
+
+    Args:
+        annotations: DataFrame with character, season_number and category
+                     columns, one row per annotated line
+        totals: Number of lines per character name; only these characters
+                are included
+        season_totals: Number of lines per (character name, season)
+
+    Returns:
+        DataFrame with COLUMNS, one row per (character, season, topic) with
+        scope "season" and per (character, topic) with season "overall" and
+        scope "overall", sorted by character, season and topic
+    """
+    df = annotations[annotations["character"].isin(totals.index)]
+    topics = [t for t in df["category"].dropna().unique() if t not in EXCLUDED]
+
+    # Per-season topic counts, for every season a character has annotations in
+    seasonal = df.dropna(subset=["season_number"]).assign(
+        season=lambda d: d["season_number"].astype(int)
+    )
+    pairs = pd.MultiIndex.from_frame(
+        seasonal[["character", "season"]].drop_duplicates()
+    )
+    per_season = _long(
+        _counts(seasonal, ["character", "season"]),
+        pairs,
+        topics,
+        season_totals.reindex(pairs, fill_value=0).to_numpy(),
+    )
+    per_season["scope"] = "season"
+
+    # Overall topic counts, for every character with lines
+    characters = pd.Index(totals[totals > 0].index, name="character")
+    overall = _long(
+        _counts(df, ["character"]),
+        characters,
+        topics,
+        totals.reindex(characters).to_numpy(),
+    )
+    overall["season"] = "overall"
+    overall["scope"] = "overall"
+
+    out = pd.concat([per_season, overall], ignore_index=True)
+    out["season"] = out["season"].astype(object)
+    order = out["season"].map(lambda x: 999 if x == "overall" else int(x))
+    out = out.assign(season_sort=order).sort_values(
+        ["character", "season_sort", "topic"], kind="stable"
+    )
+    return out[COLUMNS].reset_index(drop=True)
+
+
+def _counts(df: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """Count annotated lines per group (rows) and category (columns)."""
+    return df.groupby(by + ["category"]).size().unstack("category", fill_value=0)
+
+
+def _long(
+    counts: pd.DataFrame,
+    index: pd.Index,
+    topics: list[str],
+    totals,
+) -> pd.DataFrame:
+    """
+    Turn a (groups x categories) count table into long-format ratios.
+
+    Args:
+        counts: Annotated lines per group and category (see _counts)
+        index: Groups to report (missing groups count zero lines)
+        topics: Topics to report (missing topics count zero lines)
+        totals: Total lines of each group in index; groups without lines are
+                left out
+    """
+    totals = np.asarray(totals)
+    counts = counts.reindex(index=index, columns=topics, fill_value=0)
+    counts.columns.name = "topic"
+    counts = counts[totals > 0]
+
+    # Stacking is group-major, so each group's total repeats once per topic
+    out = counts.stack().rename("topic_lines").reset_index()
+    out["topic_lines"] = out["topic_lines"].astype(int)
+    out["total_lines"] = np.repeat(totals[totals > 0], len(topics)).astype(int)
+    out["ratio"] = out["topic_lines"] / out["total_lines"]
+    return out